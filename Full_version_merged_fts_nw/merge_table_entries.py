@@ -1,195 +1,190 @@
 #!/usr/bin/env python3
 """
-Script to merge sepsis and heart failure table entries for the unified P4 program.
+Script to merge the table entries of the tree models for the unified P4 program.
+
+Each model's lookup_featureN table maps a feature value to that model's code
+(first match in CLI priority order, file order on ties). The merger evaluates
+every model's table on every value of the feature's key domain, takes the
+common refinement of the models' intervals and emits one
+extract_featureN_dual range entry per refined interval, carrying the models'
+codes in --model order. One lookup per feature then serves all monitored
+conditions, however differently the models split the feature.
+
+A model whose table misses a value leaves its code at 0 (metadata starts at
+0 and only the feature tables write the codes), so the merged entry carries 0
+for it; intervals where all K codes are 0 get no entry, since a miss (the
+default NoAction) leaves the same codes. The key domain is [0, 2**width),
+width being the bits the models' masks cover; the ternary masks make the
+separate tables repeat above it, the range entries miss there.
+
+The merging itself works for any number of models, but the P4 program's
+extract_featureN_dual actions take exactly two codes (sepsis, then heart
+failure), so the script rejects any other number of --model inputs. Adding a
+model means adding a parameter and an output to those actions first.
+
+The leaf and decision tables of each model are copied unchanged. Before
+writing, every merged feature table is checked against the separate tables
+for every value of its key domain.
+
+Example (the sepsis and heart failure models of Full_version_same_feats):
+    python3 merge_table_entries.py \\
+        --model sep=../Full_version_same_feats/tables/s1-commands-sep.txt \\
+        --model hf=../Full_version_same_feats/tables/s1-commands-hf.txt
 """
 
-def parse_feature_entry(line):
-    """Parse a feature table entry line and extract components."""
-    # Example: table_add SwitchIngress.lookup_feature0 extract_feature0 400&&&1008 => 18 0
+import argparse
+import re
+import sys
+
+FEATURE_TABLE = re.compile(r"^(?:\w+\.)?lookup_feature(\d+)(?:_\w+)?$")
+P4_MODELS = 2  # codes taken by extract_featureN_dual in PatientMonitoring.p4
+MAX_KEY_BITS = 20
+
+
+def parse_entry(line):
+    """Parse a table_add line into (table, action, keys, params); None for blank lines and comments."""
+    # Example: table_add SwitchIngress.lookup_feature0_sep extract_feature0_sep 400&&&1008 => 18 0
     parts = line.strip().split()
-    if len(parts) < 6 or not line.startswith('table_add SwitchIngress.lookup_feature'):
+    if not parts or parts[0].startswith('#'):
         return None
-    
-    table_name = parts[1]  # SwitchIngress.lookup_feature0
-    action_name = parts[2]  # extract_feature0
-    match_key = parts[3]   # 400&&&1008
-    arrow = parts[4]       # =>
-    code_val = parts[5]    # 18
-    priority = parts[6]    # 0
-    
-    # Extract feature number
-    feature_num = table_name.split('feature')[1]
-    
-    return {
-        'feature_num': feature_num,
-        'table_name': table_name,
-        'action_name': action_name,
-        'match_key': match_key,
-        'code_val': code_val,
-        'priority': priority,
-        'original_line': line.strip()
-    }
-
-def parse_leaf_entry(line):
-    """Parse a leaf table entry line."""
-    # Example: table_add SwitchIngress.lookup_leaf_id0 read_prob0 0 0 0 0 0 0 0 0 0 0 => 0 8
-    if not line.startswith('table_add SwitchIngress.lookup_leaf_id'):
-        return None
-    
-    parts = line.strip().split()
-    table_name = parts[1]
-    action_name = parts[2]
-    
-    # Find the '=>' separator
+    if parts[0] != 'table_add' or '=>' not in parts:
+        raise ValueError(f"not a table_add line: {line.strip()!r}")
     arrow_idx = parts.index('=>')
-    match_keys = parts[3:arrow_idx]
-    result_parts = parts[arrow_idx+1:]
-    
-    return {
-        'table_name': table_name,
-        'action_name': action_name,
-        'match_keys': match_keys,
-        'result_parts': result_parts,
-        'original_line': line.strip()
-    }
-
-def read_table_file(filename):
-    """Read and categorize table entries from a file."""
-    feature_entries = {}  # feature_num -> list of entries
-    leaf_entries = []
-    
-    with open(filename, 'r') as f:
+    return parts[1], parts[2], parts[3:arrow_idx], [int(p, 0) for p in parts[arrow_idx + 1:]]
+
+
+def read_model(filename):
+    """Feature entries per feature number ((value, mask, code) in match order) and the other table lines."""
+    features = {}
+    other_lines = []
+    with open(filename) as f:
         for line in f:
-            line = line.strip()
-            if not line or line.startswith('#'):
+            entry = parse_entry(line)
+            if entry is None:
                 continue
-                
-            if 'lookup_feature' in line:
-                entry = parse_feature_entry(line)
-                if entry:
-                    feature_num = entry['feature_num']
-                    if feature_num not in feature_entries:
-                        feature_entries[feature_num] = []
-                    feature_entries[feature_num].append(entry)
-            elif 'lookup_leaf_id' in line:
-                entry = parse_leaf_entry(line)
-                if entry:
-                    leaf_entries.append(entry)
-    
-    return feature_entries, leaf_entries
-
-def merge_feature_entries(sep_features, hf_features):
-    """Merge feature entries from both models."""
-    merged_entries = []
-    
-    # Get all feature numbers
-    all_features = set(sep_features.keys()) | set(hf_features.keys())
-    
-    for feature_num in sorted(all_features, key=int):
-        print(f"Processing feature {feature_num}...")
-        
-        sep_entries = sep_features.get(feature_num, [])
-        hf_entries = hf_features.get(feature_num, [])
-        
-        # Create a map of match_key -> (sep_code, hf_code)
-        match_key_codes = {}
-        
-        # Process sepsis entries
-        for entry in sep_entries:
-            match_key = entry['match_key']
-            sep_code = entry['code_val']
-            if match_key not in match_key_codes:
-                match_key_codes[match_key] = [None, None]
-            match_key_codes[match_key][0] = sep_code
-        
-        # Process heart failure entries
-        for entry in hf_entries:
-            match_key = entry['match_key']
-            hf_code = entry['code_val']
-            if match_key not in match_key_codes:
-                match_key_codes[match_key] = [None, None]
-            match_key_codes[match_key][1] = hf_code
-        
-        # Generate merged entries
-        priority = 0
-        for match_key in sorted(match_key_codes.keys()):
-            sep_code, hf_code = match_key_codes[match_key]
-            
-            # Default to 0 if code is missing for one model
-            if sep_code is None:
-                sep_code = "0"
-            if hf_code is None:
-                hf_code = "0"
-            
-            # Create merged entry with dual action
-            merged_line = f"table_add SwitchIngress.lookup_feature{feature_num} extract_feature{feature_num}_dual {match_key} => {sep_code} {hf_code} {priority}"
-            merged_entries.append(merged_line)
-            priority += 1
-        
-        # Add empty line after each feature table
-        merged_entries.append("")
-    
-    return merged_entries
-
-def process_leaf_entries(leaf_entries, suffix):
-    """Process leaf entries with given suffix."""
-    processed = []
-    
-    for entry in leaf_entries:
-        # Update table and action names with suffix
-        table_name = entry['table_name'] + suffix
-        action_name = entry['action_name'] + suffix
-        
-        # Reconstruct the line
-        match_keys_str = ' '.join(entry['match_keys'])
-        result_str = ' '.join(entry['result_parts'])
-        
-        new_line = f"table_add {table_name} {action_name} {match_keys_str} => {result_str}"
-        processed.append(new_line)
-    
-    return processed
-
-def main():
-    # File paths
-    sep_file = "tables/s1-commands-sep.txt"
-    hf_file = "HF_2trees_5depth/s1-commands-hf.txt"
-    output_file = "tables/s1-commands-merged.txt"
-    
-    print("Reading sepsis table entries...")
-    sep_features, sep_leaves = read_table_file(sep_file)
-    print(f"Found {len(sep_features)} feature tables and {len(sep_leaves)} leaf entries for sepsis")
-    
-    print("Reading heart failure table entries...")
-    hf_features, hf_leaves = read_table_file(hf_file)
-    print(f"Found {len(hf_features)} feature tables and {len(hf_leaves)} leaf entries for heart failure")
-    
-    print("Merging feature entries...")
-    merged_features = merge_feature_entries(sep_features, hf_features)
-    
-    print("Processing leaf entries...")
-    sep_leaf_entries = process_leaf_entries(sep_leaves, "_sep")
-    hf_leaf_entries = process_leaf_entries(hf_leaves, "_hf")
-    
-    print(f"Writing merged table entries to {output_file}...")
-    with open(output_file, 'w') as f:
-        # Write header comment
-        f.write("# Merged table entries for unified sepsis and heart failure detection\n")
+            table, action, keys, params = entry
+            match = FEATURE_TABLE.match(table)
+            if not match:
+                other_lines.append(line.strip())
+                continue
+            if len(keys) != 1 or '&&&' not in keys[0] or len(params) != 2:
+                raise ValueError(f"{filename}: expected '{table} <value>&&&<mask> => <code> <priority>'")
+            value, mask = (int(k, 0) for k in keys[0].split('&&&'))
+            code = None if action.endswith('NoAction') else params[0]
+            features.setdefault(int(match.group(1)), []).append((params[1], value & mask, mask, code))
+    for feature_num, entries in features.items():
+        # sort() is stable, so entries with the same priority keep their file order
+        entries.sort(key=lambda e: e[0])
+        features[feature_num] = [(value, mask, code) for _, value, mask, code in entries]
+    return features, other_lines
+
+
+def lookup(entries, x):
+    """Code of the first matching entry, 0 when none matches."""
+    for value, mask, code in entries:
+        if x & mask == value:
+            return code if code is not None else 0
+    return 0
+
+
+def key_width(models, feature_num):
+    mask = 0
+    for features in models:
+        for _, entry_mask, _ in features.get(feature_num, []):
+            mask |= entry_mask
+    return mask.bit_length()
+
+
+def refine(models, feature_num):
+    """Common refinement of the models' intervals: [(low, high, codes)] covering [0, 2**width)."""
+    width = key_width(models, feature_num)
+    if width > MAX_KEY_BITS:
+        raise ValueError(f"feature {feature_num}: key masks cover {width} bits, too many to evaluate")
+    intervals = []
+    for x in range(1 << width):
+        codes = tuple(lookup(features.get(feature_num, []), x) for features in models)
+        if intervals and intervals[-1][2] == codes:
+            intervals[-1][1] = x
+        else:
+            intervals.append([x, x, codes])
+    return [tuple(interval) for interval in intervals], width
+
+
+def merged_entries(models, feature_num):
+    """Range entries (low, high, codes) of the merged table; all-zero intervals are left to the default."""
+    intervals, width = refine(models, feature_num)
+    return [(low, high, codes) for low, high, codes in intervals if any(codes)], width
+
+
+def check_feature(models, feature_num, entries, width):
+    """Compare the merged range table with the separate tables for every value of the key domain."""
+    for x in range(1 << width):
+        expected = tuple(lookup(features.get(feature_num, []), x) for features in models)
+        merged = next((codes for low, high, codes in entries if low <= x <= high), (0,) * len(models))
+        if merged != expected:
+            raise ValueError(f"feature {feature_num}: value {x} gives codes {merged} instead of {expected}")
+
+
+def main(args):
+    if len(args.model) != P4_MODELS:
+        print(f"Error: PatientMonitoring.p4's extract_featureN_dual actions take {P4_MODELS} model codes "
+              f"(sepsis, heart failure), got {len(args.model)} --model inputs")
+        return 1
+    names = []
+    models = []
+    others = []
+    for spec in args.model:
+        name, _, filename = spec.partition('=')
+        if not filename:
+            print(f"Error: --model expects name=file, got {spec!r}")
+            return 1
+        print(f"Reading {name} table entries from {filename}...")
+        features, other_lines = read_model(filename)
+        print(f"Found {len(features)} feature tables and {len(other_lines)} leaf/decision entries for {name}")
+        names.append(name)
+        models.append(features)
+        others.append(other_lines)
+
+    print(f"Merging feature entries of {len(models)} models ({', '.join(names)})...")
+    merged = {}
+    for feature_num in sorted(set().union(*models)):
+        entries, width = merged_entries(models, feature_num)
+        check_feature(models, feature_num, entries, width)
+        separate = sum(len(features.get(feature_num, [])) for features in models)
+        print(f"Feature {feature_num}: {separate} separate entries -> {len(entries)} merged "
+              f"(checked {1 << width} values)")
+        merged[feature_num] = entries
+
+    print(f"Writing merged table entries to {args.output}...")
+    with open(args.output, 'w') as f:
+        f.write(f"# Merged table entries for {', '.join(names)} detection\n")
         f.write("# Generated by merge_table_entries.py\n\n")
-        
-        # Write merged feature tables
-        f.write("# Feature extraction tables (unified with dual actions)\n")
-        for line in merged_features:
-            f.write(line + '\n')
-        
-        f.write("\n# Sepsis model leaf/decision tables\n")
-        for line in sep_leaf_entries:
-            f.write(line + '\n')
-        
-        f.write("\n# Heart failure model leaf/decision tables\n")
-        for line in hf_leaf_entries:
-            f.write(line + '\n')
-    
-    print(f"Merge complete! Generated {len(merged_features)} feature entries, {len(sep_leaf_entries)} sepsis leaf entries, and {len(hf_leaf_entries)} heart failure leaf entries.")
+        f.write(f"# Feature extraction tables (one range entry per interval, codes in order: {' '.join(names)})\n")
+        for feature_num, entries in merged.items():
+            for priority, (low, high, codes) in enumerate(entries):
+                f.write(f"table_add {args.table_prefix}lookup_feature{feature_num} extract_feature{feature_num}_dual "
+                        f"{low}->{high} => {' '.join(map(str, codes))} {priority}\n")
+            f.write("\n")
+        for name, other_lines in zip(names, others):
+            f.write(f"# {name} model leaf/decision tables\n")
+            for line in other_lines:
+                f.write(line + '\n')
+            f.write("\n")
+
+    print(f"Merge complete! Generated {sum(len(e) for e in merged.values())} feature entries and "
+          f"{sum(len(o) for o in others)} leaf/decision entries.")
+    return 0
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Merge the feature tables of the sepsis and heart failure models")
+    parser.add_argument("--model", action="append", metavar="NAME=FILE",
+                        help="Model name and table_add file, in the order of the extract_featureN_dual codes "
+                             "(sepsis, then heart failure)")
+    parser.add_argument("--output", default="tables/s1-commands-merged.txt", help="Merged table_add file")
+    parser.add_argument("--table-prefix", default="SwitchIngress.", help="Control name prefixed to the merged tables")
+    args = parser.parse_args()
+    if not args.model:
+        args.model = ["sep=../Full_version_same_feats/tables/s1-commands-sep.txt",
+                      "hf=../Full_version_same_feats/tables/s1-commands-hf.txt"]
+    sys.exit(main(args))
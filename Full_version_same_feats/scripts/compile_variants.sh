@@ -0,0 +1,41 @@
+#!/bin/bash
+# Compile PatientMonitoring.p4 with p4c (bmv2, v1model) for the default build and every combination of the
+# boolean build options, plus FEATURE_MATCH=range and lpm, into build/variants/<name>/.
+# Prints one line per variant and exits with status 1 if any of them does not compile.
+#
+#     bash ./scripts/compile_variants.sh            (P4C=p4c-bm2-ss by default)
+P4C=${P4C:-p4c-bm2-ss}
+OPTIONS=(PACKED_WINDOW_REGS PRESENCE_FLAGS PATIENT_SLOTS PIGGYBACK_EXPIRY LOCF_IMPUTATION LEAF_SCORE_SUM)
+OUT=build/variants
+cd "$(dirname "$0")/.." || exit 1
+command -v "$P4C" > /dev/null || { echo "$P4C not found"; exit 2; }
+
+failed=0
+compile() {  # compile NAME DEFINE...
+    local name=$1 dir=$OUT/$1
+    shift
+    mkdir -p "$dir"
+    if "$P4C" --arch v1model --std p4-16 "$@" --p4runtime-files "$dir/PatientMonitoring.p4.p4info.txtpb" \
+            -o "$dir/PatientMonitoring.json" PatientMonitoring.p4 > "$dir/p4c.log" 2>&1; then
+        echo "ok      $name"
+    else
+        echo "FAILED  $name (see $dir/p4c.log)"
+        failed=1
+    fi
+}
+
+for ((mask = 0; mask < 1 << ${#OPTIONS[@]}; mask++)); do
+    name=default
+    defines=(-DFEATURE_MATCH=ternary)
+    for i in "${!OPTIONS[@]}"; do
+        if ((mask & 1 << i)); then
+            [ "$name" = default ] && name=${OPTIONS[i]} || name=$name+${OPTIONS[i]}
+            defines+=(-D"${OPTIONS[i]}")
+        fi
+    done
+    compile "$name" "${defines[@]}"
+done
+for match in range lpm; do
+    compile "FEATURE_MATCH=$match" -DFEATURE_MATCH=$match
+done
+exit $failed
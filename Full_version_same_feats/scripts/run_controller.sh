@@ -1,8 +1,7 @@
 #!/bin/bash
-simple_switch_CLI < ./tables/s1-commands-sep.txt
-sleep 1
-simple_switch_CLI < ./tables/s1-commands-hf.txt
-sleep 1
-simple_switch_CLI < ./tables/news2-commands.txt
-sleep 1
-python3 ./src/controller.py --p4info ./build/PatientMonitoring.p4.p4info.txtpb --bmv2-json ./build/PatientMonitoring.json
\ No newline at end of file
+# `make` provisions the switch from build/s1-runtime.json; only load the tables when it was not generated
+if [ ! -f ./build/s1-runtime.json ]; then
+    python3 ./src/table_loader.py --p4info ./build/PatientMonitoring.p4.p4info.txtpb \
+        ./tables/s1-commands-sep.txt ./tables/s1-commands-hf.txt || exit 1
+fi
+python3 ./src/controller.py --p4info ./build/PatientMonitoring.p4.p4info.txtpb --bmv2-json ./build/PatientMonitoring.json
@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 
 import argparse
-import csv
+import logging
 import os
-import random
+import queue
 import sys
 import time
 import threading
@@ -15,171 +15,274 @@ import p4runtime_lib.bmv2
 from p4runtime_lib.error_utils import printGrpcError
 from p4runtime_lib.switch import ShutdownAllSwitchConnections
 import p4runtime_lib.helper
-from scapy.all import Ether, Packet, bind_layers, raw
-from scapy.fields import ByteField, BitField, ShortField, IntField, StrFixedLenField
 
 from p4.v1 import p4runtime_pb2
 
+import controller_log
+import heartbeat
+import planter_codec
+from imputation import impute_missing
+from journal import JournalWriter
+from packet_pipeline import PacketInPipeline, StreamClosed
+from patient_slots import UNKNOWN_PATIENT_DIGEST, SlotManager, parse_patient_ids
+from table_loader import P4InfoIndex, TableLoader, load_p4info, write_request
+from window_tracker import WindowTracker
+
 # ---------------------------
 # Global configuration
 # ---------------------------
 CPU_PORT = 510  # CPU port used in both PacketIn and PacketOut
 CSV_LOG = "./logs/controller_imputation_log.csv"
-NUM_PATIENTS = 2000
+NUM_PATIENTS = 2000  # Register slots, must match NUM_PATIENTS in PatientMonitoring.p4
 HEARTBEAT_NS = 15  # Heartbeat interval in seconds
+HEARTBEAT_MODE = "burst"  # "burst": whole sweep back to back, "paced": spread over HEARTBEAT_NS,
+                          # "digest": only patients whose window (reported by P4 digests) is due,
+                          # "sweep": one recirculating sweep packet checks every slot in the switch
+HEARTBEAT_BATCH = 50  # Heartbeats per micro-batch in paced mode
+HEARTBEAT_PPS = None  # Target heartbeat rate in paced mode (default: NUM_PATIENTS / HEARTBEAT_NS)
+TIMEOUT_S = 60  # Window timeout, must match TIMEOUT_NS in PatientMonitoring.p4
+QUIET_S = 30  # Quiet period after a timeout, must match QUIET_NS in PatientMonitoring.p4
+WINDOW_DIGEST = "window_event_t"  # Digest emitted by the data plane when a window opens/closes
+LOG_LEVEL = "INFO"  # DEBUG adds one line per PacketIn/PacketOut
+DUMP_EVERY = 0  # Full scapy dump of every Nth Planter packet (0: never)
+DUMP_IMPUTED = False  # Full scapy dump of every Planter packet that needed imputation
+DUMP_RATE = 5.0  # Upper bound on packet dumps per second
+NUM_WORKERS = 2  # Threads handling queued PacketIns (imputation + PacketOut)
+QUEUE_SIZE = 1024  # PacketIns buffered between the stream receiver and the workers
+QUEUE_POLICY = "block"  # When the queue is full: "block" the receiver (backpressure) or "drop" the packet
+METRICS_INTERVAL = 30  # Seconds between summary lines (counters, pipeline and journal metrics)
+PATIENT_SLOTS = False  # Program built with `make PATIENT_SLOTS=1`: admit patients into the patient_slot table
+ADMIT = ""  # Patient IDs admitted at startup with PATIENT_SLOTS, e.g. "1000-2999"
+DISCHARGE_IDLE_S = 300  # With PATIENT_SLOTS, discharge patients without window or PacketIn for this long (0: never)
 
-# Ensure CSV log file has a header
-with open(CSV_LOG, "w", newline="") as csvfile:
-    csv.writer(csvfile).writerow(["reception_time", "patient_id", "sensor_id", "old_value", "new_value"])
-
-# ---------------------------
-# Define the Planter header
-# ---------------------------
-class Planter(Packet):
-    name = "Planter"
-    fields_desc = [
-        StrFixedLenField("P", "P", length=1),
-        StrFixedLenField("Four", "4", length=1),
-        ByteField("version", 0x01),
-        ByteField("type", 0x01),
-        IntField("patient_id", 0),
-        BitField("timestamp", 0, 48),
-        ShortField("feature0", 0),
-        ShortField("feature1", 0),
-        ShortField("feature2", 0),
-        ShortField("feature3", 0),
-        ShortField("feature4", 0),
-        ShortField("feature5", 0),
-        ShortField("feature6", 0),
-        ShortField("feature7", 0),
-        ShortField("feature8", 0),
-        ShortField("feature9", 0),
-        IntField("result", 0)
-    ]
-
-# Bind Planter to Ether with EtherType 0x1234
-ETHERTYPE_PLANTER = 0x1234
-bind_layers(Ether, Planter, type=ETHERTYPE_PLANTER)
-
-# ---------------------------
-# Define the Sensor header for heartbeat
-# ---------------------------
-class Sensor(Packet):
-    name = "Sensor"
-    fields_desc = [
-        IntField("patient_id", 0),
-        IntField("sensor_id", 999),
-        BitField("timestamp", 0, 48),
-        ShortField("feature_value", 0)
-    ]
-
-ETHERTYPE_SENSOR = 0x1235
-bind_layers(Ether, Sensor, type=ETHERTYPE_SENSOR)
-
-# ---------------------------
-# Imputation helper: generate plausible random value for each sensor
-# ---------------------------
-def impute_value(sensor_id):
-    if sensor_id == 0:  # temperature (scaled by 10)
-        return random.randint(350, 400)
-    elif sensor_id == 1:  # oxygen saturation
-        return random.randint(90, 100)
-    elif sensor_id == 2:  # pulse rate
-        return random.randint(60, 100)
-    elif sensor_id == 3:  # systolic blood pressure
-        return random.randint(100, 140)
-    elif sensor_id == 4:  # respiratory rate
-        return random.randint(12, 20)
-    elif sensor_id == 5:  # avpu
-        return random.randint(0, 3)
-    elif sensor_id == 6:  # supplemental oxygen (binary)
-        return random.randint(0, 1)
-    elif sensor_id == 7:  # referral source
-        return 1
-    elif sensor_id == 8:  # age
-        return random.randint(30, 80)
-    elif sensor_id == 9:  # sex (0 or 1)
-        return random.randint(0, 1)
-    else:
-        return 1
+log = logging.getLogger("controller")
+
+# Imputation journal: rows are buffered and written in batches by a background thread
+imputation_log = JournalWriter(CSV_LOG, ["reception_time", "patient_id", "sensor_id", "old_value", "new_value"])
 
+window_tracker = WindowTracker(TIMEOUT_S, QUIET_S)
+# PacketOut is called from the heartbeat thread and the PacketIn workers
+send_lock = threading.Lock()
+counters = controller_log.Counters("packet_ins", "ignored", "imputed_packets", "imputed_fields",
+                                   "packet_outs", "errors", "heartbeats", "digests", "sweeps")
+dump_sampler = None  # controller_log.DumpSampler, created in main() from the dump options
+slot_manager = None  # patient_slots.SlotManager, created in main() with PATIENT_SLOTS
+# Patient IDs of unknown-patient digests, admitted by admission_loop so the receiver never waits on a Write
+admission_queue = queue.Queue()
+unknown_patient_digest_id = None
+
+# ---------------------------
+# Logging and PacketOut helpers
+# ---------------------------
 def log_imputation(recv_time, patient_id, sensor_id, old_val, new_val):
-    with open(CSV_LOG, "a", newline="") as csvfile:
-        csv.writer(csvfile).writerow([recv_time, patient_id, sensor_id, old_val, new_val])
+    imputation_log.write([recv_time, patient_id, sensor_id, old_val, new_val])
+
+def send_packet_out(switch_conn, message):
+    with send_lock:
+        switch_conn.PacketOut(message, [])
 
 # ---------------------------
 # Heartbeat sender thread
 # ---------------------------
+def report_paced_sweep(msg):
+    if isinstance(msg, heartbeat.SweepStats):
+        counters.add("heartbeats", msg.packets)
+        log.info("Heartbeat: %s", msg)
+    else:
+        log.warning("Heartbeat: %s", msg)
+
+def heartbeat_patients():
+    """Patient IDs of a full sweep: the admitted patients with PATIENT_SLOTS (re-read on every iteration)."""
+    return slot_manager if slot_manager is not None else range(NUM_PATIENTS)
+
 def heartbeat_loop(switch_conn):
+    if HEARTBEAT_MODE == "sweep":
+        # The switch reports each sweep back as a PacketIn (logged by parse_packet)
+        message = heartbeat.sweep_message()
+        while True:
+            send_packet_out(switch_conn, message)
+            counters.add("sweeps")
+            time.sleep(HEARTBEAT_NS)
+    # The other modes send per-patient heartbeats
+    engine = heartbeat.HeartbeatEngine(lambda msg: send_packet_out(switch_conn, msg))
+    if HEARTBEAT_MODE == "paced":
+        scheduler = heartbeat.PacedScheduler(engine, HEARTBEAT_NS, HEARTBEAT_BATCH, HEARTBEAT_PPS)
+        scheduler.run(heartbeat_patients(), report=report_paced_sweep)
+    if HEARTBEAT_MODE == "digest":
+        # Windows opened before the digest subscription are unknown to the tracker:
+        # keep sweeping everyone until they are all past their quiet period.
+        warmup_end = time.monotonic() + TIMEOUT_S + QUIET_S
+        while time.monotonic() < warmup_end:
+            stats = engine.sweep(heartbeat_patients())
+            counters.add("heartbeats", stats.packets)
+            log.info("Sent warm-up heartbeat packets for all patients: %s", stats)
+            time.sleep(HEARTBEAT_NS)
+        while True:
+            due = window_tracker.due()
+            if due:
+                stats = engine.sweep(due)
+                counters.add("heartbeats", stats.packets)
+                # Due sweeps run every wheel tick; their totals are in the summary line
+                log.debug("Sent heartbeat packets for due windows: %s (%s)", stats, window_tracker)
+            time.sleep(window_tracker.wheel.tick_s)
     while True:
-        for pid in range(NUM_PATIENTS):
-            sensor_pkt = Ether(dst="00:04:00:00:00:00",src="08:00:27:bc:fc:b5",type=ETHERTYPE_SENSOR) / Sensor(patient_id=pid, sensor_id=999, timestamp=0, feature_value=0)            
-            packet_out = p4runtime_pb2.PacketOut()
-            packet_out.payload = raw(sensor_pkt)
-            try:
-                switch_conn.PacketOut(packet_out.SerializeToString(), [])
-            except Exception as e:
-                print(f"Error sending heartbeat for patient {pid}: {e}")
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Sent heartbeat packets for all patients.")
+        stats = engine.sweep(heartbeat_patients())
+        counters.add("heartbeats", stats.packets)
+        log.info("Sent heartbeat packets for all patients: %s", stats)
         time.sleep(HEARTBEAT_NS)
 
+# ---------------------------
+# Window digests
+# ---------------------------
+def enable_digest(switch_conn, p4info_helper, name):
+    digest_entry = p4runtime_pb2.DigestEntry()
+    digest_entry.digest_id = p4info_helper.get_digests_id(name)
+    digest_entry.config.max_timeout_ns = 10000000  # deliver at least every 10 ms
+    digest_entry.config.max_list_size = 128
+    digest_entry.config.ack_timeout_ns = 1000000000
+
+    request = p4runtime_pb2.WriteRequest()
+    request.device_id = switch_conn.device_id
+    request.election_id.low = 1
+    update = request.updates.add()
+    update.type = p4runtime_pb2.Update.INSERT
+    update.entity.digest_entry.CopyFrom(digest_entry)
+    switch_conn.client_stub.Write(request)
+
+def handle_digest(switch_conn, digest_list):
+    counters.add("digests")
+    if digest_list.digest_id == unknown_patient_digest_id:
+        admission_queue.put([int.from_bytes(data.struct.members[0].bitstring, "big") for data in digest_list.data])
+    else:
+        for data in digest_list.data:
+            pid, timestamp, event = (int.from_bytes(m.bitstring, "big") for m in data.struct.members)
+            window_tracker.on_event(pid, timestamp, event)
+            if slot_manager is not None:
+                slot_manager.touch(pid)
+
+    ack = p4runtime_pb2.StreamMessageRequest()
+    ack.digest_ack.digest_id = digest_list.digest_id
+    ack.digest_ack.list_id = digest_list.list_id
+    switch_conn.requests_stream.put(ack)
+
+# ---------------------------
+# Patient slots
+# ---------------------------
+def slot_writer(switch_conn):
+    """SlotManager write callback: one WriteRequest per admission or discharge batch."""
+    loader = TableLoader(switch_conn.channel, switch_conn.device_id, election_id=1)
+    return lambda updates: loader.write(write_request(loader.header, updates))
+
+def admit_patients(patient_ids):
+    try:
+        admitted = slot_manager.admit(patient_ids)
+    except grpc.RpcError as e:
+        counters.add("errors")
+        log.error("Admitting patients failed: %s %s", e.code().name, e.details())
+        return
+    if admitted:
+        log.debug("Admitted patients %s", admitted)
+
+def admission_loop():
+    """Admit the patients queued by handle_digest, merging the digests that arrived during the last Write."""
+    while True:
+        patient_ids = admission_queue.get()
+        while not admission_queue.empty():
+            patient_ids += admission_queue.get_nowait()
+        try:
+            admit_patients(patient_ids)
+        except Exception:
+            counters.add("errors")
+            log.exception("Admitting patients failed")
+
+def discharge_idle_patients():
+    idle = slot_manager.idle(DISCHARGE_IDLE_S)
+    if not idle:
+        return
+    try:
+        slot_manager.discharge(idle)
+    except grpc.RpcError as e:
+        counters.add("errors")
+        log.error("Discharging patients failed: %s %s", e.code().name, e.details())
+        return
+    log.info("Discharged %d idle patients", len(idle))
+
 # ---------------------------
 # Parse and process packet
 # ---------------------------
 def parse_packet(raw_payload, p4info_helper, switch_conn):
+    # Hot path: at INFO level nothing below formats a string unless the packet is sampled for a dump
     try:
-        pkt = Ether(raw_payload)
-        if Planter not in pkt:
-            print("Received PacketIn does not contain a Planter header; ignoring.")
+        counters.add("packet_ins")
+        buf = bytearray(raw_payload)
+        if not planter_codec.is_planter(buf):
+            report = heartbeat.parse_sweep_report(buf)
+            if report is not None:
+                log.info("Timeout sweep done: %s", report)
+                return
+            counters.add("ignored")
+            log.debug("PacketIn of %d bytes has no Planter header; ignoring.", len(buf))
             return
 
-        planter = pkt[Planter]
-        recv_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        patient_id = planter.patient_id
-        imputed = False
-
-        for sensor_id in range(10):
-            if sensor_id in [5, 6, 7, 8, 9]:  # Skip non-numeric fields
-                continue
-            field_name = f"feature{sensor_id}"
-            cur_val = getattr(planter, field_name)
-            if cur_val == 0:
-                new_val = impute_value(sensor_id)
-                log_imputation(recv_time, patient_id, sensor_id, cur_val, new_val)
-                print(f"[{recv_time}] Imputing {field_name} for patient {patient_id}: {cur_val} -> {new_val}")
-                setattr(planter, field_name, new_val)
-                imputed = True
+        patient_id = planter_codec.patient_id(buf)
+        if slot_manager is not None:
+            slot_manager.touch(patient_id)
+        imputed = impute_missing(buf)
 
         if imputed:
-            print(f"[{recv_time}] Modified Planter packet for patient {patient_id}:\n{planter.show2(dump=True)}")
-        else:
-            print(f"[{recv_time}] Received complete Planter packet for patient {patient_id}:\n{planter.show2(dump=True)}")
+            recv_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            for sensor_id, cur_val, new_val in imputed:
+                log_imputation(recv_time, patient_id, sensor_id, cur_val, new_val)
+            counters.add("imputed_packets")
+            counters.add("imputed_fields", len(imputed))
 
-        packet_out = p4runtime_pb2.PacketOut()
-        packet_out.payload = raw(pkt)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("%s Planter packet for patient %d: features=%s, imputed=%s",
+                      "Modified" if imputed else "Received complete", patient_id,
+                      list(planter_codec.features(buf)), imputed)
+        if dump_sampler.enabled and dump_sampler.should_dump(anomaly=bool(imputed)):
+            log.info("Sampled Planter packet for patient %d (imputed %s):\n%s",
+                     patient_id, imputed, planter_codec.debug_view(buf))
 
-        print(f"[{recv_time}] Sending PacketOut to egress port {CPU_PORT}.")
-        switch_conn.PacketOut(packet_out.SerializeToString(), [])
+        packet_out = p4runtime_pb2.PacketOut()
+        packet_out.payload = bytes(buf)
+        send_packet_out(switch_conn, packet_out.SerializeToString())
+        counters.add("packet_outs")
 
-    except Exception as e:
-        print(f"Error parsing packet: {e}")
+    except Exception:
+        counters.add("errors")
+        log.exception("Error parsing packet")
 
 # ---------------------------
-# Packet-in handler
+# Packet-in receiver
 # ---------------------------
-def handle_packet_in(switch_conn, p4info_helper):
+def receive_stream_message(switch_conn):
+    # PacketIn() blocks for the next message: None means the response stream has ended
     try:
-        pktin = switch_conn.PacketIn()
-        if pktin is not None:
-            print(f"Received PacketIn: payload length = {len(pktin.packet.payload)} bytes")
-            parse_packet(pktin.packet.payload, p4info_helper, switch_conn)
+        msg = switch_conn.PacketIn()
     except grpc.RpcError as e:
+        counters.add("errors")
         printGrpcError(e)
+        raise StreamClosed(f"{e.code().name}: {e.details()}") from e
+    if msg is None:
+        raise StreamClosed("stream ended")
+    return msg
+
+def route_stream_message(switch_conn, msg):
+    """Handle digests inline on the receiver thread; return PacketIn payloads for the workers."""
+    update = msg.WhichOneof("update")
+    if update == "digest":
+        handle_digest(switch_conn, msg.digest)
+    elif update == "packet":
+        return msg.packet.payload
+    return None
 
 # ---------------------------
 # Main controller
 # ---------------------------
 def main(p4info_file_path, bmv2_file_path):
+    global dump_sampler, slot_manager, unknown_patient_digest_id
+    dump_sampler = controller_log.DumpSampler(DUMP_EVERY, DUMP_IMPUTED, DUMP_RATE)
     p4info_helper = p4runtime_lib.helper.P4InfoHelper(p4info_file_path)
 
     try:
@@ -191,29 +294,87 @@ def main(p4info_file_path, bmv2_file_path):
         )
 
         if switch_conn.MasterArbitrationUpdate() is None:
-            print("Failed to establish mastership with switch")
+            log.error("Failed to establish mastership with switch")
             sys.exit(1)
 
-        print("Controller is now listening for PacketIn messages...")
+        if PATIENT_SLOTS:
+            slot_manager = SlotManager(NUM_PATIENTS, P4InfoIndex(load_p4info(p4info_file_path)),
+                                       slot_writer(switch_conn))
+            admit_patients(parse_patient_ids(ADMIT))
+            unknown_patient_digest_id = p4info_helper.get_digests_id(UNKNOWN_PATIENT_DIGEST)
+            threading.Thread(target=admission_loop, name="admission", daemon=True).start()
+            enable_digest(switch_conn, p4info_helper, UNKNOWN_PATIENT_DIGEST)
+            log.info("Managing patient slots: %s", slot_manager)
+
+        if HEARTBEAT_MODE == "digest" or PATIENT_SLOTS:
+            # With PATIENT_SLOTS the window digests also mark patients as active
+            enable_digest(switch_conn, p4info_helper, WINDOW_DIGEST)
+            log.info("Subscribed to window open/close digests.")
+
+        log.info("Controller is now listening for PacketIn messages...")
 
         # Start heartbeat thread
         heartbeat_thread = threading.Thread(target=heartbeat_loop, args=(switch_conn,))
         heartbeat_thread.daemon = True
         heartbeat_thread.start()
 
-        # Start packet-in handler
-        while True:
-            handle_packet_in(switch_conn, p4info_helper)
+        # Start packet-in receiver and workers
+        pipeline = PacketInPipeline(
+            receive=lambda: receive_stream_message(switch_conn),
+            route=lambda msg: route_stream_message(switch_conn, msg),
+            handle=lambda payload: parse_packet(payload, p4info_helper, switch_conn),
+            num_workers=NUM_WORKERS, queue_size=QUEUE_SIZE, policy=QUEUE_POLICY)
+        pipeline.start()
+        while not pipeline.stopped.wait(METRICS_INTERVAL):
+            log.info("Summary: %s", counters.summary(METRICS_INTERVAL))
+            log.info("PacketIn pipeline: %s; %s", pipeline.stats(), dump_sampler)
+            log.info("Imputation journal: %s", imputation_log)
+            if slot_manager is not None:
+                if DISCHARGE_IDLE_S:
+                    discharge_idle_patients()
+                log.info("Patient slots: %s", slot_manager)
+        log.error("PacketIn stream closed (%s); stopping the controller. PacketIn pipeline: %s",
+                  pipeline.stream_error, pipeline.stats())
+        sys.exit(1)
 
     except grpc.RpcError as e:
         printGrpcError(e)
     finally:
+        imputation_log.close()
         ShutdownAllSwitchConnections()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="P4Runtime Controller for Planter Packet Imputation with Heartbeat")
     parser.add_argument("--p4info", type=str, required=True, help="Path to the p4info file in text pb format")
     parser.add_argument("--bmv2-json", type=str, required=True, help="Path to the BMv2 JSON file")
+    parser.add_argument("--log-level", choices=controller_log.LOG_LEVELS, default=LOG_LEVEL,
+                        help="Logging level; DEBUG logs every PacketIn and heartbeat sweep")
+    parser.add_argument("--dump-every", type=int, default=DUMP_EVERY, metavar="N",
+                        help="Log the full scapy dump of every Nth Planter packet (0: never)")
+    parser.add_argument("--dump-imputed", action="store_true",
+                        help="Log the full scapy dump of every Planter packet that needed imputation")
+    parser.add_argument("--dump-rate", type=float, default=DUMP_RATE,
+                        help="Maximum packet dumps per second; extra sampled packets are only counted")
+    parser.add_argument("--heartbeat-mode", choices=["burst", "paced", "digest", "sweep"], default=HEARTBEAT_MODE,
+                        help="Send each heartbeat sweep back to back (burst), spread it over the interval (paced), "
+                             "only to patients whose window is due to expire, as reported by digests (digest), "
+                             "or replace it by one sweep packet the switch recirculates over every slot (sweep)")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="Number of PacketIn worker threads")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="Capacity of the PacketIn queue")
+    parser.add_argument("--queue-policy", choices=["block", "drop"], default=QUEUE_POLICY,
+                        help="On a full PacketIn queue, block the stream receiver (backpressure) or drop and count")
+    parser.add_argument("--metrics-interval", type=float, default=METRICS_INTERVAL,
+                        help="Seconds between summary lines with the packet counters and pipeline metrics")
+    parser.add_argument("--heartbeat-batch", type=int, default=HEARTBEAT_BATCH, help="Heartbeats per micro-batch in paced mode")
+    parser.add_argument("--heartbeat-pps", type=float, default=HEARTBEAT_PPS,
+                        help="Target heartbeat packets/s in paced mode (default: spread evenly over the interval)")
+    parser.add_argument("--patient-slots", action="store_true",
+                        help="The program was built with PATIENT_SLOTS: admit patients into the patient_slot table, "
+                             "on unknown-patient digests and from --admit, and discharge idle ones")
+    parser.add_argument("--admit", type=str, default=ADMIT, metavar="IDS",
+                        help="Patient IDs and ranges to admit at startup with --patient-slots, e.g. 1000-2999,5000")
+    parser.add_argument("--discharge-idle", type=float, default=DISCHARGE_IDLE_S, metavar="SECONDS",
+                        help="With --patient-slots, discharge patients idle for this long (0: never)")
 
     args = parser.parse_args()
     if not os.path.exists(args.p4info):
@@ -223,4 +384,23 @@ if __name__ == "__main__":
         print(f"BMv2 JSON file {args.bmv2_json} not found!")
         sys.exit(2)
 
+    controller_log.configure(args.log_level)
+    DUMP_EVERY = args.dump_every
+    DUMP_IMPUTED = args.dump_imputed
+    DUMP_RATE = args.dump_rate
+    HEARTBEAT_MODE = args.heartbeat_mode
+    HEARTBEAT_BATCH = args.heartbeat_batch
+    HEARTBEAT_PPS = args.heartbeat_pps
+    NUM_WORKERS = args.workers
+    QUEUE_SIZE = args.queue_size
+    QUEUE_POLICY = args.queue_policy
+    METRICS_INTERVAL = args.metrics_interval
+    PATIENT_SLOTS = args.patient_slots
+    DISCHARGE_IDLE_S = args.discharge_idle
+    try:
+        parse_patient_ids(args.admit)
+    except ValueError as e:
+        print(f"--admit: {e}")
+        sys.exit(1)
+    ADMIT = args.admit
     main(args.p4info, args.bmv2_json)
\ No newline at end of file
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Asyncio P4Runtime controller (grpc.aio).
+
+Alternative entry point to controller.py: each gateway gets a StreamChannel
+task (arbitration, PacketIn imputation/PacketOut, digests), a heartbeat task,
+a table-write task and a metrics task, all cooperating on one event loop, so
+there is no shared connection between threads and one process can drive
+several gateways. When a gateway's stream ends or fails, its tasks are cancelled;
+the controller exits with status 1 once every gateway has stopped.
+
+Example:
+    python3 ./src/controller_aio.py --p4info ./build/PatientMonitoring.p4.p4info.txtpb \
+        --switch s1=127.0.0.1:50051/0 --switch s2=127.0.0.1:50052/0
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+import grpc
+from p4.v1 import p4runtime_pb2, p4runtime_pb2_grpc
+
+import controller_log
+import heartbeat
+import planter_codec
+from imputation import impute_missing
+from journal import JournalWriter
+from packet_pipeline import StreamClosed
+from patient_slots import UNKNOWN_PATIENT_DIGEST, SlotManager, parse_patient_ids
+from table_loader import P4InfoIndex, load_p4info, write_request
+from window_tracker import WindowTracker
+
+# ---------------------------
+# Global configuration
+# ---------------------------
+CSV_LOG = "./logs/controller_imputation_log.csv"
+NUM_PATIENTS = 2000  # Register slots, must match NUM_PATIENTS in PatientMonitoring.p4
+HEARTBEAT_NS = 15  # Heartbeat interval in seconds
+TIMEOUT_S = 60  # Window timeout, must match TIMEOUT_NS in PatientMonitoring.p4
+QUIET_S = 30  # Quiet period after a timeout, must match QUIET_NS in PatientMonitoring.p4
+WINDOW_DIGEST = "window_event_t"
+ELECTION_ID = 1
+LOG_LEVEL = "INFO"  # DEBUG adds one line per PacketIn
+
+log = logging.getLogger("controller_aio")
+
+
+def serialize_request(message):
+    """StreamChannel request serializer that passes pre-serialized heartbeat templates through."""
+    if isinstance(message, (bytes, bytearray)):
+        return bytes(message)
+    return message.SerializeToString()
+
+
+def now_str():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Gateway:
+    """One switch: stream channel, heartbeats, table writes and metrics as tasks."""
+
+    def __init__(self, name, address, device_id, p4info, args, imputation_log):
+        self.name = name
+        self.address = address
+        self.device_id = device_id
+        self.p4info = p4info
+        self.args = args
+        self.imputation_log = imputation_log
+        self.outbox = asyncio.Queue()
+        self.writes = asyncio.Queue()
+        self.mastership = asyncio.Event()
+        # Sweep mode sends one sweep packet per interval instead of per-patient heartbeats
+        self.engine = (heartbeat.HeartbeatEngine(self.outbox.put_nowait, stream_request=True)
+                       if args.heartbeat_mode != "sweep" else None)
+        self.tracker = WindowTracker(TIMEOUT_S, QUIET_S)
+        # With --patient-slots: admissions await their Write, so a rejected one is rolled back
+        self.slots = SlotManager(NUM_PATIENTS, P4InfoIndex(p4info), self.write_updates) if args.patient_slots else None
+        self.unknown_patient_digest_id = next(
+            (d.preamble.id for d in p4info.digests if d.preamble.name == UNKNOWN_PATIENT_DIGEST), None)
+        self.stub = None
+        self.stream = None
+        self.packet_ins = self.packet_outs = self.imputed = self.ignored = 0
+        self.digests = self.heartbeats = self.sweeps = self.writes_ok = self.writes_failed = 0
+        self.handle_time = 0.0
+        self.tasks = set()  # admissions started from digests, referenced until done
+
+    # ---------------------------
+    # Stream channel
+    # ---------------------------
+    async def _requests(self):
+        arbitration = p4runtime_pb2.StreamMessageRequest()
+        arbitration.arbitration.device_id = self.device_id
+        arbitration.arbitration.election_id.low = ELECTION_ID
+        yield arbitration
+        while True:
+            yield await self.outbox.get()
+
+    async def stream_task(self):
+        """Handle stream responses; raises StreamClosed when the stream ends or fails."""
+        try:
+            async for response in self.stream(self._requests()):
+                self.handle_response(response)
+        except grpc.aio.AioRpcError as e:
+            log.error("%s: stream failed: %s %s", self.name, e.code().name, e.details())
+            raise StreamClosed(f"{e.code().name}: {e.details()}") from e
+        log.error("%s: stream closed by the switch", self.name)
+        raise StreamClosed("stream ended")
+
+    def handle_response(self, response):
+        update = response.WhichOneof("update")
+        if update == "packet":
+            self.handle_packet_in(response.packet.payload)
+        elif update == "digest":
+            self.handle_digest(response.digest)
+        elif update == "arbitration":
+            if response.arbitration.status.code == 0:  # google.rpc.Code.OK
+                log.info("%s: mastership acquired", self.name)
+                self.mastership.set()
+            else:
+                log.warning("%s: not primary controller (%s)", self.name, response.arbitration.status.message)
+        elif update == "error":
+            log.error("%s: stream error %s: %s", self.name, response.error.canonical_code, response.error.message)
+
+    def handle_packet_in(self, payload):
+        start = time.perf_counter()
+        self.packet_ins += 1
+        buf = bytearray(payload)
+        if not planter_codec.is_planter(buf):
+            report = heartbeat.parse_sweep_report(buf)
+            if report is not None:
+                log.info("%s: timeout sweep done: %s", self.name, report)
+                return
+            self.ignored += 1
+            return
+        patient_id = planter_codec.patient_id(buf)
+        if self.slots is not None:
+            self.slots.touch(patient_id)
+        imputed = impute_missing(buf)
+        if imputed:
+            recv_time = now_str()
+            for sid, old, new in imputed:
+                self.imputation_log.write([recv_time, patient_id, sid, old, new])
+            self.imputed += len(imputed)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("%s: %s Planter packet for patient %d: features=%s, imputed=%s", self.name,
+                      "Modified" if imputed else "Received complete", patient_id,
+                      list(planter_codec.features(buf)), imputed)
+        packet_out = p4runtime_pb2.StreamMessageRequest()
+        packet_out.packet.payload = bytes(buf)
+        self.outbox.put_nowait(packet_out)
+        self.packet_outs += 1
+        self.handle_time += time.perf_counter() - start
+
+    def handle_digest(self, digest_list):
+        self.digests += 1
+        if digest_list.digest_id == self.unknown_patient_digest_id:
+            if self.slots is not None:
+                self.spawn(self.admit([int.from_bytes(data.struct.members[0].bitstring, "big")
+                                       for data in digest_list.data]))
+        else:
+            for data in digest_list.data:
+                pid, timestamp, event = (int.from_bytes(m.bitstring, "big") for m in data.struct.members)
+                self.tracker.on_event(pid, timestamp, event)
+                if self.slots is not None:
+                    self.slots.touch(pid)
+        ack = p4runtime_pb2.StreamMessageRequest()
+        ack.digest_ack.digest_id = digest_list.digest_id
+        ack.digest_ack.list_id = digest_list.list_id
+        self.outbox.put_nowait(ack)
+
+    def spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    # ---------------------------
+    # Patient slots
+    # ---------------------------
+    async def admit(self, patient_ids):
+        try:
+            admitted = await self.slots.admit_async(patient_ids)
+        except grpc.aio.AioRpcError as e:
+            log.error("%s: admitting patients failed: %s %s", self.name, e.code().name, e.details())
+            return
+        if admitted:
+            log.debug("%s: admitted patients %s", self.name, admitted)
+
+    async def discharge_idle(self):
+        idle = self.slots.idle(self.args.discharge_idle)
+        if not idle:
+            return
+        try:
+            discharged = await self.slots.discharge_async(idle)
+        except grpc.aio.AioRpcError as e:
+            log.error("%s: discharging patients failed: %s %s", self.name, e.code().name, e.details())
+            return
+        log.info("%s: discharged %d idle patients", self.name, len(discharged))
+
+    async def slots_task(self):
+        await self.mastership.wait()
+        await self.admit(parse_patient_ids(self.args.admit))
+        while self.args.discharge_idle:
+            await asyncio.sleep(self.args.metrics_interval)
+            await self.discharge_idle()
+
+    # ---------------------------
+    # Heartbeats
+    # ---------------------------
+    def patient_ids(self):
+        """Patient IDs of a full sweep: the admitted patients with --patient-slots (re-read on every iteration)."""
+        return self.slots if self.slots is not None else range(NUM_PATIENTS)
+
+    def _sweep(self, patient_ids):
+        stats = self.engine.sweep(patient_ids)
+        self.heartbeats += stats.packets
+        return stats
+
+    def report_paced_sweep(self, msg):
+        if isinstance(msg, heartbeat.SweepStats):
+            self.heartbeats += msg.packets
+        else:
+            log.warning("%s: heartbeat: %s", self.name, msg)
+
+    async def heartbeat_task(self):
+        await self.mastership.wait()
+        mode = self.args.heartbeat_mode
+        start = time.monotonic()
+        if mode == "sweep":
+            message = heartbeat.sweep_message(stream_request=True)
+            while True:
+                self.outbox.put_nowait(message)
+                self.sweeps += 1
+                start += HEARTBEAT_NS
+                await asyncio.sleep(max(0.0, start - time.monotonic()))
+        if mode == "digest":
+            # Full sweeps until windows opened before the subscription are past their quiet period
+            warmup_end = start + TIMEOUT_S + QUIET_S
+            while time.monotonic() < warmup_end:
+                self._sweep(self.patient_ids())
+                start += HEARTBEAT_NS
+                await asyncio.sleep(max(0.0, start - time.monotonic()))
+            while True:
+                due = self.tracker.due()
+                if due:
+                    self._sweep(due)
+                await asyncio.sleep(self.tracker.wheel.tick_s)
+        if mode == "paced":
+            scheduler = heartbeat.PacedScheduler(self.engine, HEARTBEAT_NS, self.args.heartbeat_batch,
+                                                 self.args.heartbeat_pps)
+            await scheduler.run_async(self.patient_ids(), report=self.report_paced_sweep)
+        while True:
+            self._sweep(self.patient_ids())
+            start += HEARTBEAT_NS
+            await asyncio.sleep(max(0.0, start - time.monotonic()))
+
+    # ---------------------------
+    # Table writes
+    # ---------------------------
+    def write(self, request):
+        """Queue a WriteRequest; device and election IDs are filled in."""
+        request.device_id = self.device_id
+        request.election_id.low = ELECTION_ID
+        self.writes.put_nowait(request)
+
+    async def write_task(self):
+        await self.mastership.wait()
+        while True:
+            request = await self.writes.get()
+            try:
+                await self.stub.Write(request)
+                self.writes_ok += len(request.updates)
+            except grpc.aio.AioRpcError as e:
+                self.writes_failed += len(request.updates)
+                log.error("%s: Write failed: %s %s", self.name, e.code().name, e.details())
+
+    async def write_updates(self, updates):
+        """Write a WriteRequest of pre-serialized Updates and wait for it; raises AioRpcError if rejected."""
+        request = p4runtime_pb2.WriteRequest.FromString(write_request(b"", updates))
+        request.device_id = self.device_id
+        request.election_id.low = ELECTION_ID
+        try:
+            await self.stub.Write(request)
+        except grpc.aio.AioRpcError:
+            self.writes_failed += len(request.updates)
+            raise
+        self.writes_ok += len(request.updates)
+
+    def enable_digest(self, name):
+        digest_id = next(d.preamble.id for d in self.p4info.digests if d.preamble.name == name)
+        request = p4runtime_pb2.WriteRequest()
+        update = request.updates.add()
+        update.type = p4runtime_pb2.Update.INSERT
+        update.entity.digest_entry.digest_id = digest_id
+        update.entity.digest_entry.config.max_timeout_ns = 10000000
+        update.entity.digest_entry.config.max_list_size = 128
+        update.entity.digest_entry.config.ack_timeout_ns = 1000000000
+        self.write(request)
+
+    # ---------------------------
+    # Metrics
+    # ---------------------------
+    def stats(self):
+        per_packet = self.handle_time / self.packet_outs * 1e6 if self.packet_outs else 0.0
+        return (f"{self.name}: PacketIn {self.packet_ins} (ignored {self.ignored}), PacketOut {self.packet_outs} "
+                f"({per_packet:.1f} us/packet), imputed {self.imputed}, heartbeats {self.heartbeats}, "
+                f"sweeps {self.sweeps}, digests {self.digests} [{self.tracker}], "
+                f"writes {self.writes_ok} ok/{self.writes_failed} failed, "
+                f"outbox {self.outbox.qsize()}" + (f", patient slots [{self.slots}]" if self.slots is not None else ""))
+
+    async def metrics_task(self):
+        while True:
+            await asyncio.sleep(self.args.metrics_interval)
+            log.info("%s", self.stats())
+
+    async def run(self):
+        async with grpc.aio.insecure_channel(self.address) as channel:
+            self.stub = p4runtime_pb2_grpc.P4RuntimeStub(channel)
+            self.stream = channel.stream_stream(
+                "/p4.v1.P4Runtime/StreamChannel",
+                request_serializer=serialize_request,
+                response_deserializer=p4runtime_pb2.StreamMessageResponse.FromString)
+            tasks = [self.stream_task(), self.heartbeat_task(), self.write_task(), self.metrics_task()]
+            if self.slots is not None:
+                tasks.append(self.slots_task())
+                self.enable_digest(UNKNOWN_PATIENT_DIGEST)
+            if self.args.heartbeat_mode == "digest" or self.slots is not None:
+                self.enable_digest(WINDOW_DIGEST)
+            log.info("%s: connecting to %s (device %d)", self.name, self.address, self.device_id)
+            tasks = [asyncio.ensure_future(task) for task in tasks]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                # A closed stream ends the gateway: stop its other tasks and pending admissions
+                for task in tasks + list(self.tasks):
+                    task.cancel()
+                await asyncio.gather(*tasks, *self.tasks, return_exceptions=True)
+                log.info("%s", self.stats())
+
+
+def parse_switch(spec):
+    """name=host:port[/device_id]"""
+    name, _, target = spec.partition("=")
+    address, _, device_id = target.partition("/")
+    if not name or not address:
+        raise argparse.ArgumentTypeError(f"Expected name=host:port[/device_id], got {spec!r}")
+    return name, address, int(device_id or 0)
+
+
+async def main(args):
+    p4info = load_p4info(args.p4info)
+    # Shared by all gateways; JournalWriter.write never blocks the event loop on disk I/O
+    imputation_log = JournalWriter(CSV_LOG, ["reception_time", "patient_id", "sensor_id", "old_value", "new_value"])
+    gateways = [Gateway(name, address, device_id, p4info, args, imputation_log)
+                for name, address, device_id in (args.switch or [("s1", "127.0.0.1:50051", 0)])]
+    try:
+        results = await asyncio.gather(*(gw.run() for gw in gateways), return_exceptions=True)
+    finally:
+        imputation_log.close()
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(result, StreamClosed):
+            raise result
+    # The other gateways keep running until their own stream closes
+    return sum(isinstance(result, StreamClosed) for result in results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asyncio P4Runtime controller for Planter imputation and heartbeats")
+    parser.add_argument("--p4info", type=str, required=True, help="Path to the p4info file in text pb format")
+    parser.add_argument("--switch", type=parse_switch, action="append",
+                        help="Gateway as name=host:port[/device_id]; repeat for several gateways "
+                             "(default: s1=127.0.0.1:50051/0)")
+    parser.add_argument("--heartbeat-mode", choices=["burst", "paced", "digest", "sweep"], default="burst",
+                        help="Heartbeat scheduling, as in controller.py")
+    parser.add_argument("--heartbeat-batch", type=int, default=50, help="Heartbeats per micro-batch in paced mode")
+    parser.add_argument("--heartbeat-pps", type=float, default=None, help="Target heartbeat packets/s in paced mode")
+    parser.add_argument("--log-level", choices=controller_log.LOG_LEVELS, default=LOG_LEVEL,
+                        help="Logging level; DEBUG logs every PacketIn")
+    parser.add_argument("--metrics-interval", type=float, default=30, help="Seconds between metrics lines")
+    parser.add_argument("--patient-slots", action="store_true",
+                        help="The program was built with PATIENT_SLOTS: manage the patient_slot table, as in controller.py")
+    parser.add_argument("--admit", type=str, default="", metavar="IDS",
+                        help="Patient IDs and ranges to admit at startup with --patient-slots, e.g. 1000-2999,5000")
+    parser.add_argument("--discharge-idle", type=float, default=300, metavar="SECONDS",
+                        help="With --patient-slots, discharge patients idle for this long (0: never)")
+
+    args = parser.parse_args()
+    if not os.path.exists(args.p4info):
+        print(f"p4info file {args.p4info} not found!")
+        sys.exit(1)
+    try:
+        parse_patient_ids(args.admit)
+    except ValueError as e:
+        print(f"--admit: {e}")
+        sys.exit(1)
+
+    controller_log.configure(args.log_level)
+    try:
+        closed = asyncio.run(main(args))
+    except KeyboardInterrupt:
+        closed = 0
+    if closed:
+        log.error("%d gateway stream(s) closed; stopping the controller", closed)
+        sys.exit(1)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Logging helpers for the controller.
+
+Per-packet output goes through the standard logging module at DEBUG level,
+so at the default INFO level the PacketIn path only bumps counters and never
+formats a string. Full packet dumps are sampled (every Nth packet and/or every
+packet that needed imputation) and rate-limited by a token bucket, and the
+counters are reported as one summary line every few seconds.
+"""
+
+import logging
+import threading
+import time
+
+LOG_FORMAT = "[%(asctime)s] %(levelname)s %(threadName)s: %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+
+
+def configure(level="INFO"):
+    logging.basicConfig(level=getattr(logging, level), format=LOG_FORMAT, datefmt=DATE_FORMAT)
+
+
+class Counters:
+    """Thread-safe named counters; snapshot() returns the totals and the deltas since the last call."""
+
+    def __init__(self, *names):
+        self.values = dict.fromkeys(names, 0)
+        self.last = dict(self.values)
+        self.lock = threading.Lock()
+
+    def add(self, name, n=1):
+        with self.lock:
+            self.values[name] += n
+
+    def snapshot(self):
+        with self.lock:
+            totals = dict(self.values)
+        deltas = {name: totals[name] - self.last[name] for name in totals}
+        self.last = totals
+        return totals, deltas
+
+    def summary(self, interval_s):
+        """One line with each counter's total and rate over the last interval."""
+        totals, deltas = self.snapshot()
+        return ", ".join(f"{name} {totals[name]} (+{deltas[name] / interval_s:.1f}/s)" for name in totals)
+
+
+class DumpSampler:
+    """Decides which packets get a full dump.
+
+    A packet is picked if it is the Nth one seen (every > 0) or if it is an
+    anomaly and anomalies is set; picked packets are then rate-limited to
+    max_per_s with a burst of the same size. Suppressed dumps are counted.
+    """
+
+    def __init__(self, every=0, anomalies=False, max_per_s=5.0, clock=time.monotonic):
+        self.every = every
+        self.anomalies = anomalies
+        self.max_per_s = max_per_s
+        self.clock = clock
+        self.tokens = max_per_s
+        self.refilled = clock()
+        self.seen = self.dumped = self.suppressed = 0
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.every > 0 or self.anomalies
+
+    def should_dump(self, anomaly=False):
+        with self.lock:
+            self.seen += 1
+            if not ((self.every and self.seen % self.every == 0) or (anomaly and self.anomalies)):
+                return False
+            now = self.clock()
+            self.tokens = min(self.max_per_s, self.tokens + (now - self.refilled) * self.max_per_s)
+            self.refilled = now
+            if self.tokens < 1:
+                self.suppressed += 1
+                return False
+            self.tokens -= 1
+            self.dumped += 1
+            return True
+
+    def __str__(self):
+        return f"{self.dumped} packet dumps, {self.suppressed} suppressed by the rate limit"
@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+"""
+Software stand-in for simple_switch_grpc running PatientMonitoring.p4.
+
+Frames are read from veth or TAP interfaces numbered like simple_switch's
+`-i 1@veth0`, go through the program's ingress, and leave on the port it
+chooses: Alerts on MONITORING_PORT, Planter packets of timed-out windows on
+CPU_PORT, which is a P4Runtime server (src/p4runtime_server.py) at the
+address simple_switch_grpc uses. The controllers, simulators, monitor and
+tests therefore run against it unchanged; e.g. the tests' two NICs become TAP
+devices with
+
+    sudo python3 ./src/dataplane_emulator.py --tap -i 1@enx0c37965f8a0a -i 2@enx0c37965f8a10
+
+and the README setup (simulator on s1-eth2, monitor on s1-eth1) with
+`--tap -i 1@s1-eth1 -i 2@s1-eth2`. Without --tap the interfaces must exist and
+are opened as raw sockets, e.g. the switch ends of veth pairs.
+
+DataPlane holds the window registers in flat arrays (first timestamp,
+presence bitmap and the 10 features of every patient) and runs the sensor,
+heartbeat, VitalsBundle and Planter logic of the ingress per packet, with the program's
+NUM_PATIENTS, TIMEOUT_NS and QUIET_NS and ingress timestamps in
+microseconds. Complete windows and Planter packets are collected per batch
+of frames and their inference (NEWS2, the feature, leaf and decision tables)
+is run by src/reference_engine.py over the whole batch, from the variant's
+tables/*.txt; results are cached per feature vector, since inference only
+depends on the features. A sweep packet runs all its recirculation passes
+at once: the Planter packets of the timed-out windows and then the report go
+to the CPU. Window digests are sent once the controller subscribed to them.
+With `--define PIGGYBACK_EXPIRY` spare sensor packets check the slot under the
+round-robin expiry cursor, as in `make PIGGYBACK_EXPIRY=1` builds, and with
+`--define LOCF_IMPUTATION` timed-out windows of patients with a complete
+window are filled from its vitals and inferred instead of sent to the CPU.
+
+Not emulated: egress port 0, where the program leaves the sensor packets it
+does not drop (no port 0 is attached in topology.json); table writes over
+P4Runtime, which are accepted but do not change the tables, hence also the
+patient_slot table of PATIENT_SLOTS builds (registers stay indexed by patient
+ID); and the parser's 2-byte skip on CPU_PORT, since the controllers'
+PacketOut payloads start with the Ethernet header (--cpu-skip 2 applies it).
+"""
+
+import argparse
+import fcntl
+import os
+import select
+import socket
+import struct
+import sys
+import time
+from array import array
+from collections import deque
+
+import numpy as np
+
+import planter_codec
+from heartbeat import ETHERTYPE_SENSOR, ETHERTYPE_SWEEP, HEARTBEAT_SENSOR_ID, SENSOR, SWEEP
+from p4runtime_server import P4RuntimeServer
+from reference_engine import EngineError, parse_define, variant_program
+from sensor_frames import BUNDLE, ETHERTYPE_BUNDLE
+from table_commands import TableCommandError
+
+CPU_PORT = 510  # must match CPU_PORT in PatientMonitoring.p4
+MONITORING_PORT = 1  # must match MONITORING_PORT in PatientMonitoring.p4
+ETHERTYPE_ALERT = 0x1236
+NUM_FEATURES = planter_codec.NUM_FEATURES
+FEATURE_MASKS = (0xFFFF,) * 8 + (0xFF, 0xFF)  # reg_age and reg_sex are 8 bits wide
+NO_RESULT = 0x63  # Planter result of a window sent to the CPU
+MASK48 = (1 << 48) - 1
+LOCF_VITALS = 5  # features 0-4 carried forward by LOCF_IMPUTATION, as the controller imputes them
+SENSOR_TYPE = ETHERTYPE_SENSOR.to_bytes(2, "big")
+PLANTER_TYPE = planter_codec.ETHERTYPE_PLANTER.to_bytes(2, "big")
+ALERT_TYPE = ETHERTYPE_ALERT.to_bytes(2, "big")
+SWEEP_TYPE = ETHERTYPE_SWEEP.to_bytes(2, "big")
+BUNDLE_TYPE = ETHERTYPE_BUNDLE.to_bytes(2, "big")
+SENSOR_END = planter_codec.ETHER.size + SENSOR.size
+SWEEP_END = planter_codec.ETHER.size + SWEEP.size
+BUNDLE_END = planter_codec.ETHER.size + BUNDLE.size
+MAX_CACHED = 1 << 16  # inference results kept per feature vector
+BATCH_SIZE = 1024  # frames read from a port per batch: under load, inference runs over bigger batches
+MAX_FRAME = 9216
+
+# TAP device ioctls (linux/if_tun.h, linux/sockios.h)
+TUNSETIFF = 0x400454CA
+IFF_TAP = 0x0002
+IFF_NO_PI = 0x1000
+SIOCGIFFLAGS = 0x8913
+SIOCSIFFLAGS = 0x8914
+IFF_UP = 0x1
+
+
+class DataPlane:
+    """Ingress of PatientMonitoring.p4 over batches of frames; program is a reference_engine.Program."""
+
+    def __init__(self, program, cpu_skip=0, piggyback=False, locf=False):
+        self.program = program
+        self.cpu_skip = cpu_skip
+        self.piggyback = piggyback
+        self.expiry_cursor = 0
+        self.locf = locf
+        self.num_patients = program.consts["NUM_PATIENTS"][0]
+        self.timeout = program.consts["TIMEOUT_NS"][0]
+        self.quiet_end = self.timeout + program.consts["QUIET_NS"][0]
+        self.all_present = program.consts["ALL_FEATURES_PRESENT"][0]
+        self.window_open = program.consts["WINDOW_OPEN"][0]
+        self.window_close = program.consts["WINDOW_CLOSE"][0]
+        # Window registers: 0 in first_timestamp means no open window
+        self.first_timestamp = array("Q", bytes(8 * self.num_patients))
+        self.presence = array("H", bytes(2 * self.num_patients))
+        self.features = array("H", bytes(2 * NUM_FEATURES * self.num_patients))
+        # LOCF_IMPUTATION: vitals of each patient's last complete window, and whether it has one
+        self.last_vitals = array("H", bytes(2 * LOCF_VITALS * self.num_patients))
+        self.has_history = bytearray(self.num_patients)
+        self.alert_fields = [(name.split(".")[-1], width) for name, width in program.widths.items()
+                             if name.startswith("hdr.Alert.")]
+        self.alert_bytes = sum(width for _, width in self.alert_fields) // 8
+        self.cache = {}  # feature vector -> Alert field values
+        self.counters = dict.fromkeys(("frames", "alerts", "to_cpu", "dropped", "inferences", "cache_hits",
+                                       "sweep_passes", "piggybacked", "locf_inferred"), 0)
+
+    def reset_window(self, pid):
+        self.first_timestamp[pid] = 0
+        self.presence[pid] = 0
+        base = pid * NUM_FEATURES
+        self.features[base:base + NUM_FEATURES] = array("H", bytes(2 * NUM_FEATURES))
+
+    def process(self, packets, tnow):
+        """Run the ingress for (port, frame) packets arriving at tnow (microseconds).
+
+        Returns ([(egress port, frame)], [(patient_id, timestamp, event)] window digests).
+        """
+        outputs, events, windows = [], [], []
+        first_timestamp, presence, features = self.first_timestamp, self.presence, self.features
+        num_patients, timeout, quiet_end = self.num_patients, self.timeout, self.quiet_end
+        dropped = 0
+        for port, frame in packets:
+            offset = self.cpu_skip if port == CPU_PORT else 0
+            ethertype = frame[offset + 12:offset + 14]
+            if ethertype == SENSOR_TYPE and len(frame) >= offset + SENSOR_END:
+                pid, sid, _, _, value = SENSOR.unpack_from(frame, offset + planter_codec.ETHER.size)
+                if pid >= num_patients:
+                    dropped += 1
+                    continue
+                tfirst = first_timestamp[pid]
+                delta = (tnow - tfirst) & MASK48
+                base = pid * NUM_FEATURES
+                if sid == HEARTBEAT_SENSOR_ID:
+                    # Heartbeat: close a timed-out window, sending it to the CPU if it has any feature
+                    if tfirst != 0 and timeout <= delta < quiet_end:
+                        if presence[pid]:
+                            self.send_window(frame, offset, pid, tnow, outputs, windows)
+                        else:
+                            dropped += 1
+                        self.reset_window(pid)
+                        events.append((pid, tnow, self.window_close))
+                    elif not self.expire_next(frame, offset, tnow, outputs, windows, events):
+                        dropped += 1
+                    continue
+                spare = False
+                if tfirst == 0:
+                    first_timestamp[pid] = tnow
+                    events.append((pid, tnow, self.window_open))
+                    present = 0
+                elif delta < timeout:
+                    present = presence[pid]
+                    spare = True
+                elif delta < quiet_end:
+                    if not self.expire_next(frame, offset, tnow, outputs, windows, events):
+                        dropped += 1  # quiet time: late packet
+                    continue
+                else:
+                    # After the quiet time: send the stale window and start a new one with this packet
+                    if presence[pid]:
+                        self.send_window(frame, offset, pid, tnow, outputs, windows)
+                    self.reset_window(pid)
+                    first_timestamp[pid] = tnow
+                    events.append((pid, tnow, self.window_open))
+                    present = 0
+                if sid < NUM_FEATURES:
+                    features[base + sid] = value & FEATURE_MASKS[sid]
+                    present |= 1 << sid
+                if present == self.all_present:
+                    windows.append((tuple(features[base:base + NUM_FEATURES]), pid, frame[offset:offset + 12],
+                                    frame[offset + SENSOR_END:]))
+                    self.save_history(pid, features[base:base + LOCF_VITALS])
+                    self.reset_window(pid)
+                    events.append((pid, tnow, self.window_close))
+                else:
+                    presence[pid] = present
+                    if spare:
+                        self.expire_next(frame, offset, tnow, outputs, windows, events)
+            elif (ethertype == PLANTER_TYPE and len(frame) >= offset + planter_codec.FRAME_LEN
+                  and frame[offset + 14:offset + 17] == planter_codec.PLANTER_MAGIC):
+                fields = planter_codec.PLANTER.unpack_from(frame, offset + planter_codec.PLANTER_OFFSET)
+                pid = fields[2]
+                if pid < num_patients:
+                    self.reset_window(pid)
+                windows.append((fields[5:5 + NUM_FEATURES], pid, frame[offset:offset + 12],
+                                frame[offset + planter_codec.FRAME_LEN:]))
+            elif ethertype == BUNDLE_TYPE and len(frame) >= offset + BUNDLE_END:
+                dropped += self.merge_bundle(frame, offset, tnow, outputs, windows, events)
+            elif ethertype == SWEEP_TYPE and len(frame) >= offset + SWEEP_END:
+                outputs += self.sweep(frame, offset, tnow, events)
+            else:
+                dropped += 1
+        for frame in self.alert_frames(windows, tnow):
+            outputs.append((MONITORING_PORT, frame))
+        self.counters["frames"] += len(packets)
+        self.counters["alerts"] += len(windows)
+        self.counters["to_cpu"] += len(outputs) - len(windows)
+        self.counters["dropped"] += dropped
+        return outputs, events
+
+    def planter_frame(self, frame, offset, pid, tnow, values, end=SENSOR_END):
+        """pack_and_send_to_cpu(): the packet's header after Ethernet replaced by a Planter header with the features."""
+        header = planter_codec.PLANTER.pack(planter_codec.PLANTER_MAGIC, 0x01, pid, (tnow >> 32) & 0xFFFF,
+                                            tnow & 0xFFFFFFFF, *values, NO_RESULT)
+        return b"".join((frame[offset:offset + 12], PLANTER_TYPE, header, frame[offset + end:]))
+
+    def merge_bundle(self, frame, offset, tnow, outputs, windows, events):
+        """A VitalsBundle merged into its patient's window in one pass; returns 1 if the packet is dropped."""
+        pid, _, _, mask, *values = BUNDLE.unpack_from(frame, offset + planter_codec.ETHER.size)
+        if pid >= self.num_patients:
+            return 1
+        mask &= self.all_present
+        tfirst = self.first_timestamp[pid]
+        delta = (tnow - tfirst) & MASK48
+        header, trailer = frame[offset:offset + 12], frame[offset + BUNDLE_END:]
+        if tfirst == 0 and mask == self.all_present:
+            # Every vital and no window to merge with: inferred straight from the bundle
+            vector = tuple(value & FEATURE_MASKS[i] for i, value in enumerate(values))
+            windows.append((vector, pid, header, trailer))
+            self.save_history(pid, vector[:LOCF_VITALS])
+            return 0
+        if tfirst != 0 and self.timeout <= delta < self.quiet_end:
+            return 1  # quiet time: late packet
+        opening = tfirst == 0
+        sent_stale = False
+        if not opening and delta >= self.quiet_end:
+            # After the quiet time: send the stale window and start a new one with the bundle
+            if self.presence[pid]:
+                self.send_window(frame, offset, pid, tnow, outputs, windows, BUNDLE_END)
+                sent_stale = True
+            self.reset_window(pid)
+            opening = True
+        base = pid * NUM_FEATURES
+        for i, value in enumerate(values):
+            if mask >> i & 1:
+                self.features[base + i] = value & FEATURE_MASKS[i]
+        present = self.presence[pid] | mask
+        if present == self.all_present and not sent_stale:
+            windows.append((tuple(self.features[base:base + NUM_FEATURES]), pid, header, trailer))
+            self.save_history(pid, self.features[base:base + LOCF_VITALS])
+            self.reset_window(pid)
+            if tfirst != 0:
+                events.append((pid, tnow, self.window_close))
+        else:
+            if opening:
+                self.first_timestamp[pid] = tnow
+                events.append((pid, tnow, self.window_open))
+            self.presence[pid] = present
+        return 0
+
+    def save_history(self, pid, vitals):
+        """LOCF_IMPUTATION: the numeric vitals of pid's complete window become its last known values."""
+        if self.locf:
+            self.last_vitals[pid * LOCF_VITALS:(pid + 1) * LOCF_VITALS] = array("H", vitals)
+            self.has_history[pid] = 1
+
+    def send_window(self, frame, offset, pid, tnow, outputs, windows, end=SENSOR_END):
+        """A timed-out window to the CPU, or with LOCF_IMPUTATION and a history, filled and added to windows."""
+        base = pid * NUM_FEATURES
+        values = self.features[base:base + NUM_FEATURES]
+        if self.locf and self.has_history[pid]:
+            last = self.last_vitals[pid * LOCF_VITALS:(pid + 1) * LOCF_VITALS]
+            for i in range(LOCF_VITALS):
+                values[i] = values[i] or last[i]
+            windows.append((tuple(values), pid, frame[offset:offset + 12], frame[offset + end:]))
+            self.counters["locf_inferred"] += 1
+        else:
+            outputs.append((CPU_PORT, self.planter_frame(frame, offset, pid, tnow, values, end)))
+
+    def expire_next(self, frame, offset, tnow, outputs, windows, events):
+        """PIGGYBACK_EXPIRY: close the window under the cursor if timed out; True if the packet now carries it."""
+        if not self.piggyback:
+            return False
+        pid = self.expiry_cursor
+        self.expiry_cursor = pid + 1 if pid + 1 < self.num_patients else 0
+        tfirst = self.first_timestamp[pid]
+        if tfirst == 0 or (tnow - tfirst) & MASK48 < self.timeout:
+            return False
+        sent = self.presence[pid] != 0
+        if sent:
+            self.send_window(frame, offset, pid, tnow, outputs, windows)
+            self.counters["piggybacked"] += 1
+        self.reset_window(pid)
+        events.append((pid, tnow, self.window_close))
+        return sent
+
+    def sweep(self, frame, offset, tnow, events):
+        """Every recirculation pass of a sweep packet from its cursor on; returns the frames sent to the CPU."""
+        cursor, expired, started_hi, started_lo, _, _ = SWEEP.unpack_from(frame, offset + planter_codec.ETHER.size)
+        started = ((started_hi << 32) | started_lo) or tnow
+        first_timestamp = np.frombuffer(self.first_timestamp, dtype=np.uint64)[cursor:]
+        delta = (np.uint64(tnow) - first_timestamp) & np.uint64(MASK48)
+        timed_out = np.flatnonzero((first_timestamp != 0) & (delta >= self.timeout) & (delta < self.quiet_end))
+        outputs = []
+        for pid in (timed_out + cursor).tolist():
+            if self.presence[pid]:
+                base = pid * NUM_FEATURES
+                outputs.append((CPU_PORT, self.planter_frame(frame, offset, pid, tnow,
+                                                             self.features[base:base + NUM_FEATURES], SWEEP_END)))
+                expired += 1
+            self.reset_window(pid)
+            events.append((pid, tnow, self.window_close))
+        self.counters["sweep_passes"] += max(0, self.num_patients - cursor) + 1
+        report = SWEEP.pack(max(cursor, self.num_patients), expired, (started >> 32) & 0xFFFF, started & 0xFFFFFFFF,
+                            (tnow >> 32) & 0xFFFF, tnow & 0xFFFFFFFF)
+        outputs.append((CPU_PORT, b"".join((frame[offset:offset + 12], SWEEP_TYPE, report,
+                                            frame[offset + SWEEP_END:]))))
+        return outputs
+
+    def infer(self, vectors):
+        """Alert field values of each feature vector, from the cache or one reference engine run."""
+        cache = self.cache
+        missing = list(dict.fromkeys(v for v in vectors if v not in cache))
+        self.counters["cache_hits"] += len(vectors) - len(missing)
+        if missing:
+            self.counters["inferences"] += len(missing)
+            if len(cache) + len(missing) > MAX_CACHED:
+                cache.clear()
+            columns = np.array(missing, dtype=np.int64).T
+            planter = {f"feature{i}": columns[i] for i in range(NUM_FEATURES)}
+            outputs = self.program.run(planter)
+            results = zip(*(outputs[name].tolist() for name, _ in self.alert_fields))
+            cache.update(zip(missing, results))
+        return [cache[v] for v in vectors]
+
+    def alert_frames(self, windows, tnow):
+        """generate_alert_pkt() for each (features, patient_id, Ethernet addresses, payload) window."""
+        if not windows:
+            return []
+        frames = []
+        for (_, pid, addresses, payload), values in zip(windows, self.infer([w[0] for w in windows])):
+            header = 0
+            for (name, width), value in zip(self.alert_fields, values):
+                if name == "patient_id":
+                    value = pid
+                elif name == "timestamp":
+                    value = tnow
+                header = (header << width) | (value & ((1 << width) - 1))
+            frames.append(b"".join((addresses, ALERT_TYPE, header.to_bytes(self.alert_bytes, "big"), payload)))
+        return frames
+
+
+# Ports
+
+class RawPort:
+    """An existing interface, opened as an AF_PACKET socket; frames it sends itself are ignored."""
+
+    def __init__(self, number, name):
+        self.number = number
+        self.name = name
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x0003))  # ETH_P_ALL
+        self.sock.bind((name, 0))
+        self.sock.setblocking(False)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def recv(self):
+        while True:
+            try:
+                frame, address = self.sock.recvfrom(MAX_FRAME)
+            except BlockingIOError:
+                return None
+            if address[2] != socket.PACKET_OUTGOING:
+                return frame
+
+    def send(self, frame):
+        self.sock.send(frame)
+
+
+class TapPort:
+    """A TAP device created (and brought up) under name: what is sent on the interface arrives here."""
+
+    def __init__(self, number, name):
+        self.number = number
+        self.name = name
+        self.fd = os.open("/dev/net/tun", os.O_RDWR | os.O_NONBLOCK)
+        fcntl.ioctl(self.fd, TUNSETIFF, struct.pack("16sH", name.encode(), IFF_TAP | IFF_NO_PI))
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            request = struct.pack("16sH", name.encode(), 0)
+            flags = struct.unpack_from("16sH", fcntl.ioctl(sock, SIOCGIFFLAGS, request))[1]
+            fcntl.ioctl(sock, SIOCSIFFLAGS, struct.pack("16sH", name.encode(), flags | IFF_UP))
+
+    def fileno(self):
+        return self.fd
+
+    def recv(self):
+        try:
+            return os.read(self.fd, MAX_FRAME)
+        except BlockingIOError:
+            return None
+
+    def send(self, frame):
+        os.write(self.fd, frame)
+
+
+def parse_interface(spec):
+    number, sep, name = spec.partition("@")
+    if not sep or not number.isdigit() or not name:
+        raise argparse.ArgumentTypeError(f"expected PORT@INTERFACE, got {spec!r}")
+    return int(number), name
+
+
+# Switch
+
+class Emulator:
+    """Moves frames between the ports, the data plane and the P4Runtime server."""
+
+    def __init__(self, dataplane, ports, server=None, batch_size=BATCH_SIZE):
+        self.dataplane = dataplane
+        self.ports = {port.number: port for port in ports}
+        self.server = server
+        self.batch_size = batch_size
+        self.packet_outs = deque()
+        self.wakeup_r, self.wakeup_w = os.pipe()
+        os.set_blocking(self.wakeup_r, False)
+        os.set_blocking(self.wakeup_w, False)
+        self.start_ns = time.monotonic_ns()
+        self.send_errors = 0
+
+    def packet_out(self, payload):
+        """Called from the P4Runtime threads: queue the payload as a packet from CPU_PORT."""
+        self.packet_outs.append((CPU_PORT, payload))
+        try:
+            os.write(self.wakeup_w, b"\0")
+        except BlockingIOError:
+            pass  # a wakeup is already pending
+
+    def now(self):
+        """Ingress timestamp in microseconds since start, like ingress_global_timestamp."""
+        return ((time.monotonic_ns() - self.start_ns) // 1000) & MASK48
+
+    def step(self, packets):
+        outputs, events = self.dataplane.process(packets, self.now())
+        for number, frame in outputs:
+            if number == CPU_PORT:
+                if self.server:
+                    self.server.packet_in(frame)
+            elif number in self.ports:
+                try:
+                    self.ports[number].send(frame)
+                except OSError:
+                    self.send_errors += 1
+        if self.server and events:
+            self.server.digest(events)
+
+    def run(self, metrics_interval=None):
+        readers = list(self.ports.values()) + [self.wakeup_r]
+        next_report = time.monotonic() + metrics_interval if metrics_interval else None
+        last = dict(self.dataplane.counters)
+        while True:
+            ready, _, _ = select.select(readers, [], [], 1.0)
+            packets = []
+            for reader in ready:
+                if reader is self.wakeup_r:
+                    os.read(self.wakeup_r, 4096)
+                    continue
+                for _ in range(self.batch_size):
+                    frame = reader.recv()
+                    if frame is None:
+                        break
+                    packets.append((reader.number, frame))
+            while self.packet_outs:
+                packets.append(self.packet_outs.popleft())
+            if packets:
+                self.step(packets)
+            if next_report and time.monotonic() >= next_report:
+                counters = self.dataplane.counters
+                rates = ", ".join(f"{name} {(counters[name] - last[name]) / metrics_interval:.0f}/s"
+                                  for name in ("frames", "alerts", "to_cpu", "dropped"))
+                print(f"{rates}; inferences {counters['inferences']}, cache hits {counters['cache_hits']}, "
+                      f"sweep passes {counters['sweep_passes']}, piggybacked {counters['piggybacked']}, "
+                      f"LOCF inferred {counters['locf_inferred']}, "
+                      f"send errors {self.send_errors}")
+                if self.server:
+                    print(f"P4Runtime: {self.server.counters}")
+                last = dict(counters)
+                next_report += metrics_interval
+
+
+def main(args):
+    defines = dict(map(parse_define, args.define))
+    try:
+        program, skipped = variant_program(args.variant, defines, args.tables)
+    except (OSError, EngineError, TableCommandError) as e:
+        print(f"Error: {e}")
+        return 1
+    if "PATIENT_SLOTS" in defines:
+        print("Note: PATIENT_SLOTS is not emulated, registers are indexed by patient ID")
+    for table, count in skipped.items():
+        print(f"Note: {count} entries of {table}, not a table of this program, ignored")
+    dataplane = DataPlane(program, args.cpu_skip, "PIGGYBACK_EXPIRY" in defines, "LOCF_IMPUTATION" in defines)
+    port_type = TapPort if args.tap else RawPort
+    try:
+        ports = [port_type(number, name) for number, name in args.interface]
+    except OSError as e:
+        print(f"Error: cannot open the interfaces: {e}")
+        return 1
+    emulator = Emulator(dataplane, ports, batch_size=args.batch_size)
+    if args.grpc_server_addr:
+        emulator.server = P4RuntimeServer(args.device_id, emulator.packet_out)
+        emulator.server.start(args.grpc_server_addr)
+        print(f"P4Runtime server listening on {args.grpc_server_addr} (device {args.device_id})")
+    print(f"Emulating {dataplane.num_patients} patients on ports "
+          f"{', '.join(f'{p.number}@{p.name}' for p in ports)}")
+    try:
+        emulator.run(args.metrics_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if emulator.server:
+            emulator.server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emulate simple_switch_grpc running PatientMonitoring.p4")
+    parser.add_argument("-i", "--interface", type=parse_interface, action="append", default=[], required=True,
+                        metavar="PORT@INTERFACE", help="Attach an interface as a switch port, e.g. 1@s1-eth1")
+    parser.add_argument("--tap", action="store_true",
+                        help="Create the interfaces as TAP devices instead of opening existing ones")
+    parser.add_argument("--grpc-server-addr", default="127.0.0.1:50051",
+                        help="P4Runtime server address (empty: no server, CPU packets are dropped)")
+    parser.add_argument("--device-id", type=int, default=0)
+    parser.add_argument("--variant", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."),
+                        help="Variant directory with the P4 program and tables/")
+    parser.add_argument("--tables", nargs="+", help="table_add files instead of <variant>/tables/*.txt")
+    parser.add_argument("-D", "--define", action="append", default=[], metavar="NAME[=VALUE]",
+                        help="Build option of the emulated program, as passed to p4c (e.g. -D LEAF_SCORE_SUM)")
+    parser.add_argument("--cpu-skip", type=int, default=0, metavar="BYTES",
+                        help="Bytes skipped before the Ethernet header of PacketOut payloads")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Frames read from a port per batch")
+    parser.add_argument("--metrics-interval", type=float, default=30,
+                        help="Seconds between packet rate lines (0: none)")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Heartbeat engine for the controller.
+
+A heartbeat is a Sensor packet with sensor_id 999 that only differs from one
+patient to the next in its patient_id. The engine serializes the PacketOut
+message once and, for every send, patches the 4-byte patient_id directly in
+the serialized bytes instead of rebuilding the scapy packet and the protobuf.
+
+PacedScheduler spreads a sweep over the heartbeat interval in micro-batches
+instead of sending every heartbeat back to back. Its pacing loop, steps(),
+sends the batches and yields the time to sleep, so the threaded controller
+(run()) and the asyncio one (run_async()) pace heartbeats the same way.
+
+A sweep packet (etherType 0x1238) replaces a whole sweep with one PacketOut:
+the switch checks one register slot per pass, recirculating the packet with
+an incremented cursor, sends the Planter packet of every timed-out window to
+the CPU, and returns the sweep packet as a report once every slot is checked.
+"""
+
+import asyncio
+import struct
+import time
+from collections import namedtuple
+
+from p4.v1 import p4runtime_pb2
+
+ETHERTYPE_SENSOR = 0x1235
+ETHERTYPE_SWEEP = 0x1238
+HEARTBEAT_SENSOR_ID = 999
+HEARTBEAT_DST = bytes.fromhex("000400000000")
+HEARTBEAT_SRC = bytes.fromhex("080027bcfcb5")
+
+ETHER = struct.Struct("!6s6sH")
+# patient_id, sensor_id, timestamp (48 bits as hi16/lo32), feature_value
+SENSOR = struct.Struct("!IIHIH")
+PATIENT_ID = struct.Struct("!I")
+# cursor, expired, started and finished (48 bits as hi16/lo32 each)
+SWEEP = struct.Struct("!IIHIHI")
+
+
+class SweepStats(namedtuple("SweepStats", ["packets", "errors", "duration_s", "last_error", "span_s", "max_lag_s"],
+                            defaults=(0.0, 0.0))):
+    """Outcome of one heartbeat sweep.
+
+    duration_s is the time spent sending; span_s (wall time from first to last
+    batch) and max_lag_s (worst batch deadline miss) are only set by the paced
+    scheduler.
+    """
+
+    @property
+    def per_packet_us(self):
+        return self.duration_s / self.packets * 1e6 if self.packets else 0.0
+
+    def __str__(self):
+        text = (f"{self.packets} heartbeats in {self.duration_s * 1000:.1f} ms "
+                f"({self.per_packet_us:.2f} us/packet)")
+        if self.span_s:
+            text += f" spread over {self.span_s:.1f} s, max lag {self.max_lag_s * 1000:.1f} ms"
+        if self.errors:
+            text += f", {self.errors} errors (last: {self.last_error})"
+        return text
+
+
+class SweepReport(namedtuple("SweepReport", ["slots", "expired", "duration_us"])):
+    """Sweep packet returned by the switch: slots checked, windows sent to the CPU, switch time first to last pass."""
+
+    def __str__(self):
+        return f"{self.slots} slots swept in switch, {self.expired} timed-out windows, {self.duration_us / 1000:.1f} ms"
+
+
+def build_heartbeat_frame(pid=0):
+    return (ETHER.pack(HEARTBEAT_DST, HEARTBEAT_SRC, ETHERTYPE_SENSOR)
+            + SENSOR.pack(pid, HEARTBEAT_SENSOR_ID, 0, 0, 0))
+
+
+def build_sweep_frame(cursor=0):
+    return ETHER.pack(HEARTBEAT_DST, HEARTBEAT_SRC, ETHERTYPE_SWEEP) + SWEEP.pack(cursor, 0, 0, 0, 0, 0)
+
+
+def sweep_message(stream_request=False):
+    """Serialized PacketOut (or StreamMessageRequest) starting an in-switch sweep."""
+    message = p4runtime_pb2.StreamMessageRequest() if stream_request else p4runtime_pb2.PacketOut()
+    (message.packet if stream_request else message).payload = build_sweep_frame()
+    return message.SerializeToString()
+
+
+def parse_sweep_report(frame):
+    """SweepReport of a sweep packet PacketIn, or None if frame is not one."""
+    if len(frame) < ETHER.size + SWEEP.size or ETHER.unpack_from(frame)[2] != ETHERTYPE_SWEEP:
+        return None
+    cursor, expired, started_hi, started_lo, finished_hi, finished_lo = SWEEP.unpack_from(frame, ETHER.size)
+    duration = (((finished_hi << 32) | finished_lo) - ((started_hi << 32) | started_lo)) & ((1 << 48) - 1)
+    return SweepReport(cursor, expired, duration)
+
+
+class HeartbeatEngine:
+    """Sends heartbeat PacketOuts from a single pre-serialized template.
+
+    send is called with the serialized PacketOut bytes, e.g.
+    lambda msg: switch_conn.PacketOut(msg, []). With stream_request=True the
+    template is a whole serialized StreamMessageRequest instead, ready to be
+    written to a StreamChannel that passes bytes through unchanged.
+    """
+
+    def __init__(self, send, stream_request=False):
+        self.send = send
+        frame = build_heartbeat_frame()
+        if stream_request:
+            message = p4runtime_pb2.StreamMessageRequest()
+            message.packet.payload = frame
+        else:
+            message = p4runtime_pb2.PacketOut()
+            message.payload = frame
+        self.template = bytearray(message.SerializeToString())
+        # The payload is the last field serialized; patient_id follows the Ethernet header
+        self.pid_offset = len(self.template) - len(frame) + ETHER.size
+
+    def message(self, pid):
+        """Return the serialized heartbeat PacketOut for a patient."""
+        PATIENT_ID.pack_into(self.template, self.pid_offset, pid)
+        return bytes(self.template)
+
+    def send_one(self, pid):
+        self.send(self.message(pid))
+
+    def sweep(self, patient_ids):
+        """Send one heartbeat to every patient in patient_ids and return SweepStats."""
+        template = self.template
+        offset = self.pid_offset
+        pack_into = PATIENT_ID.pack_into
+        send = self.send
+        packets = errors = 0
+        last_error = None
+        start = time.perf_counter()
+        for pid in patient_ids:
+            pack_into(template, offset, pid)
+            try:
+                send(bytes(template))
+            except Exception as e:
+                errors += 1
+                last_error = f"patient {pid}: {e}"
+            packets += 1
+        return SweepStats(packets, errors, time.perf_counter() - start, last_error)
+
+
+class PacedScheduler:
+    """Spreads heartbeat sweeps evenly over the heartbeat interval.
+
+    Heartbeats go out in micro-batches of batch_size at a constant rate
+    (target_pps, or num_patients / interval_s when not given). Batch deadlines
+    are computed from the sweep start and each sweep starts exactly one period
+    after the previous one, so sleep overshoot does not accumulate and every
+    patient keeps the same heartbeat period. When the sweep does not fit in the
+    interval at target_pps, the period stretches to the sweep length.
+
+    steps() and sweep_steps() are the pacing loop without the sleeps: they
+    send the batches that are due and yield the seconds to sleep before the
+    next one. run() and sweep() sleep with sleep, run_async() with
+    asyncio.sleep.
+    """
+
+    def __init__(self, engine, interval_s, batch_size=50, target_pps=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.engine = engine
+        self.interval_s = interval_s
+        self.batch_size = max(1, batch_size)
+        self.target_pps = target_pps
+        self.clock = clock
+        self.sleep = sleep
+
+    def rate(self, num_patients):
+        if self.target_pps:
+            return self.target_pps
+        return max(num_patients / self.interval_s, 1e-9)
+
+    def period(self, num_patients):
+        return max(self.interval_s, num_patients / self.rate(num_patients))
+
+    def sweep_steps(self, patient_ids, start):
+        """Generator of one paced sweep starting at clock time start: yields sleeps, returns SweepStats."""
+        patient_ids = list(patient_ids)
+        batch_gap = self.batch_size / self.rate(len(patient_ids))
+        packets = errors = 0
+        last_error = None
+        send_time = max_lag = 0.0
+        for k, first in enumerate(range(0, len(patient_ids), self.batch_size)):
+            deadline = start + k * batch_gap
+            delay = deadline - self.clock()
+            if delay > 0:
+                yield delay
+            else:
+                max_lag = max(max_lag, -delay)
+            stats = self.engine.sweep(patient_ids[first:first + self.batch_size])
+            packets += stats.packets
+            errors += stats.errors
+            send_time += stats.duration_s
+            last_error = stats.last_error or last_error
+        return SweepStats(packets, errors, send_time, last_error, self.clock() - start, max_lag)
+
+    def sweep(self, patient_ids, start):
+        """Send one paced sweep starting at clock time start and return SweepStats."""
+        steps = self.sweep_steps(patient_ids, start)
+        while True:
+            try:
+                self.sleep(next(steps))
+            except StopIteration as done:
+                return done.value
+
+    def steps(self, patient_ids, report=print):
+        """Endless generator of paced sweeps yielding the sleeps; patient_ids is re-read every sweep."""
+        start = self.clock()
+        while True:
+            ids = list(patient_ids)
+            period = self.period(len(ids))
+            if period > self.interval_s:
+                report(f"Heartbeat sweep of {len(ids)} patients at {self.rate(len(ids)):.0f} pkt/s "
+                       f"exceeds the {self.interval_s}s interval; period stretched to {period:.1f}s")
+            report((yield from self.sweep_steps(ids, start)))
+            start += period
+            now = self.clock()
+            if now - start > period:
+                # Fell more than a full period behind (e.g. process suspended): re-anchor instead of bursting
+                start = now
+            elif start > now:
+                yield start - now
+
+    def run(self, patient_ids, report=print, stop=None):
+        """Run sweeps forever (or until stop is set); patient_ids is re-read every sweep."""
+        for delay in self.steps(patient_ids, report):
+            if stop is not None and stop.is_set():
+                return
+            self.sleep(delay)
+
+    async def run_async(self, patient_ids, report=print):
+        """run() for an event loop: sleeps with asyncio.sleep, so other tasks run between batches."""
+        for delay in self.steps(patient_ids, report):
+            await asyncio.sleep(delay)
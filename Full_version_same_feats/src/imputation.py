@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Imputation of vitals missing from timed-out windows.
+
+Shared by the threaded and the asyncio controllers.
+"""
+
+import random
+
+import planter_codec
+
+IMPUTED_SENSORS = range(5)  # Only numeric vitals (features 0-4) are imputed
+
+# Generate plausible random value for each sensor
+def impute_value(sensor_id):
+    if sensor_id == 0:  # temperature (scaled by 10)
+        return random.randint(350, 400)
+    elif sensor_id == 1:  # oxygen saturation
+        return random.randint(90, 100)
+    elif sensor_id == 2:  # pulse rate
+        return random.randint(60, 100)
+    elif sensor_id == 3:  # systolic blood pressure
+        return random.randint(100, 140)
+    elif sensor_id == 4:  # respiratory rate
+        return random.randint(12, 20)
+    elif sensor_id == 5:  # avpu
+        return random.randint(0, 3)
+    elif sensor_id == 6:  # supplemental oxygen (binary)
+        return random.randint(0, 1)
+    elif sensor_id == 7:  # referral source
+        return 1
+    elif sensor_id == 8:  # age
+        return random.randint(30, 80)
+    elif sensor_id == 9:  # sex (0 or 1)
+        return random.randint(0, 1)
+    else:
+        return 1
+
+
+def impute_missing(buf):
+    """Fill the zeroed vitals of the Planter frame in buf in place.
+
+    Returns a list of (sensor_id, old_value, new_value) for the imputed features.
+    """
+    imputed = []
+    features = planter_codec.features(buf)
+    for sensor_id in IMPUTED_SENSORS:
+        cur_val = features[sensor_id]
+        if cur_val == 0:
+            new_val = impute_value(sensor_id)
+            planter_codec.set_feature(buf, sensor_id, new_val)
+            imputed.append((sensor_id, cur_val, new_val))
+    return imputed
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Buffered CSV event journal shared by the controller and the alert monitor.
+
+write() only appends the row to an in-memory ring buffer; a background thread
+writes the buffered rows in batches, either every flush_interval seconds or as
+soon as batch_size rows are waiting, so the hot path never opens, writes or
+closes the file. When the file grows past max_bytes it is rotated
+(path -> path.1 -> ... -> path.<backups>). If the writer falls so far behind
+that the buffer is full, the oldest rows are dropped and counted.
+"""
+
+import atexit
+import csv
+import os
+import threading
+from collections import deque
+
+
+class JournalWriter:
+    """Ring-buffered CSV writer with a background flush thread."""
+
+    def __init__(self, path, header, capacity=65536, flush_interval=1.0, batch_size=512,
+                 max_bytes=50 * 1024 * 1024, backups=5):
+        self.path = path
+        self.header = header
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.buffer = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = threading.Event()
+        self.written = self.dropped = self.rotations = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Always start a new file with the header, as the original loggers did
+        self.file = self._open("w")
+        self.thread = threading.Thread(target=self._run, name=f"journal-{os.path.basename(path)}", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def _open(self, mode):
+        f = open(self.path, mode, newline="")
+        if mode == "w":
+            csv.writer(f).writerow(self.header)
+        return f
+
+    def write(self, row):
+        """Queue one row; never blocks on I/O."""
+        with self.lock:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append(row)
+            if len(self.buffer) >= self.batch_size:
+                self.wakeup.set()
+
+    def _run(self):
+        while not self.closed.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Write all buffered rows to disk (called by the flush thread and on close)."""
+        with self.lock:
+            rows = list(self.buffer)
+            self.buffer.clear()
+        if not rows or self.file.closed:
+            return
+        csv.writer(self.file).writerows(rows)
+        self.file.flush()
+        self.written += len(rows)
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        self.file = self._open("w")
+        self.rotations += 1
+
+    def close(self):
+        """Stop the flush thread and write out whatever is still buffered."""
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.wakeup.set()
+        self.thread.join()
+        self.flush()
+        self.file.close()
+
+    def __str__(self):
+        return (f"{self.path}: {self.written} rows written, {len(self.buffer)} buffered, "
+                f"{self.dropped} dropped, {self.rotations} rotations")
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Replace the vote-combination decision tables with summed leaf scores.
+
+decision_sep / decision_hf enumerate every combination of per-tree votes that
+yields label 1 (1677 and 46 exact entries here, 6555 in
+Full_version_diff_feats). In the LEAF_SCORE_SUM build of PatientMonitoring.p4
+each leaf entry instead carries a fixed-point score in its `prob` parameter,
+the ingress adds the trees' scores to SCORE_OFFSET in sum_prob_*, and a
+one-entry range table, decision_sum_*, gives the label.
+
+The scores are fitted here from the existing tables. With the P4 program the
+values each feature code can take are known (table_minimizer's reachability),
+so every combination of codes is run through the leaf tables; the vote
+tuples that come out are the only ones the decision table ever sees. An
+integer perceptron over one weight per (tree, vote) then finds scores whose
+sum separates the label-1 tuples from the others (it converges whenever such
+scores exist). A leaf miss writes no score, so each tree's miss vote is
+shifted to score 0. Every code combination is checked again with the
+16-bit modular sum the switch computes before a file is written.
+
+Example (run by `make LEAF_SCORE_SUM=1`):
+    python3 ./src/leaf_scores.py --p4 PatientMonitoring.p4 --output-dir build/tables-sum \\
+        ./tables/s1-commands-sep.txt ./tables/s1-commands-hf.txt
+"""
+
+import argparse
+import itertools
+import os
+import sys
+from collections import namedtuple
+
+import table_minimizer
+from table_commands import RANGE, Key, ParsedCommand, TableCommandError, read_commands
+from table_minimizer import MinimizerError, group_tables, short_name
+
+SCORE_BITS = 16  # width of tree_*_prob_* and sum_prob_* in the LEAF_SCORE_SUM build
+SCORE_OFFSET = 1 << (SCORE_BITS - 1)  # SCORE_OFFSET in PatientMonitoring.p4: sums are offset to stay unsigned
+MAX_COMBINATIONS = 2_000_000  # feature code combinations enumerated per model
+MAX_EPOCHS = 10_000
+
+LeafTable = namedtuple("LeafTable", ["table", "keys", "votes", "miss_vote", "vote_index", "prob_index"])
+ScoreModel = namedtuple("ScoreModel", ["decision", "leaves", "scores", "threshold", "label", "default_label",
+                                       "tuples"])
+
+
+class ScoreFitError(Exception):
+    pass
+
+
+def writer_of(p4, field, tables):
+    """(table name, action name, data parameter index) of the table action writing field from a parameter."""
+    for name in tables:
+        p4_table = p4.tables.get(short_name(name))
+        if p4_table is None:
+            continue
+        for action_name in p4_table.actions:
+            action = p4.actions.get(action_name)
+            for target, (kind, arg) in (action.assignments if action else []):
+                if target == field and kind == "param":
+                    return name, action_name, arg
+    raise ScoreFitError(f"no table action writes {field} from a parameter")
+
+
+def leaf_table(p4, tables, vote_field):
+    """The leaf table writing vote_field: its entries by key, miss vote and parameter positions."""
+    name, action_name, vote_index = writer_of(p4, vote_field, tables)
+    p4_table = p4.tables[short_name(name)]
+    action = p4.actions[action_name]
+    if "prob" not in action.data_params:
+        raise ScoreFitError(f"{action_name} has no prob parameter for the score")
+    default = p4.actions.get(p4_table.default[0]) if p4_table.default else None
+    miss = [arg for target, (kind, arg) in (default.assignments if default else []) if target == vote_field]
+    if len(miss) != 1 or not isinstance(miss[0], int):
+        raise ScoreFitError(f"the default action of {short_name(name)} does not set {vote_field} to a constant")
+    votes = {}
+    for c in tables[name]:
+        votes.setdefault(tuple(k.value for k in c.keys), c.params[vote_index])
+    return LeafTable(name, p4_table.keys, votes, miss[0], vote_index, action.data_params.index("prob"))
+
+
+def code_combinations(p4, leaves, reach):
+    """Code fields read by the leaf tables and every combination of their reachable values."""
+    fields = sorted({field for leaf in leaves for field, _, _, _ in leaf.keys})
+    missing = [field for field in fields if field not in reach]
+    if missing:
+        raise ScoreFitError(f"values of {', '.join(missing)} unknown (not only written by table actions)")
+    size = 1
+    for field in fields:
+        size *= len(reach[field])
+    if size > MAX_COMBINATIONS:
+        raise ScoreFitError(f"{size} code combinations, more than {MAX_COMBINATIONS} to enumerate")
+    return fields, itertools.product(*(sorted(reach[field]) for field in fields))
+
+
+def vote_tuple(leaves, fields, codes):
+    values = dict(zip(fields, codes))
+    votes = []
+    for leaf in leaves:
+        key = tuple(values[field] if hi is None else (values[field] >> lo) & ((1 << (hi - lo + 1)) - 1)
+                    for field, hi, lo, _ in leaf.keys)
+        votes.append(leaf.votes.get(key, leaf.miss_vote))
+    return tuple(votes)
+
+
+def perceptron(samples, trees):
+    """Integer weights per (tree, vote) and a bias with bias + sum > 0 exactly for the positive samples."""
+    weights = [{} for _ in range(trees)]
+    bias = 0
+    for _ in range(MAX_EPOCHS):
+        errors = 0
+        for votes, positive in samples:
+            total = bias + sum(weights[t].get(v, 0) for t, v in enumerate(votes))
+            if (total > 0) != positive:
+                errors += 1
+                step = 1 if positive else -1
+                bias += step
+                for t, v in enumerate(votes):
+                    weights[t][v] = weights[t].get(v, 0) + step
+        if not errors:
+            return weights, bias
+    return None
+
+
+def fit_model(p4, tables, decision, reach):
+    """ScoreModel for a decision table: per-tree scores with miss vote 0 and the label-1 threshold."""
+    p4_decision = p4.tables[short_name(decision)]
+    leaves = [leaf_table(p4, tables, field) for field, hi, _, kind in p4_decision.keys]
+    entries = {tuple(k.value for k in c.keys): c.params for c in tables[decision]}
+    labels = {tuple(params) for params in entries.values()}
+    if len(labels) != 1 or len(next(iter(labels))) != 1:
+        raise ScoreFitError(f"{short_name(decision)} must give one label for all its entries")
+    label = next(iter(labels))[0]
+    default_action = p4.actions[p4_decision.default[0]]
+    default_label = [arg for _, (kind, arg) in default_action.assignments if kind == "const"]
+    if len(default_label) != 1 or default_label[0] == label:
+        raise ScoreFitError(f"the default action of {short_name(decision)} must set a different constant label")
+
+    fields, combinations = code_combinations(p4, leaves, reach)
+    tuples = {}
+    for codes in combinations:
+        votes = vote_tuple(leaves, fields, codes)
+        tuples[votes] = tuples.get(votes, 0) + 1
+    fitted = perceptron([(votes, votes in entries) for votes in tuples], len(leaves))
+    if fitted is None:
+        raise ScoreFitError(f"{short_name(decision)}: no leaf scores separate the labels in {MAX_EPOCHS} epochs")
+    weights, bias = fitted
+    # label = (bias + sum > 0) = (sum >= 1 - bias); leaf misses write no score, so shift each miss vote to 0
+    scores = []
+    threshold = 1 - bias
+    for leaf, tree_weights in zip(leaves, weights):
+        shift = tree_weights.get(leaf.miss_vote, 0)
+        votes = set(leaf.votes.values()) | {leaf.miss_vote}
+        scores.append({vote: tree_weights.get(vote, 0) - shift for vote in votes})
+        threshold -= shift
+    model = ScoreModel(decision, leaves, scores, threshold, label, default_label[0], tuples)
+    check_model(model, entries)
+    return model
+
+
+def switch_label(model, votes):
+    """Label as computed by the LEAF_SCORE_SUM build: 16-bit sum from SCORE_OFFSET, then the range table."""
+    total = SCORE_OFFSET
+    for leaf, scores, vote in zip(model.leaves, model.scores, votes):
+        if vote != leaf.miss_vote:
+            total += scores[vote] % (1 << SCORE_BITS)
+    total %= 1 << SCORE_BITS
+    return model.label if total >= SCORE_OFFSET + model.threshold else model.default_label
+
+
+def check_model(model, entries):
+    limit = SCORE_OFFSET - 1
+    largest = sum(max(abs(s) for s in scores.values()) if scores else 0 for scores in model.scores)
+    if largest > limit or not -limit <= model.threshold <= limit:
+        raise ScoreFitError(f"{short_name(model.decision)}: scores do not fit {SCORE_BITS}-bit sums")
+    for votes in model.tuples:
+        expected = entries[votes][0] if votes in entries else model.default_label
+        if switch_label(model, votes) != expected:
+            raise ScoreFitError(f"{short_name(model.decision)}: votes {votes} give the wrong label")
+
+
+def sum_table_name(decision):
+    prefix, _, name = decision.rpartition(".")
+    return f"{prefix}.{name.replace('decision', 'decision_sum', 1)}" if prefix else name.replace(
+        "decision", "decision_sum", 1)
+
+
+def rewrite(tables, models):
+    """Tables with the scores in the leaf entries and each decision table replaced by its sum table."""
+    result = {}
+    by_leaf = {}
+    for model in models:
+        for leaf, scores in zip(model.leaves, model.scores):
+            by_leaf[leaf.table] = (leaf, scores)
+    decisions = {model.decision: model for model in models}
+    for table, commands in tables.items():
+        if table in decisions:
+            model = decisions[table]
+            template = commands[0]
+            low = SCORE_OFFSET + model.threshold
+            result[sum_table_name(table)] = [ParsedCommand(
+                sum_table_name(table), template.action, [Key(RANGE, low, (1 << SCORE_BITS) - 1)],
+                [model.label, 0], template.source, 0)]
+        elif table in by_leaf:
+            leaf, scores = by_leaf[table]
+            rewritten = []
+            for c in commands:
+                params = list(c.params)
+                params[leaf.prob_index] = scores[params[leaf.vote_index]] % (1 << SCORE_BITS)
+                rewritten.append(c._replace(params=params))
+            result[table] = rewritten
+        else:
+            result[table] = commands
+    return result
+
+
+def fit(paths, p4_source):
+    """Fit every decision table of the files; returns ({path: {table: commands}}, [ScoreModel])."""
+    p4 = table_minimizer.parse_p4(p4_source)
+    files = {path: group_tables(read_commands(path)) for path in paths}
+    tables = {table: commands for grouped in files.values() for table, commands in grouped.items()}
+    reach = table_minimizer.reachable_values(p4, {short_name(t): c for t, c in tables.items()})
+    decisions = [t for t in tables if short_name(t).startswith("decision")]
+    models = [fit_model(p4, tables, decision, reach) for decision in decisions]
+    return {path: rewrite(grouped, models) for path, grouped in files.items()}, models
+
+
+def main(args):
+    with open(args.p4) as f:
+        p4_source = f.read()
+    try:
+        result, models = fit(args.tables, p4_source)
+    except (OSError, TableCommandError, MinimizerError, ScoreFitError) as e:
+        print(f"Error: {e}")
+        return 1
+    for model in models:
+        score_ranges = ", ".join(f"{min(s.values())}..{max(s.values())}" for s in model.scores)
+        print(f"{short_name(model.decision)}: {len(model.tuples)} reachable vote tuples, "
+              f"{len(model.leaves)} trees, scores {score_ranges}, label {model.label} when sum >= "
+              f"{model.threshold}; {sum(model.tuples.values())} code combinations checked")
+    os.makedirs(args.output_dir, exist_ok=True)
+    for path, tables in result.items():
+        output = os.path.join(args.output_dir, os.path.basename(path))
+        if os.path.abspath(output) == os.path.abspath(path):
+            print(f"Error: refusing to overwrite {path}")
+            return 1
+        table_minimizer.write_commands(output, tables)
+        print(f"{output}: {sum(len(c) for c in tables.values())} entries")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit summed leaf scores replacing the decision tables")
+    parser.add_argument("tables", nargs="+", help="table_add command files")
+    parser.add_argument("--p4", required=True, help="P4 program (LEAF_SCORE_SUM build)")
+    parser.add_argument("--output-dir", default="build/tables-sum", help="Directory for the rewritten files")
+    sys.exit(main(parser.parse_args()))
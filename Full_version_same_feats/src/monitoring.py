@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 # filepath: /home/akem/tutorials/exercises/UC5_Sepsis_Monitoring/monitoring.py
 
-import csv
 import time
 from datetime import datetime
 from termcolor import colored
 from scapy.all import Ether, sniff, Packet, IntField, BitField, bind_layers, ShortField
 
+from journal import JournalWriter
+
 # Define Alert packet structure
 class Alert(Packet):
     name = "Alert"
@@ -26,11 +27,8 @@ bind_layers(Ether, Alert, type=ETHERTYPE_ALERT)
 CSV_FILE = "./logs/alerts_log.csv"
 MONITOR_IFACE = "s1-eth1"
 
-# Initialize CSV: write header if file does not exist.
-# Always create a new CSV file and write the header
-with open(CSV_FILE, "w", newline="") as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(["reception_time", "patient_id", "alert_timestamp", "sepsis_alert", "heart_fail_alert" ,"news2_score", "news2_alert"])
+# Always create a new CSV file and write the header; rows are written in batches by a background thread
+alerts_log = JournalWriter(CSV_FILE, ["reception_time", "patient_id", "alert_timestamp", "sepsis_alert", "heart_fail_alert" ,"news2_score", "news2_alert"])
 
 def process_alert(packet):
     if Alert in packet:
@@ -69,15 +67,16 @@ def process_alert(packet):
         # Print required fields
         print(f"NEWS2 alert received  @ {recv_time} -> Patient: {patient_id}, Score: {news2_score}, Alert Level: {alert_str}")
         
-        # Append record to CSV file
-        with open(CSV_FILE, "a", newline="") as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow([recv_time, patient_id, alert_ts, sepsis_alert, heart_fail_alert, news2_score, news2_alert])
+        # Append record to the alerts journal
+        alerts_log.write([recv_time, patient_id, alert_ts, sepsis_alert, heart_fail_alert, news2_score, news2_alert])
 
 def main():
     print(f"Monitoring for alert packets on interface {MONITOR_IFACE}...")
     # Sniff continuously, calling process_alert for each packet
-    sniff(iface=MONITOR_IFACE, prn=process_alert, store=0)
+    try:
+        sniff(iface=MONITOR_IFACE, prn=process_alert, store=0)
+    finally:
+        alerts_log.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
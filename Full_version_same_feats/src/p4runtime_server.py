@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Minimal P4Runtime server for one device, for switch stand-ins without BMv2.
+
+Implements what the controllers and src/table_loader.py use from
+simple_switch_grpc: StreamChannel with arbitration (the highest election ID
+is the primary), PacketOut, PacketIn and window digests; Write and Read
+(entities are stored as written, they do not program anything); and the
+forwarding pipeline config, which is only kept to be read back.
+
+The owner of the server feeds the data plane side: on_packet_out(payload) is
+called from the gRPC threads for every PacketOut, packet_in(payload) and
+digest(data) queue messages on the primary controller's stream. Digests are
+only sent once a DigestEntry was written, under that entry's digest_id and in
+lists of at most its max_list_size, as the switch does.
+"""
+
+import queue
+import threading
+from concurrent import futures
+
+import grpc
+from google.rpc import code_pb2
+from p4.v1 import p4runtime_pb2, p4runtime_pb2_grpc
+
+API_VERSION = "1.3.0"
+MAX_DIGEST_LIST = 128  # list size when the DigestEntry leaves max_list_size at 0
+
+
+def bitstring(value):
+    """Canonical P4Runtime bytestring of a non-negative integer (no leading zero bytes)."""
+    return value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big")
+
+
+def entity_key(entity):
+    """Identity of a written entity: the entity without its action (and table entry priority kept)."""
+    key = p4runtime_pb2.Entity()
+    key.CopyFrom(entity)
+    if key.WhichOneof("entity") == "table_entry":
+        key.table_entry.ClearField("action")
+    return key.SerializeToString(deterministic=True)
+
+
+class P4RuntimeServer(p4runtime_pb2_grpc.P4RuntimeServicer):
+    """P4Runtime service of device_id; start() serves it on address."""
+
+    def __init__(self, device_id=0, on_packet_out=None):
+        self.device_id = device_id
+        self.on_packet_out = on_packet_out or (lambda payload: None)
+        self.lock = threading.Lock()
+        self.streams = {}  # (election_id.high, election_id.low) -> response queue of that controller
+        self.primary = None  # response queue of the highest election ID
+        self.entities = {}  # entity_key -> Entity
+        self.digest_configs = {}  # digest_id -> DigestEntry.Config
+        self.pipeline_config = p4runtime_pb2.ForwardingPipelineConfig()
+        self.list_id = 0
+        self.counters = dict.fromkeys(("packet_outs", "packet_ins", "packet_ins_dropped", "digest_lists",
+                                       "digest_acks", "writes", "reads"), 0)
+        self.server = None
+
+    def start(self, address="127.0.0.1:50051", workers=8):
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+        p4runtime_pb2_grpc.add_P4RuntimeServicer_to_server(self, self.server)
+        port = self.server.add_insecure_port(address)
+        self.server.start()
+        return port
+
+    def stop(self, grace=None):
+        with self.lock:
+            for responses in self.streams.values():
+                responses.put(None)
+        if self.server:
+            self.server.stop(grace)
+
+    # Data plane side
+
+    def packet_in(self, payload):
+        response = p4runtime_pb2.StreamMessageResponse()
+        response.packet.payload = payload
+        primary = self.primary
+        if primary is None:
+            self.counters["packet_ins_dropped"] += 1
+            return
+        primary.put(response)
+        self.counters["packet_ins"] += 1
+
+    def digest(self, data):
+        """Send data, a list of member value tuples, to the primary if a digest is subscribed."""
+        primary = self.primary
+        if primary is None or not self.digest_configs or not data:
+            return
+        digest_id, config = next(iter(self.digest_configs.items()))
+        size = config.max_list_size or MAX_DIGEST_LIST
+        for start in range(0, len(data), size):
+            response = p4runtime_pb2.StreamMessageResponse()
+            response.digest.digest_id = digest_id
+            with self.lock:
+                self.list_id += 1
+                response.digest.list_id = self.list_id
+            for values in data[start:start + size]:
+                members = response.digest.data.add().struct.members
+                for value in values:
+                    members.add().bitstring = bitstring(value)
+            primary.put(response)
+            self.counters["digest_lists"] += 1
+
+    # Stream channel and arbitration
+
+    def _elect(self):
+        self.primary = self.streams[max(self.streams)] if self.streams else None
+
+    def _arbitration(self, request, election_id, responses):
+        response = p4runtime_pb2.StreamMessageResponse()
+        response.arbitration.CopyFrom(request)
+        with self.lock:
+            if request.device_id != self.device_id:
+                response.arbitration.status.code = code_pb2.NOT_FOUND
+                response.arbitration.status.message = f"device {request.device_id} not found"
+            elif self.streams.get(election_id, responses) is not responses:
+                response.arbitration.status.code = code_pb2.INVALID_ARGUMENT
+                response.arbitration.status.message = "election ID already in use"
+            else:
+                self.streams[election_id] = responses
+                self._elect()
+                primary = max(self.streams)
+                response.arbitration.election_id.high, response.arbitration.election_id.low = primary
+                response.arbitration.status.code = code_pb2.OK if primary == election_id else code_pb2.ALREADY_EXISTS
+        responses.put(response)
+
+    def _read_stream(self, request_iterator, responses):
+        election_id = None
+        try:
+            for request in request_iterator:
+                update = request.WhichOneof("update")
+                if update == "packet":
+                    self.counters["packet_outs"] += 1
+                    self.on_packet_out(request.packet.payload)
+                elif update == "arbitration":
+                    election_id = (request.arbitration.election_id.high, request.arbitration.election_id.low)
+                    self._arbitration(request.arbitration, election_id, responses)
+                elif update == "digest_ack":
+                    self.counters["digest_acks"] += 1
+        except grpc.RpcError:
+            pass  # the controller went away
+        finally:
+            with self.lock:
+                if self.streams.get(election_id) is responses:
+                    del self.streams[election_id]
+                    self._elect()
+            responses.put(None)
+
+    def StreamChannel(self, request_iterator, context):
+        responses = queue.Queue()
+        context.add_callback(lambda: responses.put(None))
+        threading.Thread(target=self._read_stream, args=(request_iterator, responses), daemon=True).start()
+        return iter(responses.get, None)
+
+    # Write and Read
+
+    def _check_device(self, request, context):
+        if request.device_id != self.device_id:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"device {request.device_id} not found")
+
+    def Write(self, request, context):
+        self._check_device(request, context)
+        with self.lock:
+            for update in request.updates:
+                entity = update.entity
+                if entity.WhichOneof("entity") == "digest_entry":
+                    if update.type == p4runtime_pb2.Update.DELETE:
+                        self.digest_configs.pop(entity.digest_entry.digest_id, None)
+                    else:
+                        self.digest_configs[entity.digest_entry.digest_id] = entity.digest_entry.config
+                key = entity_key(entity)
+                if update.type == p4runtime_pb2.Update.DELETE:
+                    self.entities.pop(key, None)
+                else:
+                    self.entities[key] = entity
+            self.counters["writes"] += len(request.updates)
+        return p4runtime_pb2.WriteResponse()
+
+    def Read(self, request, context):
+        self._check_device(request, context)
+        self.counters["reads"] += 1
+        with self.lock:
+            stored = list(self.entities.values())
+        response = p4runtime_pb2.ReadResponse()
+        for wanted in request.entities:
+            kind = wanted.WhichOneof("entity")
+            for entity in stored:
+                if entity.WhichOneof("entity") != kind:
+                    continue
+                if kind == "table_entry" and wanted.table_entry.table_id not in (0, entity.table_entry.table_id):
+                    continue
+                response.entities.add().CopyFrom(entity)
+        yield response
+
+    def SetForwardingPipelineConfig(self, request, context):
+        self._check_device(request, context)
+        with self.lock:
+            self.pipeline_config.CopyFrom(request.config)
+        return p4runtime_pb2.SetForwardingPipelineConfigResponse()
+
+    def GetForwardingPipelineConfig(self, request, context):
+        self._check_device(request, context)
+        response = p4runtime_pb2.GetForwardingPipelineConfigResponse()
+        with self.lock:
+            response.config.CopyFrom(self.pipeline_config)
+        return response
+
+    def Capabilities(self, request, context):
+        return p4runtime_pb2.CapabilitiesResponse(p4runtime_api_version=API_VERSION)
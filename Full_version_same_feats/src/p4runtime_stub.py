@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+P4Runtime stub switch for benchmarking the controllers.
+
+Serves P4Runtime where simple_switch_grpc would (src/p4runtime_server.py:
+arbitration, StreamChannel, Write and Read) but has no data plane. Once a
+controller is primary, PacketIns are injected at --rate per second: Planter
+packets of timed-out windows, either synthetic (features 0-4 missing with
+--missing probability, as the controller imputes them) or replayed in a loop
+from a pcap of CPU-port traffic (--pcap). Every PacketOut is timestamped on
+arrival and classified:
+
+- Planter packets are matched to their PacketIn by a sequence number the stub
+  writes into the Planter timestamp field (the controller does not change
+  it), giving the PacketIn -> imputation -> PacketOut latency;
+- heartbeats (sensor_id 999) are counted, and each run of increasing patient
+  IDs is taken as one sweep, whose length and duration are reported.
+
+A summary line is printed every --interval seconds and at the end;
+--record writes every PacketOut to a CSV journal.
+
+Example (controller pointed at the stub instead of the switch):
+    python3 ./src/p4runtime_stub.py --rate 2000 --duration 60 --record logs/packet_outs.csv
+    python3 ./src/controller.py --p4info build/PatientMonitoring.p4.p4info.txtpb \\
+        --bmv2-json build/PatientMonitoring.json
+"""
+
+import argparse
+import itertools
+import random
+import struct
+import sys
+import threading
+import time
+
+import planter_codec
+from controller_log import Counters
+from heartbeat import ETHER, ETHERTYPE_SENSOR, HEARTBEAT_SENSOR_ID, SENSOR
+from imputation import IMPUTED_SENSORS, impute_value
+from journal import JournalWriter
+from p4runtime_server import P4RuntimeServer
+from packet_pipeline import LatencyStats
+
+TIMESTAMP = struct.Struct("!HI")  # Planter timestamp, 48 bits as hi16/lo32
+TIMESTAMP_OFFSET = planter_codec.PLANTER_OFFSET + 8
+SENSOR_TYPE = ETHERTYPE_SENSOR.to_bytes(2, "big")
+NUM_PATIENTS = 2000
+
+
+def synthetic_packet_ins(num_patients=NUM_PATIENTS, missing=0.3, seed=None):
+    """Endless Planter frames of timed-out windows, each imputed feature zero with probability missing."""
+    rng = random.Random(seed)
+    if seed is not None:
+        random.seed(seed)  # impute_value draws from the module-level generator
+    values = [[impute_value(sensor_id) for sensor_id in range(planter_codec.NUM_FEATURES)] for _ in range(256)]
+    while True:
+        features = list(rng.choice(values))
+        for sensor_id in IMPUTED_SENSORS:
+            if rng.random() < missing:
+                features[sensor_id] = 0
+        yield bytes(planter_codec.encode(rng.randrange(num_patients), 0, features))
+
+
+def pcap_packet_ins(path):
+    """Endless replay of the frames of a pcap file (e.g. captured on the switch's CPU port)."""
+    from scapy.utils import RawPcapReader
+    frames = [frame for frame, _ in RawPcapReader(path)]
+    if not frames:
+        raise ValueError(f"{path}: no packets")
+    return itertools.cycle(frames)
+
+
+class PacketOutRecorder:
+    """Timestamps the PacketOuts and matches them to the PacketIns tagged by tag()."""
+
+    def __init__(self, journal=None, clock=time.perf_counter):
+        self.journal = journal
+        self.clock = clock
+        self.start = clock()
+        self.lock = threading.Lock()
+        self.sent = {}  # sequence number -> PacketIn time
+        self.latency = LatencyStats()
+        self.counters = Counters("packet_ins", "packet_outs", "imputed", "heartbeats", "other", "unmatched")
+        self.last_pid = None
+        self.sweep_packets = 0
+        self.sweep_start = self.sweep_end = None
+        self.sweeps = []  # (heartbeats, duration_s) of each finished sweep
+
+    def tag(self, frame, sequence):
+        """frame with the Planter timestamp set to sequence, registered as sent now."""
+        if not planter_codec.is_planter(frame):
+            self.counters.add("packet_ins")
+            return frame
+        buf = bytearray(frame)
+        TIMESTAMP.pack_into(buf, TIMESTAMP_OFFSET, (sequence >> 32) & 0xFFFF, sequence & 0xFFFFFFFF)
+        with self.lock:
+            self.sent[sequence] = self.clock()
+        self.counters.add("packet_ins")
+        return bytes(buf)
+
+    def on_packet_out(self, payload):
+        now = self.clock()
+        self.counters.add("packet_outs")
+        patient_id = latency = None
+        if planter_codec.is_planter(payload):
+            kind = "planter"
+            patient_id = planter_codec.patient_id(payload)
+            hi, lo = TIMESTAMP.unpack_from(payload, TIMESTAMP_OFFSET)
+            with self.lock:
+                sent = self.sent.pop((hi << 32) | lo, None)
+            if sent is None:
+                self.counters.add("unmatched")
+            else:
+                latency = now - sent
+                self.latency.add(latency)
+                self.counters.add("imputed")
+        elif payload[12:14] == SENSOR_TYPE and len(payload) >= ETHER.size + SENSOR.size:
+            patient_id, sensor_id = SENSOR.unpack_from(payload, ETHER.size)[:2]
+            kind = "heartbeat" if sensor_id == HEARTBEAT_SENSOR_ID else "sensor"
+            if sensor_id == HEARTBEAT_SENSOR_ID:
+                self.counters.add("heartbeats")
+                self.on_heartbeat(patient_id, now)
+            else:
+                self.counters.add("other")
+        else:
+            kind = "other"
+            self.counters.add("other")
+        if self.journal:
+            self.journal.write([f"{now - self.start:.6f}", kind, patient_id,
+                                "" if latency is None else f"{latency * 1e6:.0f}"])
+
+    def on_heartbeat(self, patient_id, now):
+        with self.lock:
+            if self.last_pid is not None and patient_id <= self.last_pid:
+                self.sweeps.append((self.sweep_packets, self.sweep_end - self.sweep_start))
+                self.sweep_packets = 0
+            if self.sweep_packets == 0:
+                self.sweep_start = now
+            self.sweep_packets += 1
+            self.sweep_end = now
+            self.last_pid = patient_id
+
+    def outstanding(self):
+        with self.lock:
+            return len(self.sent)
+
+    def summary(self, interval_s):
+        with self.lock:
+            sweeps, self.sweeps = self.sweeps, []
+        text = f"{self.counters.summary(interval_s)}; outstanding {self.outstanding()}; latency {self.latency}"
+        if sweeps:
+            packets, duration = sweeps[-1]
+            text += (f"; {len(sweeps)} heartbeat sweeps, last {packets} heartbeats in {duration * 1000:.1f} ms "
+                     f"({packets / duration if duration else 0:.0f}/s)")
+        return text
+
+
+class Injector:
+    """Sends frames as PacketIns at rate per second, in bursts of batch_size."""
+
+    def __init__(self, server, recorder, frames, rate, batch_size=10, count=None):
+        self.server = server
+        self.recorder = recorder
+        self.frames = frames
+        self.rate = rate
+        self.batch_size = max(1, batch_size)
+        self.count = count
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while self.server.primary is None and not self.stopped.wait(0.1):
+            pass  # wait for a controller
+        gap = self.batch_size / self.rate
+        deadline = time.perf_counter()
+        sequence = 0
+        while not self.stopped.is_set() and (self.count is None or sequence < self.count):
+            for frame in self.frames:
+                sequence += 1
+                self.server.packet_in(self.recorder.tag(frame, sequence))
+                if sequence % self.batch_size == 0 or sequence == self.count:
+                    break
+            deadline += gap
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                self.stopped.wait(delay)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def main(args):
+    try:
+        frames = pcap_packet_ins(args.pcap) if args.pcap else synthetic_packet_ins(args.patients, args.missing,
+                                                                                   args.seed)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    journal = JournalWriter(args.record, ["time_s", "kind", "patient_id", "latency_us"]) if args.record else None
+    recorder = PacketOutRecorder(journal)
+    server = P4RuntimeServer(args.device_id, recorder.on_packet_out)
+    server.start(args.address)
+    injector = Injector(server, recorder, frames, args.rate, args.batch_size, args.count)
+    injector.start()
+    print(f"P4Runtime stub listening on {args.address}; PacketIns at {args.rate:.0f}/s once a controller is primary")
+    end = time.monotonic() + args.duration if args.duration else None
+    last = time.monotonic()
+    try:
+        while end is None or last < end:
+            time.sleep(args.interval if end is None else max(0.0, min(args.interval, end - last)))
+            now = time.monotonic()
+            print(recorder.summary(now - last))
+            last = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        injector.stop()
+        server.stop(1)
+        if journal:
+            journal.close()
+    print(f"Total: PacketIns dropped without a controller {server.counters['packet_ins_dropped']}, "
+          f"table writes {server.counters['writes']}; latency {recorder.latency}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="P4Runtime stub switch injecting PacketIns and timing PacketOuts")
+    parser.add_argument("--address", default="127.0.0.1:50051", help="Address to serve P4Runtime on")
+    parser.add_argument("--device-id", type=int, default=0)
+    parser.add_argument("--rate", type=float, default=1000, help="PacketIns per second")
+    parser.add_argument("--batch-size", type=int, default=10, help="PacketIns sent back to back")
+    parser.add_argument("--count", type=int, help="Stop injecting after this many PacketIns")
+    parser.add_argument("--duration", type=float, help="Seconds to run (default: until interrupted)")
+    parser.add_argument("--pcap", help="Replay the frames of this pcap instead of synthetic windows")
+    parser.add_argument("--patients", type=int, default=NUM_PATIENTS, help="Patient IDs of the synthetic windows")
+    parser.add_argument("--missing", type=float, default=0.3,
+                        help="Probability that each imputed feature (0-4) of a synthetic window is missing")
+    parser.add_argument("--seed", type=int, help="Seed of the synthetic windows")
+    parser.add_argument("--record", help="CSV journal of every PacketOut (time, kind, patient, latency)")
+    parser.add_argument("--interval", type=float, default=10, help="Seconds between summary lines")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+PacketIn receive queue and worker pool for the controller.
+
+A dedicated receiver thread drains the P4Runtime stream channel into a bounded
+queue so that slow handling (imputation logging, printing, PacketOut) never
+stalls the gRPC stream; N worker threads take packets from the queue.
+
+When the queue is full the receiver either blocks (policy "block", which
+stops reading the stream and lets gRPC flow control push back on the switch)
+or drops the newest packet and counts it (policy "drop").
+
+When receive() raises StreamClosed the stream is gone for good: the receiver
+counts the error and stops the pipeline instead of polling a dead stream, and
+the controller notices through stopped.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+
+
+class StreamClosed(Exception):
+    """Raised by a pipeline's receive() when the stream has ended or failed and no message will follow."""
+
+
+class LatencyStats:
+    """Count/mean/max plus percentiles over the most recent samples."""
+
+    def __init__(self, window=4096):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, p):
+        with self.lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def __str__(self):
+        mean = self.total / self.count if self.count else 0.0
+        return (f"mean {mean * 1000:.2f} ms, p50 {self.percentile(50) * 1000:.2f} ms, "
+                f"p99 {self.percentile(99) * 1000:.2f} ms, max {self.max * 1000:.2f} ms")
+
+
+class PacketInPipeline:
+    """Receiver thread + bounded queue + worker pool.
+
+    receive() blocks for the next stream message and returns None when there
+    is nothing to hand over, or raises StreamClosed when the stream is dead,
+    which stops the pipeline (stopped is set, the error kept in
+    stream_error). route(msg) is called on the receiver thread and
+    returns the item to queue, or None if the message was fully handled inline
+    (e.g. digests). handle(item) runs on a worker and does the PacketOut; its
+    completion time minus the receive time is the PacketIn->PacketOut latency.
+    """
+
+    def __init__(self, receive, handle, route=lambda msg: msg, num_workers=2,
+                 queue_size=1024, policy="block"):
+        if policy not in ("block", "drop"):
+            raise ValueError(f"Unknown queue policy {policy!r}")
+        self.receive = receive
+        self.handle = handle
+        self.route = route
+        self.num_workers = num_workers
+        self.policy = policy
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.latency = LatencyStats()
+        self.received = self.dropped = self.handled = self.errors = self.stream_errors = 0
+        self.stream_error = None
+        self.max_depth = 0
+        self.counter_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def start(self):
+        self.threads = [threading.Thread(target=self._receive_loop, name="packetin-rx", daemon=True)]
+        self.threads += [threading.Thread(target=self._worker_loop, name=f"packetin-worker-{i}", daemon=True)
+                         for i in range(self.num_workers)]
+        for t in reversed(self.threads):  # workers first: a closed stream makes the receiver join them
+            t.start()
+
+    def stop(self, timeout=2.0):
+        self.stopping.set()
+        self.stopped.set()
+        for _ in range(self.num_workers):
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                pass
+        for t in self.threads[1:]:
+            t.join(timeout)
+
+    def _receive_loop(self):
+        while not self.stopping.is_set():
+            try:
+                msg = self.receive()
+            except StreamClosed as e:
+                self.stream_errors += 1
+                self.stream_error = e
+                self.stop()
+                return
+            if msg is None:
+                continue
+            item = self.route(msg)
+            if item is None:
+                continue
+            self.received += 1
+            entry = (time.perf_counter(), item)
+            if self.policy == "block":
+                self.queue.put(entry)
+            else:
+                try:
+                    self.queue.put_nowait(entry)
+                except queue.Full:
+                    self.dropped += 1
+                    continue
+            depth = self.queue.qsize()
+            if depth > self.max_depth:
+                self.max_depth = depth
+
+    def _worker_loop(self):
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                return
+            received_at, item = entry
+            try:
+                self.handle(item)
+            except Exception:
+                with self.counter_lock:
+                    self.errors += 1
+            else:
+                self.latency.add(time.perf_counter() - received_at)
+                with self.counter_lock:
+                    self.handled += 1
+
+    def stats(self):
+        return (f"received {self.received}, handled {self.handled}, dropped {self.dropped}, "
+                f"errors {self.errors}, stream errors {self.stream_errors}, "
+                f"queue depth {self.queue.qsize()} (max {self.max_depth}/"
+                f"{self.queue.maxsize}), PacketIn->PacketOut {self.latency}")
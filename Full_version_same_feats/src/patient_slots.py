@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Patient admission for `make PATIENT_SLOTS=1` builds of PatientMonitoring.p4.
+
+With PATIENT_SLOTS the window registers are indexed by a slot from the
+exact-match patient_slot table instead of by the patient ID, so NUM_PATIENTS
+bounds the patients admitted at the same time, not the ID range. Sensor
+packets of a patient without an entry are dropped and reported by an
+unknown_patient_t digest.
+
+SlotManager owns that table: admit() takes slots from a free list and
+inserts the entries, discharge() deletes them and puts the slots back at the
+end of the free list, so the most recently freed slot is reused last. The
+switch records which patient last used each slot and starts the new owner
+with an empty window, so a slot can be reused as soon as it is discharged.
+Patients are touch()ed on every sign of activity (window digests, PacketIns)
+and idle() lists the ones to discharge. admit_async() and discharge_async()
+do the same with a coroutine write callback, for the asyncio controller.
+"""
+
+import threading
+import time
+from collections import deque
+
+from p4.v1 import p4runtime_pb2
+
+from table_commands import EXACT, Key, ParsedCommand
+from table_loader import encode_update
+
+SLOT_TABLE = "patient_slot"
+SET_SLOT = "set_slot"
+UNKNOWN_PATIENT_DIGEST = "unknown_patient_t"
+
+
+def parse_patient_ids(spec):
+    """Patient IDs of a comma-separated list of IDs and inclusive ranges, e.g. "1000-2999,5000"."""
+    ids = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        try:
+            first = int(first)
+            last = int(last) if sep else first
+        except ValueError:
+            raise ValueError(f"expected an ID or a FIRST-LAST range, got {part!r}") from None
+        if last < first:
+            raise ValueError(f"empty range {part!r}")
+        ids.extend(range(first, last + 1))
+    return ids
+
+
+def slot_update(index, patient_id, slot, update_type=p4runtime_pb2.Update.INSERT):
+    """Serialized P4Runtime Update of the patient_slot entry of patient_id; index is a table_loader.P4InfoIndex."""
+    command = ParsedCommand(SLOT_TABLE, SET_SLOT, (Key(EXACT, patient_id, None),), (slot,), SLOT_TABLE, 0)
+    return encode_update(command, index, update_type=update_type)
+
+
+class SlotManager:
+    """Free-list allocation of num_slots register slots to patient IDs.
+
+    write(updates) is called with the serialized patient_slot Updates of each
+    admit() and discharge() and must raise if they were not applied; the
+    allocation is then rolled back. Without an index nothing is written.
+    admit_async() and discharge_async() await write(updates) instead; the
+    lock is not held during the Write, and patients with a DELETE in flight
+    are not discharged twice.
+    """
+
+    def __init__(self, num_slots, index=None, write=None, clock=time.monotonic):
+        self.num_slots = num_slots
+        self.index = index
+        self.write = write
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.free = deque(range(num_slots))
+        self.slots = {}  # patient_id -> slot
+        self.last_seen = {}  # patient_id -> clock time of the last touch()
+        self.discharging = set()  # patient IDs of discharge_async() calls waiting on their Write
+        self.admitted = self.discharged = self.rejected = 0
+
+    def _updates(self, changes, update_type):
+        """Serialized Updates of changes, or None when there is nothing to write."""
+        if self.index is not None and self.write is not None and changes:
+            return [slot_update(self.index, pid, slot, update_type) for pid, slot in changes]
+        return None
+
+    def _allocate(self, patient_ids):
+        # Called with the lock held
+        now = self.clock()
+        changes = []
+        for pid in dict.fromkeys(patient_ids):
+            if pid in self.slots:
+                continue
+            if not self.free:
+                self.rejected += 1
+                continue
+            slot = self.free.popleft()
+            self.slots[pid] = slot
+            self.last_seen[pid] = now
+            changes.append((pid, slot))
+        return changes
+
+    def _roll_back(self, changes):
+        # Called with the lock held: undo _allocate(), putting the slots back at the front of the free list
+        for pid, slot in reversed(changes):
+            del self.slots[pid]
+            del self.last_seen[pid]
+            self.free.appendleft(slot)
+
+    def _release(self, changes):
+        # Called with the lock held
+        for pid, slot in changes:
+            del self.slots[pid]
+            del self.last_seen[pid]
+            self.free.append(slot)
+        self.discharged += len(changes)
+
+    def admit(self, patient_ids):
+        """Give a slot to every patient of patient_ids without one; returns the [(patient_id, slot)] admitted.
+
+        Patients beyond the free slots are counted in rejected and left out.
+        """
+        with self.lock:
+            changes = self._allocate(patient_ids)
+            try:
+                updates = self._updates(changes, p4runtime_pb2.Update.INSERT)
+                if updates:
+                    self.write(updates)
+            except Exception:
+                self._roll_back(changes)
+                raise
+            self.admitted += len(changes)
+        return changes
+
+    async def admit_async(self, patient_ids):
+        """admit() awaiting the write callback."""
+        with self.lock:
+            changes = self._allocate(patient_ids)
+        try:
+            updates = self._updates(changes, p4runtime_pb2.Update.INSERT)
+            if updates:
+                await self.write(updates)
+        except BaseException:
+            with self.lock:
+                self._roll_back(changes)
+            raise
+        with self.lock:
+            self.admitted += len(changes)
+        return changes
+
+    def discharge(self, patient_ids):
+        """Free the slots of the admitted patients of patient_ids; returns the [(patient_id, slot)] discharged."""
+        with self.lock:
+            changes = [(pid, self.slots[pid]) for pid in dict.fromkeys(patient_ids) if pid in self.slots]
+            updates = self._updates(changes, p4runtime_pb2.Update.DELETE)
+            if updates:
+                self.write(updates)
+            self._release(changes)
+        return changes
+
+    async def discharge_async(self, patient_ids):
+        """discharge() awaiting the write callback; the slots are only freed once the DELETEs are applied."""
+        with self.lock:
+            changes = [(pid, self.slots[pid]) for pid in dict.fromkeys(patient_ids)
+                       if pid in self.slots and pid not in self.discharging]
+            self.discharging.update(pid for pid, _ in changes)
+        try:
+            updates = self._updates(changes, p4runtime_pb2.Update.DELETE)
+            if updates:
+                await self.write(updates)
+            with self.lock:
+                self._release(changes)
+        finally:
+            with self.lock:
+                self.discharging.difference_update(pid for pid, _ in changes)
+        return changes
+
+    def touch(self, patient_id):
+        """Record activity of an admitted patient."""
+        now = self.clock()
+        with self.lock:
+            if patient_id in self.last_seen:
+                self.last_seen[patient_id] = now
+
+    def idle(self, idle_s):
+        """Admitted patients without activity for idle_s seconds."""
+        cutoff = self.clock() - idle_s
+        with self.lock:
+            return [pid for pid, seen in self.last_seen.items() if seen <= cutoff]
+
+    def slot(self, patient_id):
+        return self.slots.get(patient_id)
+
+    def patient_ids(self):
+        with self.lock:
+            return list(self.slots)
+
+    def __iter__(self):
+        return iter(self.patient_ids())
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, patient_id):
+        return patient_id in self.slots
+
+    def __str__(self):
+        return (f"{len(self)}/{self.num_slots} slots used, {self.admitted} admitted, "
+                f"{self.discharged} discharged, {self.rejected} rejected")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Struct-based codec for the Planter header carried in PacketIn/PacketOut payloads.
+
+The controller only needs to read the patient ID and the ten feature slots and
+to patch a few of them before handing the frame back to the switch, so the
+payload is kept as a bytearray and fields are read/written in place with
+precompiled struct formats. Scapy is only imported for the optional debug dump.
+"""
+
+import struct
+from collections import namedtuple
+
+# ---------------------------
+# Wire layout (must match Planter_h in PatientMonitoring.p4)
+# ---------------------------
+ETHERTYPE_PLANTER = 0x1234
+PLANTER_MAGIC = b"P4\x01"  # p, four, ver
+NUM_FEATURES = 10
+
+ETHER = struct.Struct("!6s6sH")
+# p, four, ver, typ, patient_id, timestamp (48 bits as hi16/lo32), feature0-9, result
+PLANTER = struct.Struct("!3sBIHI10HI")
+FEATURE = struct.Struct("!H")
+FEATURES = struct.Struct("!10H")
+PATIENT_ID = struct.Struct("!I")
+
+ETHERTYPE_OFFSET = 12
+PLANTER_OFFSET = ETHER.size
+PATIENT_ID_OFFSET = PLANTER_OFFSET + 4
+FEATURES_OFFSET = PLANTER_OFFSET + 14
+FRAME_LEN = ETHER.size + PLANTER.size
+
+PlanterFields = namedtuple("PlanterFields", ["patient_id", "timestamp", "features", "result"])
+
+
+def is_planter(buf):
+    """Return True if buf holds an Ethernet frame with a valid Planter header."""
+    return (len(buf) >= FRAME_LEN
+            and buf[ETHERTYPE_OFFSET] == ETHERTYPE_PLANTER >> 8
+            and buf[ETHERTYPE_OFFSET + 1] == ETHERTYPE_PLANTER & 0xFF
+            and buf[PLANTER_OFFSET:PLANTER_OFFSET + 3] == PLANTER_MAGIC)
+
+
+def patient_id(buf):
+    return PATIENT_ID.unpack_from(buf, PATIENT_ID_OFFSET)[0]
+
+
+def features(buf):
+    return FEATURES.unpack_from(buf, FEATURES_OFFSET)
+
+
+def set_feature(buf, index, value):
+    """Overwrite feature<index> of the Planter header in place."""
+    FEATURE.pack_into(buf, FEATURES_OFFSET + 2 * index, value)
+
+
+def decode(buf):
+    """Decode the whole Planter header into a PlanterFields tuple."""
+    fields = PLANTER.unpack_from(buf, PLANTER_OFFSET)
+    return PlanterFields(
+        patient_id=fields[2],
+        timestamp=(fields[3] << 32) | fields[4],
+        features=fields[5:5 + NUM_FEATURES],
+        result=fields[-1],
+    )
+
+
+def encode(pid, timestamp, feature_values, result=0x63, typ=0x01,
+           dst=b"\xff" * 6, src=b"\x00" * 6):
+    """Build a bytearray holding an Ethernet + Planter frame."""
+    buf = bytearray(FRAME_LEN)
+    ETHER.pack_into(buf, 0, dst, src, ETHERTYPE_PLANTER)
+    PLANTER.pack_into(buf, PLANTER_OFFSET, PLANTER_MAGIC, typ, pid,
+                      (timestamp >> 32) & 0xFFFF, timestamp & 0xFFFFFFFF,
+                      *feature_values, result)
+    return buf
+
+
+# ---------------------------
+# Optional scapy view, for debugging only
+# ---------------------------
+_scapy_layers = None
+
+
+def _load_scapy():
+    global _scapy_layers
+    if _scapy_layers is None:
+        from scapy.all import Ether, Packet, bind_layers
+        from scapy.fields import ByteField, BitField, ShortField, IntField, StrFixedLenField
+
+        class Planter(Packet):
+            name = "Planter"
+            fields_desc = [
+                StrFixedLenField("P", "P", length=1),
+                StrFixedLenField("Four", "4", length=1),
+                ByteField("version", 0x01),
+                ByteField("type", 0x01),
+                IntField("patient_id", 0),
+                BitField("timestamp", 0, 48),
+            ] + [ShortField(f"feature{i}", 0) for i in range(NUM_FEATURES)] + [
+                IntField("result", 0)
+            ]
+
+        bind_layers(Ether, Planter, type=ETHERTYPE_PLANTER)
+        _scapy_layers = (Ether, Planter)
+    return _scapy_layers
+
+
+def debug_view(buf):
+    """Return the scapy show2() dump of the Planter header (imports scapy lazily)."""
+    Ether, Planter = _load_scapy()
+    return Ether(bytes(buf))[Planter].show2(dump=True)
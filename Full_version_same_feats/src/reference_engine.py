@@ -0,0 +1,797 @@
+#!/usr/bin/env python3
+"""
+Batch reference engine for the in-network inference pipeline.
+
+Runs what the switch does once a window is complete, over whole CSV files at
+once, without a switch: the P4 program of a variant directory is read
+(PatientMonitoring.p4, or XGB_Mon_Sepsis.p4 in Initial_version_sepsis_only)
+and its `if (runInference == 1)` block is interpreted with NumPy, one array
+element per CSV row. Tables get their entries from the variant's tables/*.txt
+table_add files and from the `const entries` of the P4 source (the NEWS2
+sub-score tables), so every variant is covered by the same code:
+Initial_version_sepsis_only, First_merge_sepsis_news, Full_version_diff_feats,
+Full_version_merged_fts_nw and Full_version_same_feats.
+
+Like the switch on a Planter packet, the row's 10 values are the Planter
+features (sensor ids 0-9 in SENSOR_COLUMNS order, temperature x10 truncated as
+the simulators and accuracy tests send it), prepare_planter_feats() copies them
+into the metadata, and the outputs are the Alert header fields written by
+generate_alert_pkt(). Matching follows BMv2: exact keys are looked up, ternary
+and range entries go by CLI priority (lower first, file order on ties), const
+entries by their order in the program, LPM entries by prefix length; a miss
+runs the default action. Metadata starts at 0 and every assignment wraps at
+the width of its field. Windowing, timeouts and the controller's imputation
+are not part of it: rows with a missing value are skipped.
+
+The preprocessor handles the #define/#ifdef/#ifndef/#else/#endif used by the
+Makefile build options (-D, e.g. `-D LEAF_SCORE_SUM` with the tables from
+`build/tables-sum`). Statements the inference block does not need (switch,
+register and digest externs) raise EngineError rather than being guessed.
+
+Example:
+    python3 ./src/reference_engine.py data/val_data_normal_vs_sepsis.csv data/val_normal_vs_heart_failure.csv
+    python3 ./src/reference_engine.py --variant ../Full_version_diff_feats --output build/diff.csv \\
+        ../Full_version_diff_feats/data/val_normal_vs_heart_failure.csv
+"""
+
+import argparse
+import csv
+import glob
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from table_commands import EXACT, LPM, RANGE, TERNARY, TableCommandError, read_commands, split_priority
+from table_minimizer import MinimizerError, braced, short_name
+
+SENSOR_COLUMNS = ['temperature', 'oxygen_saturation', 'pulse_rate', 'systolic_bp', 'respiratory_rate',
+                  'avpu', 'supplemental_oxygen', 'referral_source', 'age', 'sex']  # Planter feature0..feature9
+COLUMN_SCALE = {'temperature': 10}
+P4_FILES = ('PatientMonitoring.p4', 'XGB_Mon_Sepsis.p4')
+# Alert fields holding a model's label, and the CSV condition the label stands for
+LABEL_FIELDS = {'alert_value': 1, 'sepPrediction': 1, 'hfPrediction': 2}
+CONDITION_NAMES = {1: 'sepsis', 2: 'heart failure'}
+MAX_PACKED_KEY_BITS = 62  # exact keys packed into one int64 for the vectorized lookup
+MAX_MATCH_CELLS = 1 << 22  # rows x entries compared at once on ternary, range and LPM tables
+
+Param = namedtuple("Param", ["direction", "width", "name"])
+Action = namedtuple("Action", ["params", "body"])
+# keys: (kind, value or low, mask, high or prefix length) per key; priority None for const entries (program order)
+TableEntry = namedtuple("TableEntry", ["keys", "action", "args", "priority"])
+Table = namedtuple("Table", ["keys", "actions", "default", "entries"])  # keys: (expression, kind)
+
+
+class EngineError(Exception):
+    pass
+
+
+# Preprocessing
+
+def preprocess(source, defines=None):
+    """Source with comments removed, #if(n)def blocks resolved and object-like macros and typedefs expanded."""
+    source = re.sub(r"/\*.*?\*/", lambda m: "\n" * m.group().count("\n"), source, flags=re.S)
+    source = re.sub(r"//[^\n]*", "", source)
+    macros = dict(defines or {})
+    lines, stack = [], []
+    for line in source.split("\n"):
+        directive = re.match(r"\s*#\s*(\w+)\s*(.*)", line)
+        active = all(stack)
+        if directive:
+            name, rest = directive.group(1), directive.group(2).strip()
+            if name in ("ifdef", "ifndef"):
+                stack.append((rest in macros) == (name == "ifdef"))
+            elif name == "else":
+                stack[-1] = not stack[-1]
+            elif name == "endif":
+                stack.pop()
+            elif name == "define" and active:
+                macro, _, value = rest.partition(" ")
+                macros[macro] = value.strip()
+            lines.append("")
+            continue
+        lines.append(line if active else "")
+    source = "\n".join(lines)
+    for macro, value in macros.items():
+        source = re.sub(rf"\b{macro}\b", value, source)
+    for bits, name in re.findall(r"\btypedef\s+bit<(\d+)>\s+(\w+)\s*;", source):
+        source = re.sub(rf"\btypedef\s+bit<{bits}>\s+{name}\s*;", "", source)
+        source = re.sub(rf"\b{name}\b", f"bit<{bits}>", source)
+    return source
+
+
+# Expressions and statements
+
+TOKEN = re.compile(r"\s*(?:(\d+w\d+|0x[0-9a-fA-F]+|\d+)|([A-Za-z_][\w.]*)|"
+                   r"(&&&|\.\.|<<|>>|<=|>=|==|!=|&&|\|\||[-+*/%&|^~!<>()\[\]{}:;,=]))")
+BINARY = {"||": 1, "&&": 2, "|": 3, "^": 4, "&": 5, "==": 6, "!=": 6, "<": 7, "<=": 7, ">": 7, ">=": 7,
+          "<<": 8, ">>": 8, "+": 9, "-": 9, "*": 10}
+COMPARISONS = {"==": np.equal, "!=": np.not_equal, "<": np.less, "<=": np.less_equal, ">": np.greater,
+               ">=": np.greater_equal}
+ARITHMETIC = {"|": np.bitwise_or, "^": np.bitwise_xor, "&": np.bitwise_and, "<<": np.left_shift,
+              ">>": np.right_shift, "+": np.add, "-": np.subtract, "*": np.multiply}
+
+
+def tokenize(text):
+    tokens, pos = [], 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = TOKEN.match(text, pos)
+        if not m or m.end() == pos:
+            raise EngineError(f"cannot parse P4 text at {text[pos:pos + 40]!r}")
+        tokens.append(m.group(m.lastindex))
+        pos = m.end()
+    return tokens
+
+
+def number(token):
+    if "w" in token and not token.startswith("0x"):
+        width, value = token.split("w")
+        return int(value, 0) & ((1 << int(width)) - 1)
+    return int(token, 0)
+
+
+def masked(value, width):
+    return value & ((1 << width) - 1) if width else value
+
+
+class Parser:
+    """Recursive-descent parser turning P4 expressions and statements into closures over a State."""
+
+    def __init__(self, program, tokens):
+        self.program = program
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or (expected is not None and token != expected):
+            raise EngineError(f"expected {expected or 'more P4'}, found {token!r} in {' '.join(self.tokens[:30])}")
+        self.pos += 1
+        return token
+
+    # Expressions: each evaluates to (value, width); width None for untyped literals and comparisons
+
+    def expression(self, min_precedence=1):
+        left = self.unary()
+        while self.peek() in BINARY and BINARY[self.peek()] >= min_precedence:
+            op = self.take()
+            right = self.expression(BINARY[op] + 1)
+            left = self.binary(op, left, right)
+        return left
+
+    @staticmethod
+    def binary(op, left, right):
+        def evaluate(state, frame):
+            a, wa = left(state, frame)
+            b, wb = right(state, frame)
+            if op in COMPARISONS:
+                return COMPARISONS[op](a, b).astype(np.int64), None
+            if op in ("&&", "||"):
+                truth = np.logical_and(a != 0, b != 0) if op == "&&" else np.logical_or(a != 0, b != 0)
+                return truth.astype(np.int64), None
+            width = wa if op in ("<<", ">>") else max(wa or 0, wb or 0) or None
+            return masked(ARITHMETIC[op](a, b), width), width
+        return evaluate
+
+    def unary(self):
+        token = self.peek()
+        if token in ("!", "~", "-"):
+            self.take()
+            operand = self.unary()
+
+            def evaluate(state, frame):
+                value, width = operand(state, frame)
+                if token == "!":
+                    return (value == 0).astype(np.int64), None
+                return masked(~value if token == "~" else -value, width), width
+            return evaluate
+        if token == "(" and self.peek(1) == "bit" and self.peek(2) == "<":
+            self.take("(")
+            self.take("bit")
+            self.take("<")
+            width = int(self.take())
+            self.take(">")
+            self.take(")")
+            operand = self.unary()
+            return lambda state, frame: (masked(operand(state, frame)[0], width), width)
+        return self.postfix(self.primary())
+
+    def primary(self):
+        token = self.take()
+        if token == "(":
+            inner = self.expression()
+            self.take(")")
+            return inner
+        if token[0].isdigit():
+            value = number(token)
+            return lambda state, frame: (value, None)
+        if token.endswith(".isValid") and self.peek() == "(":
+            self.take("(")
+            self.take(")")
+            header = token[:-len(".isValid")]
+            return lambda state, frame: (int(state.valid.get(header, False)), None)
+        if token in self.program.consts:
+            value, width = self.program.consts[token]
+            return lambda state, frame: (value, width)
+        return lambda state, frame: frame.read(state, token)
+
+    def postfix(self, operand):
+        while self.peek() == "[":
+            self.take("[")
+            hi = int(self.take())
+            self.take(":")
+            lo = int(self.take())
+            self.take("]")
+            operand = self.slice(operand, hi, lo)
+        return operand
+
+    @staticmethod
+    def slice(operand, hi, lo):
+        width = hi - lo + 1
+        return lambda state, frame: (masked(operand(state, frame)[0] >> lo, width), width)
+
+    # Statements: each runs as statement(state, frame, active rows)
+
+    def block(self):
+        statements = []
+        while self.peek() is not None and self.peek() != "}":
+            statements.append(self.statement())
+
+        def run(state, frame, active):
+            for statement in statements:
+                statement(state, frame, active)
+        return run
+
+    def statement(self):
+        token = self.peek()
+        if token == "{":
+            self.take("{")
+            body = self.block()
+            self.take("}")
+            return body
+        if token == ";":
+            self.take(";")
+            return lambda state, frame, active: None
+        if token == "if":
+            return self.if_statement()
+        if token == "bit":
+            self.take("bit")
+            self.take("<")
+            width = int(self.take())
+            self.take(">")
+            name = self.take()
+            value = None
+            if self.peek() == "=":
+                self.take("=")
+                value = self.expression()
+            self.take(";")
+            return self.assignment(name, value, declared=(name, width))
+        if token in ("switch", "return", "exit"):
+            raise EngineError(f"'{token}' statements are not supported by the reference engine")
+        target = self.take()
+        if self.peek() == "(":
+            return self.call(target)
+        if self.peek() == "[":
+            raise EngineError(f"slice assignments ({target}[..] = ...) are not supported by the reference engine")
+        self.take("=")
+        value = self.expression()
+        self.take(";")
+        return self.assignment(target, value)
+
+    def if_statement(self):
+        self.take("if")
+        self.take("(")
+        condition = self.expression()
+        self.take(")")
+        then = self.statement()
+        otherwise = None
+        if self.peek() == "else":
+            self.take("else")
+            otherwise = self.statement()
+
+        def run(state, frame, active):
+            truth = np.broadcast_to(condition(state, frame)[0] != 0, active.shape)
+            then(state, frame, active & truth)
+            if otherwise is not None:
+                otherwise(state, frame, active & ~truth)
+        return run
+
+    def assignment(self, target, value, declared=None):
+        def run(state, frame, active):
+            if declared:
+                frame.declare(*declared)
+            if value is not None:
+                frame.write(state, target, value(state, frame)[0], active)
+        return run
+
+    def arguments(self):
+        self.take("(")
+        args = []
+        while self.peek() != ")":
+            start = self.pos
+            depth = 0
+            while not (depth == 0 and self.peek() in (",", ")")):
+                depth += {"(": 1, ")": -1}.get(self.take(), 0)
+            args.append(self.tokens[start:self.pos])
+            if self.peek() == ",":
+                self.take(",")
+        self.take(")")
+        return args
+
+    def call(self, target):
+        args = self.arguments()
+        self.take(";")
+        if target.endswith(".apply"):
+            table = target[:-len(".apply")]
+            if table not in self.program.tables:
+                raise EngineError(f"unknown table {table}")
+            return lambda state, frame, active: self.program.apply_table(table, state, active)
+        if target.endswith(".setValid") or target.endswith(".setInvalid"):
+            header, _, method = target.rpartition(".")
+
+            def set_validity(state, frame, active):
+                state.valid[header] = method == "setValid"
+            return set_validity
+        if target in self.program.actions:
+            bound = [Parser(self.program, arg).expression() if arg else None for arg in args]
+            lvalues = [arg[0] if len(arg) == 1 else None for arg in args]
+            return lambda state, frame, active: self.program.call_action(
+                target, [(b(state, frame)[0] if b else None) for b in bound], lvalues, state, active, frame)
+        if target == "NoAction":
+            return lambda state, frame, active: None
+        raise EngineError(f"extern call {target}(...) is not supported by the reference engine")
+
+
+class State:
+    """Values of every field for all rows (metadata and headers start at 0) and header validity."""
+
+    def __init__(self, rows, widths):
+        self.rows = rows
+        self.widths = widths
+        self.values = {}
+        self.valid = {}
+
+    def read(self, name):
+        if name not in self.values:
+            self.values[name] = np.zeros(self.rows, dtype=np.int64)
+        return self.values[name], self.widths.get(name)
+
+    def write(self, name, value, active, width=None):
+        width = width or self.widths.get(name)
+        current, _ = self.read(name)
+        self.values[name] = np.where(active, masked(np.broadcast_to(value, current.shape), width), current)
+
+
+class Frame:
+    """Names local to an action call or a control block: parameters, out-parameter bindings and locals."""
+
+    def __init__(self, values=None, widths=None, aliases=None):
+        self.values = values or {}
+        self.widths = widths or {}
+        self.aliases = aliases or {}
+
+    def declare(self, name, width):
+        self.widths[name] = width
+
+    def read(self, state, name):
+        name = self.aliases.get(name, name)
+        if name in self.values:
+            return self.values[name], self.widths.get(name)
+        if name in self.widths:
+            self.values[name] = np.zeros(state.rows, dtype=np.int64)
+            return self.values[name], self.widths[name]
+        return state.read(name)
+
+    def write(self, state, name, value, active):
+        name = self.aliases.get(name, name)
+        if name in self.widths:
+            current = self.values.get(name, np.zeros(state.rows, dtype=np.int64))
+            self.values[name] = np.where(active, masked(np.broadcast_to(value, current.shape),
+                                                        self.widths[name]), current)
+        else:
+            state.write(name, value, active)
+
+
+# The program
+
+class Program:
+    """Ingress control of a P4 program with its table entries, runnable over many packets at once."""
+
+    def __init__(self, source, defines=None, control="SwitchIngress"):
+        self.source = preprocess(source, defines)
+        self.consts = {name: (number(value), int(bits) if bits else None) for bits, name, value in re.findall(
+            r"\bconst\s+(?:bit<(\d+)>|int)\s+(\w+)\s*=\s*(\w+)\s*;", self.source)}
+        self.widths = self.parse_widths(control)
+        m = re.search(rf"\bcontrol\s+{control}\s*\(", self.source)
+        if not m:
+            raise EngineError(f"control {control} not found")
+        self.body, _ = braced(self.source, m.end())
+        self.actions = self.parse_actions()
+        self.tables = self.parse_tables()
+        self.compiled = {}
+
+    def parse_widths(self, control):
+        """Widths of the control parameters' fields, e.g. meta.temperature or hdr.Alert.patient_id."""
+        types = {}
+        for m in re.finditer(r"\b(?:header|struct)\s+(\w+)\s*\{", self.source):
+            body, _ = braced(self.source, m.end() - 1)
+            types[m.group(1)] = re.findall(r"(bit<(\d+)>|\w+)\s+(\w+)\s*;", body)
+        signature = re.search(rf"\bcontrol\s+{control}\s*\(([^)]*)\)", self.source)
+        widths = {}
+
+        def flatten(prefix, type_name):
+            for declaration, bits, field in types.get(type_name, []):
+                if bits:
+                    widths[f"{prefix}.{field}"] = int(bits)
+                else:
+                    flatten(f"{prefix}.{field}", declaration)
+        for param in (signature.group(1).split(",") if signature else []):
+            parts = param.split()
+            if len(parts) >= 2:
+                flatten(parts[-1], parts[-2])
+        return widths
+
+    def parse_actions(self):
+        actions = {"NoAction": Action([], "")}
+        for m in re.finditer(r"\baction\s+(\w+)\s*\(([^)]*)\)\s*\{", self.body):
+            body, _ = braced(self.body, m.end() - 1)
+            params = []
+            for param in filter(None, (p.strip() for p in m.group(2).split(","))):
+                declared = re.fullmatch(r"(?:(in|out|inout)\s+)?bit<(\d+)>\s+(\w+)", param)
+                if not declared:
+                    raise EngineError(f"action {m.group(1)}: unsupported parameter {param!r}")
+                params.append(Param(declared.group(1), int(declared.group(2)), declared.group(3)))
+            actions[m.group(1)] = Action(params, body)
+        return actions
+
+    def parse_tables(self):
+        tables = {}
+        for m in re.finditer(r"\btable\s+(\w+)\s*\{", self.body):
+            body, _ = braced(self.body, m.end() - 1)
+            keys = []
+            key_block = re.search(r"\bkey\s*=\s*\{(.*?)\}", body, re.S)
+            for key in filter(None, (k.strip() for k in (key_block.group(1) if key_block else "").split(";"))):
+                expression, _, kind = key.rpartition(":")
+                keys.append((Parser(self, tokenize(expression)).expression(), kind.strip()))
+            actions = {}
+            actions_block = re.search(r"\bactions\s*=\s*\{(.*?)\}", body, re.S)
+            for name, args in re.findall(r"(\w+)\s*(?:\(([^)]*)\))?\s*;", actions_block.group(1) if actions_block else ""):
+                actions[name] = [a.strip() for a in (args or "").split(",") if a.strip()]
+            default = re.search(r"\bdefault_action\s*=\s*(\w+)\s*(?:\(([^)]*)\))?", body)
+            default_call = ("NoAction", [])
+            if default:
+                default_call = (default.group(1), self.constant_args(default.group(2)))
+            entries = []
+            const = re.search(r"\bconst\s+entries\s*=\s*\{", body)
+            if const:
+                entries_text, _ = braced(body, const.end() - 1)
+                for entry in filter(None, (e.strip() for e in entries_text.split(";"))):
+                    entries.append(self.const_entry(m.group(1), entry, len(keys)))
+            tables[m.group(1)] = Table(keys, actions, default_call, entries)
+        return tables
+
+    def constant_args(self, text):
+        state = State(1, {})
+        return [int(np.asarray(Parser(self, tokenize(arg)).expression()(state, Frame())[0]).reshape(-1)[0])
+                for arg in (text or "").split(",") if arg.strip()]
+
+    def const_entry(self, table, text, num_keys):
+        keyset, _, call = text.rpartition(":")
+        call = re.fullmatch(r"\s*(\w+)\s*(?:\((.*)\))?\s*", call)
+        if not call:
+            raise EngineError(f"{table}: cannot parse const entry {text!r}")
+        keyset = keyset.strip()
+        if keyset.startswith("(") and keyset.endswith(")") and num_keys > 1:
+            keyset = keyset[1:-1]
+        keys = []
+        for key in (k.strip() for k in keyset.split(",")):
+            if key in ("_", "default"):
+                keys.append((TERNARY, 0, 0))
+            elif ".." in key:
+                low, high = key.split("..")
+                keys.append((RANGE, *self.constant_args(f"{low},{high}")))
+            elif "&&&" in key:
+                value, mask = key.split("&&&")
+                keys.append((TERNARY, *self.constant_args(f"{value},{mask}")))
+            else:
+                keys.append((EXACT, self.constant_args(key)[0], None))
+        if len(keys) != num_keys:
+            raise EngineError(f"{table}: const entry {text!r} has {len(keys)} keys, the table {num_keys}")
+        return TableEntry(keys, call.group(1), self.constant_args(call.group(2)), None)
+
+    def add_commands(self, commands):
+        """Add table_add entries; returns {table: entries} for the tables not in this program."""
+        skipped = {}
+        for c in commands:
+            table_name = short_name(c.table)
+            table = self.tables.get(table_name)
+            if table is None:
+                skipped[table_name] = skipped.get(table_name, 0) + 1
+                continue
+            action = short_name(c.action)
+            if action not in table.actions:
+                raise EngineError(f"{c.source}:{c.lineno}: {action} is not an action of {short_name(c.table)}")
+            num_params = sum(1 for p in self.actions[action].params if p.direction is None)
+            params, priority = split_priority(c, num_params)
+            table.entries.append(TableEntry([(k.kind, k.value, k.arg) for k in c.keys], action, params,
+                                            priority or 0))
+            self.compiled.pop(("table", table_name), None)
+            self.compiled.pop(("index", table_name), None)
+        return skipped
+
+    # Execution
+
+    def call_action(self, name, args, lvalues, state, active, frame=None):
+        """Run an action for the active rows; args are per-row arrays (None for out parameters)."""
+        action = self.actions[name]
+        if name not in self.compiled:
+            self.compiled[name] = Parser(self, tokenize(action.body)).block()
+        values, widths, aliases = {}, {}, {}
+        for param, arg, lvalue in zip(action.params, args, lvalues):
+            if param.direction in ("out", "inout"):
+                aliases[param.name] = frame.aliases.get(lvalue, lvalue) if frame else lvalue
+            else:
+                values[param.name] = masked(np.broadcast_to(np.asarray(arg, dtype=np.int64), (state.rows,)),
+                                            param.width)
+                widths[param.name] = param.width
+        self.compiled[name](state, Frame(values, widths, aliases), active)
+
+    def table_actions(self, name):
+        """Per action of the table's entries and default (last): (action, entry rows, argument matrix)."""
+        key = ("table", name)
+        if key not in self.compiled:
+            table = self.tables[name]
+            calls = [(e.action, e.args) for e in table.entries] + [table.default]
+            groups = []
+            for action in dict.fromkeys(a for a, _ in calls):
+                num_params = sum(1 for p in self.actions[action].params if p.direction is None)
+                rows = np.array([a == action for a, _ in calls])
+                args = np.zeros((len(calls), num_params), dtype=np.int64)
+                for i, (a, values) in enumerate(calls):
+                    if a == action:
+                        if len(values) != num_params:
+                            raise EngineError(f"{name}: {action} takes {num_params} parameters, got {values}")
+                        args[i] = values
+                groups.append((action, rows, args))
+            self.compiled[key] = groups
+        return self.compiled[key]
+
+    def apply_table(self, name, state, active):
+        table = self.tables[name]
+        keys = [expression(state, Frame()) for expression, _ in table.keys]
+        keys = [(np.broadcast_to(value, (state.rows,)), width) for value, width in keys]
+        index_key = ("index", name)
+        if index_key not in self.compiled:
+            self.compiled[index_key] = table_index(table, [width for _, width in keys])
+        # -1 (a miss) indexes the default, the last row
+        matched = match_entries(table, keys, active, self.compiled[index_key])
+        for action, entry_rows, args in self.table_actions(name):
+            rows = active & entry_rows[matched]
+            if not rows.any():
+                continue
+            data = iter(args[matched].T)
+            bindings = iter(table.actions.get(action, []))
+            call_args, lvalues = [], []
+            for param in self.actions[action].params:
+                out = param.direction in ("out", "inout")
+                call_args.append(None if out else next(data))
+                lvalues.append(next(bindings) if out else None)
+            self.call_action(action, call_args, lvalues, state, rows)
+
+    def inference_block(self):
+        if "inference" in self.compiled:
+            return self.compiled["inference"]
+        m = re.search(r"\bif\s*\(\s*runInference\s*==\s*1\s*\)\s*\{", self.body)
+        if not m:
+            raise EngineError("no `if (runInference == 1)` block in the ingress control")
+        block, _ = braced(self.body, m.end() - 1)
+        self.compiled["inference"] = Parser(self, tokenize(block)).block()
+        return self.compiled["inference"]
+
+    def run(self, planter):
+        """Alert header fields for each row of Planter header fields ({'feature0': array, ...})."""
+        rows = len(next(iter(planter.values())))
+        state = State(rows, self.widths)
+        for field, values in planter.items():
+            state.write(f"hdr.Planter.{field}", np.asarray(values, dtype=np.int64), np.ones(rows, dtype=bool))
+        state.valid.update({"hdr.ethernet": True, "hdr.Planter": True})
+        everyone = np.ones(rows, dtype=bool)
+        self.call_action("prepare_planter_feats", [], [], state, everyone)
+        self.inference_block()(state, Frame(), everyone)
+        return {name.split(".")[-1]: state.read(name)[0] for name in self.widths if name.startswith("hdr.Alert.")}
+
+
+def key_bounds(key, width):
+    """(mask, low, high) of an entry's key: a value matches when low <= value & mask <= high."""
+    kind, a, b = key
+    if kind == EXACT:
+        return -1, a, a
+    if kind == TERNARY:
+        return b, a & b, a & b
+    if kind == RANGE:
+        return -1, a, b
+    if kind == LPM:
+        mask = -1 << min((width or 64) - b, 63)
+        return mask, a & mask, a & mask
+    raise EngineError(f"unsupported match kind {kind}")
+
+
+def table_index(table, widths):
+    """How match_entries() looks up the table's entries.
+
+    ("exact", sorted packed keys, index of the first entry with each key) when
+    every key is exact and they pack into an int64; otherwise ("ordered", entry
+    indexes in BMv2's match order, key_bounds() arrays (masks, lows, highs) per
+    key). Const entries may mix kinds on one key (`_`, a plain value), which the
+    bounds express alike.
+    """
+    entries = table.entries
+    kinds = {kind for _, kind in table.keys}
+    if kinds == {EXACT} and all(widths) and sum(widths) <= MAX_PACKED_KEY_BITS:
+        entry_keys = np.zeros(len(entries), dtype=np.int64)
+        for i, width in enumerate(widths):
+            entry_keys = (entry_keys << width) | np.array([e.keys[i][1] & ((1 << width) - 1) for e in entries],
+                                                          dtype=np.int64)
+        # duplicate keys: the CLI rejects the later entry, so keep the first
+        unique, first = np.unique(entry_keys, return_index=True)
+        return "exact", unique, first
+    if LPM in kinds:
+        lpm = [i for i, (_, kind) in enumerate(table.keys) if kind == LPM][0]
+        order = sorted(range(len(entries)), key=lambda i: -entries[i].keys[lpm][2])
+    else:
+        order = sorted(range(len(entries)), key=lambda i: entries[i].priority or 0)
+    columns = []
+    for k, width in enumerate(widths):
+        bounds = [key_bounds(entries[i].keys[k], width) for i in order]
+        columns.append(tuple(np.array(column, dtype=np.int64) for column in zip(*bounds)))
+    return "ordered", np.array(order, dtype=np.int64), columns
+
+
+def match_entries(table, keys, active, index=None):
+    """Index of the entry each row matches (-1 on a miss), following BMv2's match order.
+
+    index is the table's table_index(), if already built.
+    """
+    matched = np.full(len(active), -1, dtype=np.int64)
+    if not table.entries:
+        return matched
+    if index is None:
+        index = table_index(table, [width for _, width in keys])
+    if index[0] == "exact":
+        _, unique, first = index
+        packed = np.zeros(len(active), dtype=np.int64)
+        for value, width in keys:
+            packed = (packed << width) | value
+        position = np.clip(np.searchsorted(unique, packed), 0, len(unique) - 1)
+        return np.where(active & (unique[position] == packed), first[position], -1)
+    # All entries against a chunk of rows at once; the first hit in match order wins
+    _, order, columns = index
+    rows = np.flatnonzero(active)
+    step = max(1, MAX_MATCH_CELLS // len(order))
+    for start in range(0, len(rows), step):
+        chunk = rows[start:start + step]
+        hits = np.ones((len(chunk), len(order)), dtype=bool)
+        for (mask, low, high), (value, _) in zip(columns, keys):
+            masked_value = value[chunk, None] & mask
+            hits &= (masked_value >= low) & (masked_value <= high)
+        first = hits.argmax(axis=1)
+        found = hits[np.arange(len(chunk)), first]
+        matched[chunk[found]] = order[first[found]]
+    return matched
+
+
+# Variants and data files
+
+def variant_program(variant_dir, defines=None, table_files=None):
+    """Program of a variant directory with its table entries; returns (program, {table not in it: entries})."""
+    for name in P4_FILES:
+        path = os.path.join(variant_dir, name)
+        if os.path.exists(path):
+            break
+    else:
+        raise EngineError(f"no {' or '.join(P4_FILES)} in {variant_dir}")
+    with open(path) as f:
+        program = Program(f.read(), defines)
+    if table_files is None:
+        table_files = sorted(glob.glob(os.path.join(variant_dir, "tables", "*.txt")))
+    skipped = {}
+    for table_file in table_files:
+        for table, count in program.add_commands(read_commands(table_file)).items():
+            skipped[table] = skipped.get(table, 0) + count
+    return program, skipped
+
+
+def read_rows(path):
+    """(Planter fields {featureN/patient_id: array}, columns {name: list}, rows skipped for missing values)."""
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    complete = [r for r in rows if all((r.get(col) or '').strip() for col in SENSOR_COLUMNS)]
+    features = {}
+    for i, col in enumerate(SENSOR_COLUMNS):
+        # int(value) as the simulators send it (temperature x10 truncated, e.g. 34.3 -> 342)
+        features[f"feature{i}"] = np.array([int(float(r[col]) * COLUMN_SCALE.get(col, 1)) for r in complete],
+                                           dtype=np.int64)
+    features["patient_id"] = np.array([int(r['patient_id']) for r in complete], dtype=np.int64)
+    others = {name: [r[name] for r in complete] for name in (rows[0].keys() if rows else [])}
+    return features, others, len(rows) - len(complete)
+
+
+def summarize(path, outputs, others, seconds):
+    print(f"{path}: {len(next(iter(outputs.values()), []))} windows in {seconds:.2f} s")
+    conditions = np.array([int(float(c)) if c else -1 for c in others.get('condition', [])], dtype=np.int64)
+    for field, values in outputs.items():
+        if field in LABEL_FIELDS and len(conditions):
+            positive = LABEL_FIELDS[field]
+            rows = (conditions == 0) | (conditions == positive)
+            if not rows.any():
+                continue
+            truth, predicted = conditions[rows] == positive, values[rows] == 1
+            tp, fp = int((truth & predicted).sum()), int((~truth & predicted).sum())
+            fn, tn = int((truth & ~predicted).sum()), int((~truth & ~predicted).sum())
+            print(f"  {field} ({CONDITION_NAMES[positive]}): accuracy {(tp + tn) / rows.sum():.4f} "
+                  f"TP {tp} FP {fp} FN {fn} TN {tn}")
+        elif field == 'news2Score' and others.get('news2_score'):
+            expected = np.array([int(float(s)) for s in others['news2_score']], dtype=np.int64)
+            print(f"  news2Score: equal to the CSV news2_score for {int((values == expected).sum())}/{len(values)}")
+        elif field == 'news2Alert':
+            levels = np.bincount(values, minlength=3)
+            print(f"  news2Alert: " + ", ".join(f"level {i}: {n}" for i, n in enumerate(levels) if n))
+
+
+def write_outputs(path, outputs, others):
+    """One line per window: the CSV timestamp and the Alert fields (its timestamp is the switch clock, left out)."""
+    fields = [field for field in outputs if field != 'timestamp']
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', *fields])
+        for i, timestamp in enumerate(others.get('timestamp', [])):
+            writer.writerow([timestamp, *(int(outputs[field][i]) for field in fields)])
+
+
+def parse_define(text):
+    name, _, value = text.partition("=")
+    return name, value or "1"
+
+
+def main(args):
+    try:
+        program, skipped = variant_program(args.variant, dict(map(parse_define, args.define)), args.tables)
+        for table, count in skipped.items():
+            print(f"Note: {count} entries of {table}, not a table of this program, ignored")
+        if args.output and len(args.data) > 1:
+            print("Error: --output takes a single data file")
+            return 1
+        for path in args.data:
+            features, others, incomplete = read_rows(path)
+            if incomplete:
+                print(f"Note: {path}: {incomplete} rows with missing values skipped")
+            start = time.perf_counter()
+            outputs = program.run(features) if len(features["feature0"]) else {}
+            summarize(path, outputs, others, time.perf_counter() - start)
+            if args.output:
+                os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+                write_outputs(args.output, outputs, others)
+                print(f"Wrote {args.output}")
+    except (OSError, EngineError, TableCommandError, MinimizerError) as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the switch's inference pipeline over CSV data files")
+    parser.add_argument("data", nargs="+", help="CSV files with the columns of data/*.csv")
+    parser.add_argument("--variant", default=".", help="Variant directory with the P4 program and tables/")
+    parser.add_argument("--tables", nargs="+", help="table_add files instead of <variant>/tables/*.txt")
+    parser.add_argument("-D", "--define", action="append", default=[], metavar="NAME[=VALUE]",
+                        help="Preprocessor define, as passed to p4c (e.g. -D FEATURE_MATCH=range)")
+    parser.add_argument("--output", help="Write the Alert fields of each row to this CSV")
+    sys.exit(main(parser.parse_args()))
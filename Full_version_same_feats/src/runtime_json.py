@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Convert the tables/*.txt table_add files into a runtime JSON file.
+
+The output has the s1-runtime.json format read by the tutorials' run_exercise
+/ simple_controller, with table_entries filled in, so that the switch starts
+fully provisioned:
+
+    {"table": "SwitchIngress.lookup_feature0_sep",
+     "match": {"meta.temperature": [400, 1008]},
+     "action_name": "SwitchIngress.extract_feature0_sep",
+     "action_params": {"tree": 18},
+     "priority": 16}
+
+Names come from the p4info. Priorities are inverted as in table_loader, and
+ternary keys with a zero mask are left out. Results are cached in
+build/runtime-cache/ under a hash of the table files, the p4info and the
+template, so an unchanged configuration is not converted again.
+
+Example (run by `make`):
+    python3 ./src/runtime_json.py --p4info ./build/PatientMonitoring.p4.p4info.txtpb \
+        --template s1-runtime.json --output build/s1-runtime.json \
+        ./tables/s1-commands-sep.txt ./tables/s1-commands-hf.txt
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+from table_commands import LPM, RANGE, TERNARY, TableCommandError, read_commands, split_priority
+from table_loader import MATCH_KINDS, P4InfoIndex, load_p4info, priority_bases
+
+FORMAT_VERSION = b"runtime-json-1"  # bump when the output format changes
+
+
+def json_match(kind, bitwidth, key):
+    """Match value in simple_controller format, or None for a don't-care key."""
+    full = (1 << bitwidth) - 1
+    if kind == TERNARY:
+        mask = key.arg & full
+        return [key.value & mask, mask] if mask else None
+    if kind == RANGE:
+        return None if key.value == 0 and key.arg == full else [key.value, key.arg]
+    if kind == LPM:
+        return [key.value, key.arg] if key.arg else None
+    return key.value
+
+
+def convert_command(command, index, priority_base=None):
+    table = index.table(command)
+    action = index.action(command)
+    if len(command.keys) != len(table.match_fields):
+        raise TableCommandError(command.source, command.lineno,
+                                f"{table.preamble.name} has {len(table.match_fields)} keys, got {len(command.keys)}")
+    params, cli_priority = split_priority(command, len(action.params))
+
+    match = {}
+    for field, key in zip(table.match_fields, command.keys):
+        kind = MATCH_KINDS.get(field.match_type)
+        if kind != key.kind:
+            raise TableCommandError(command.source, command.lineno,
+                                    f"key {field.name} is {kind}, got a {key.kind} value")
+        value = json_match(kind, field.bitwidth, key)
+        if value is not None:
+            match[field.name] = value
+
+    entry = {
+        "table": table.preamble.name,
+        "match": match,
+        "action_name": action.preamble.name,
+        "action_params": {param.name: value for param, value in zip(action.params, params)},
+    }
+    if cli_priority is not None:
+        entry["priority"] = priority_base - cli_priority
+    return entry
+
+
+def convert(paths, index):
+    """Return the runtime JSON table_entries for the table_add files, in order."""
+    commands = [c for path in paths for c in read_commands(path)]
+    bases = priority_bases(commands)
+    return [convert_command(c, index, bases.get(c.table)) for c in commands]
+
+
+def cache_key(paths, p4info_path, template_path):
+    digest = hashlib.sha256(FORMAT_VERSION)
+    for path in [p4info_path, template_path, *paths]:
+        with open(path, "rb") as f:
+            data = f.read()
+        digest.update(os.path.basename(path).encode() + b"\0" + len(data).to_bytes(8, "big") + data)
+    return digest.hexdigest()
+
+
+def main(args):
+    start = time.perf_counter()
+    key = cache_key(args.tables, args.p4info, args.template)
+    cached = os.path.join(args.cache_dir, f"{key}.json")
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if os.path.exists(cached) and not args.force:
+        shutil.copyfile(cached, args.output)
+        print(f"{args.output}: up to date (cache {key[:12]})")
+        return 0
+
+    with open(args.template) as f:
+        runtime = json.load(f)
+    try:
+        runtime["table_entries"] = convert(args.tables, P4InfoIndex(load_p4info(args.p4info)))
+    except (OSError, TableCommandError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    os.makedirs(args.cache_dir, exist_ok=True)
+    tmp = f"{cached}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(runtime, f)
+    os.replace(tmp, cached)
+    shutil.copyfile(cached, args.output)
+    print(f"{args.output}: {len(runtime['table_entries'])} table entries from {len(args.tables)} files "
+          f"in {time.perf_counter() - start:.2f} s (cache {key[:12]})")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert table_add files into a runtime JSON with table_entries")
+    parser.add_argument("tables", nargs="+", help="table_add command files, in load order")
+    parser.add_argument("--p4info", type=str, required=True, help="Path to the p4info file in text pb format")
+    parser.add_argument("--template", default="s1-runtime.json",
+                        help="Runtime JSON providing target, p4info and bmv2_json")
+    parser.add_argument("--output", default="build/s1-runtime.json", help="Runtime JSON to write")
+    parser.add_argument("--cache-dir", default="build/runtime-cache", help="Directory of cached conversions")
+    parser.add_argument("--force", action="store_true", help="Convert even if a cached result exists")
+
+    args = parser.parse_args()
+    if not os.path.exists(args.p4info):
+        print(f"p4info file {args.p4info} not found!")
+        sys.exit(1)
+    sys.exit(main(args))
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Struct-based builder for the VitalsBundle frames sensors send to the switch.
+
+A VitalsBundle (etherType 0x1237) carries several vitals of one patient in
+one packet, as sent by a bedside hub: the patient ID, a timestamp, a presence
+mask whose bit i marks sensor i as present, and ten 16-bit values in sensor
+ID order. The simulators, the data-plane emulator and the benchmarks all
+build bundles with build_bundle_frame().
+"""
+
+import struct
+
+# ---------------------------
+# Wire layout (must match VitalsBundle_h in PatientMonitoring.p4)
+# ---------------------------
+ETHERTYPE_BUNDLE = 0x1237
+NUM_VALUES = 10
+SENSOR_DST = bytes.fromhex("000400000000")
+SENSOR_SRC = bytes.fromhex("080027bcfcb5")
+
+ETHER = struct.Struct("!6s6sH")
+# patient_id, timestamp (48 bits as hi16/lo32), mask (bit i: value i is present), 10 values
+BUNDLE = struct.Struct("!IHIH10H")
+
+
+def build_bundle_frame(pid, readings, timestamp=0, dst=SENSOR_DST, src=SENSOR_SRC):
+    """VitalsBundle frame of readings, a {sensor_id: value} mapping of sensor IDs 0-9."""
+    values = [0] * NUM_VALUES
+    mask = 0
+    for sensor_id, value in readings.items():
+        values[sensor_id] = value
+        mask |= 1 << sensor_id
+    return (ETHER.pack(dst, src, ETHERTYPE_BUNDLE)
+            + BUNDLE.pack(pid, (timestamp >> 32) & 0xFFFF, timestamp & 0xFFFFFFFF, mask, *values))
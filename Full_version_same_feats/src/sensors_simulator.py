@@ -3,7 +3,14 @@ import time
 import random
 import threading
 import pandas as pd
-from scapy.all import Ether, sendp, get_if_list, Packet, IntField, BitField, ShortField, bind_layers
+import argparse
+from scapy.all import Ether, sendp, get_if_list, get_if_hwaddr, Packet, IntField, BitField, ShortField, bind_layers
+from sensor_frames import build_bundle_frame
+
+parser = argparse.ArgumentParser(description='Sensor simulator for sepsis monitoring, one patient at a time')
+parser.add_argument('--bundle', action='store_true',
+                    help='Send each window as one VitalsBundle packet (bedside hub) instead of one per sensor')
+args = parser.parse_args()
 
 # Define Sensor packet structure
 class Sensor(Packet):
@@ -15,7 +22,7 @@ class Sensor(Packet):
         ShortField("feature_value", 0)
     ]
 
-# Use EtherType 0x1235 for sensor packets
+# Use EtherType 0x1235 for sensor packets (VitalsBundle frames, 0x1237, come from sensor_frames)
 SENSOR_ETHERTYPE = 0x1235
 bind_layers(Ether, Sensor, type=SENSOR_ETHERTYPE)
 
@@ -69,6 +76,13 @@ def send_sensor_packet(patient_id, sensor_id, timestamp_val, feature_value):
     sendp(pkt, iface=send_iface, verbose=False)
     print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Sent sensor packet: patient_id={patient_id}, sensor_id={sensor_id}, value={feature_value}")
 
+# Function that sends the vitals of one window as a single VitalsBundle packet
+def send_bundle_packet(patient_id, timestamp_val, readings):
+    frame = build_bundle_frame(patient_id, readings, timestamp_val,
+                               src=bytes.fromhex(get_if_hwaddr(send_iface).replace(':', '')))
+    sendp(Ether(frame), iface=send_iface, verbose=False)
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Sent vitals bundle: patient_id={patient_id}, sensors={sorted(readings)}")
+
 # For each row of data (each window)
 # In some of windows, some sensors do not send their data as expected
 for idx, row in Test_Data.iterrows():
@@ -92,32 +106,39 @@ for idx, row in Test_Data.iterrows():
         sensors_to_skip = set(random.sample(range(5), num_to_skip))
         print(f"Sensors {sensors_to_skip} will be skipped in this window.")
 
-    threads = []
-    # For each sensor column, schedule sending a packet with randomized delay.
-    for sensor_id, col in enumerate(sensor_columns):
-        # Get the feature value as an int.
-        # Temperature (sensor id 0) is already multiplied by 10.
-        feature_value = int(row[col])
-        
-        # Check if this sensor should be skipped
-        if sensor_id in sensors_to_skip:
-            print(f"Sensor {sensor_id} for patient {patient_id} will not send a packet (skipped).")
-            continue
-        
-        # All non-skipped sensors get normal delay between 0-59 seconds
-        delay = random.uniform(0, 59)
-        
-        # Use a thread to sleep and then send the packet
-        def send_after_delay(delay=delay, sensor_id=sensor_id, feature_value=feature_value):
-            time.sleep(delay)
-            send_sensor_packet(patient_id, sensor_id, timestamp_val, feature_value)
-        t = threading.Thread(target=send_after_delay)
-        t.start()
-        threads.append(t)
-
-    # Wait for all sensor packets in this window to be sent (max delay is 90 sec)
-    for t in threads:
-        t.join()
+    if args.bundle:
+        # The hub collects the non-skipped sensors and sends them together after 0-59 seconds
+        readings = {sensor_id: int(row[col]) for sensor_id, col in enumerate(sensor_columns)
+                    if sensor_id not in sensors_to_skip}
+        time.sleep(random.uniform(0, 59))
+        send_bundle_packet(patient_id, timestamp_val, readings)
+    else:
+        threads = []
+        # For each sensor column, schedule sending a packet with randomized delay.
+        for sensor_id, col in enumerate(sensor_columns):
+            # Get the feature value as an int.
+            # Temperature (sensor id 0) is already multiplied by 10.
+            feature_value = int(row[col])
+
+            # Check if this sensor should be skipped
+            if sensor_id in sensors_to_skip:
+                print(f"Sensor {sensor_id} for patient {patient_id} will not send a packet (skipped).")
+                continue
+
+            # All non-skipped sensors get normal delay between 0-59 seconds
+            delay = random.uniform(0, 59)
+
+            # Use a thread to sleep and then send the packet
+            def send_after_delay(delay=delay, sensor_id=sensor_id, feature_value=feature_value):
+                time.sleep(delay)
+                send_sensor_packet(patient_id, sensor_id, timestamp_val, feature_value)
+            t = threading.Thread(target=send_after_delay)
+            t.start()
+            threads.append(t)
+
+        # Wait for all sensor packets in this window to be sent (max delay is 90 sec)
+        for t in threads:
+            t.join()
 
     # Wait until the full window+quiet time (90 secs) has elapsed before starting next window.
     # Since packet sending took some time already, wait the remainder.
@@ -5,12 +5,15 @@ import random
 import threading
 import pandas as pd
 import argparse
-from scapy.all import Ether, sendp, get_if_list, Packet, IntField, BitField, ShortField, bind_layers
+from scapy.all import Ether, sendp, get_if_list, get_if_hwaddr, Packet, IntField, BitField, ShortField, bind_layers
+from sensor_frames import build_bundle_frame
 
 # Add argument parser
 parser = argparse.ArgumentParser(description='Sensor simulator for sepsis monitoring')
 parser.add_argument('-n', '--num_patients', type=int, default=1,
                     help='Number of patients to simulate simultaneously (default: 1)')
+parser.add_argument('--bundle', action='store_true',
+                    help='Send each window as one VitalsBundle packet (bedside hub) instead of one per sensor')
 args = parser.parse_args()
 
 # Define Sensor packet structure
@@ -23,7 +26,7 @@ class Sensor(Packet):
         ShortField("feature_value", 0)
     ]
 
-# Use EtherType 0x1235 for sensor packets
+# Use EtherType 0x1235 for sensor packets (VitalsBundle frames, 0x1237, come from sensor_frames)
 SENSOR_ETHERTYPE = 0x1235
 bind_layers(Ether, Sensor, type=SENSOR_ETHERTYPE)
 
@@ -75,6 +78,12 @@ def send_sensor_packet(patient_id, sensor_id, timestamp_val, feature_value):
     sendp(pkt, iface=send_iface, verbose=False)
     print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Sent sensor packet: patient_id={patient_id}, sensor_id={sensor_id}, value={feature_value}")
 
+def send_bundle_packet(patient_id, timestamp_val, readings):
+    frame = build_bundle_frame(patient_id, readings, timestamp_val,
+                               src=bytes.fromhex(get_if_hwaddr(send_iface).replace(':', '')))
+    sendp(Ether(frame), iface=send_iface, verbose=False)
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Sent vitals bundle: patient_id={patient_id}, sensors={sorted(readings)}")
+
 def process_patient_window(patient_id, row, window_idx):
     timestamp_val = int(row['timestamp'])
     print(f"\nStarting window {window_idx+1} for patient {patient_id}")
@@ -94,28 +103,35 @@ def process_patient_window(patient_id, row, window_idx):
         sensors_to_skip = set(random.sample(range(5), num_to_skip))
         print(f"Patient {patient_id}: Sensors {sensors_to_skip} will be skipped in this window.")
 
-    threads = []
-    for sensor_id, col in enumerate(sensor_columns):
-        feature_value = int(row[col])
-        
-        # Check if this sensor should be skipped
-        if sensor_id in sensors_to_skip:
-            print(f"Patient {patient_id}: Sensor {sensor_id} will not send a packet (skipped).")
-            continue
-        
-        # All non-skipped sensors get normal delay between 0-59 seconds
-        delay = random.uniform(0, 59)
-
-        def send_after_delay(delay=delay, sensor_id=sensor_id, feature_value=feature_value):
-            time.sleep(delay)
-            send_sensor_packet(patient_id, sensor_id, timestamp_val, feature_value)
-        t = threading.Thread(target=send_after_delay)
-        t.start()
-        threads.append(t)
-
-    # Wait for all sensor packets in this window
-    for t in threads:
-        t.join()
+    if args.bundle:
+        # The hub collects the non-skipped sensors and sends them together after 0-59 seconds
+        readings = {sensor_id: int(row[col]) for sensor_id, col in enumerate(sensor_columns)
+                    if sensor_id not in sensors_to_skip}
+        time.sleep(random.uniform(0, 59))
+        send_bundle_packet(patient_id, timestamp_val, readings)
+    else:
+        threads = []
+        for sensor_id, col in enumerate(sensor_columns):
+            feature_value = int(row[col])
+
+            # Check if this sensor should be skipped
+            if sensor_id in sensors_to_skip:
+                print(f"Patient {patient_id}: Sensor {sensor_id} will not send a packet (skipped).")
+                continue
+
+            # All non-skipped sensors get normal delay between 0-59 seconds
+            delay = random.uniform(0, 59)
+
+            def send_after_delay(delay=delay, sensor_id=sensor_id, feature_value=feature_value):
+                time.sleep(delay)
+                send_sensor_packet(patient_id, sensor_id, timestamp_val, feature_value)
+            t = threading.Thread(target=send_after_delay)
+            t.start()
+            threads.append(t)
+
+        # Wait for all sensor packets in this window
+        for t in threads:
+            t.join()
 
     # Wait remainder of window time
     window_total = 90  # seconds per window
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Parser for the simple_switch_CLI `table_add` files in tables/.
+
+    table_add <table> <action> <key> ... => <param> ... [<priority>]
+
+Keys are exact (`5`), ternary (`400&&&1008`), range (`10->20`) or LPM
+(`10/8`); numbers may be decimal or 0x-prefixed hex. For ternary and range
+tables the CLI takes the entry priority as the last token after `=>` and a
+lower number means a higher priority. Whether that trailing token is a
+priority is only known from the table's match kinds, so ParsedCommand keeps
+every value after `=>`, parsed to an int, in params and split_priority() does
+the split once the caller knows how many parameters the action takes.
+"""
+
+from collections import namedtuple
+
+EXACT = "exact"
+TERNARY = "ternary"
+RANGE = "range"
+LPM = "lpm"
+
+Key = namedtuple("Key", ["kind", "value", "arg"])  # arg: mask (ternary), high (range), prefix length (lpm)
+ParsedCommand = namedtuple("ParsedCommand", ["table", "action", "keys", "params", "source", "lineno"])
+
+
+class TableCommandError(ValueError):
+    def __init__(self, source, lineno, message):
+        super().__init__(f"{source}:{lineno}: {message}")
+
+
+def parse_number(token):
+    return int(token, 0)
+
+
+def parse_key(token):
+    if "&&&" in token:
+        value, mask = token.split("&&&")
+        return Key(TERNARY, parse_number(value), parse_number(mask))
+    if "->" in token:
+        low, high = token.split("->")
+        return Key(RANGE, parse_number(low), parse_number(high))
+    if "/" in token:
+        value, prefix_len = token.split("/")
+        return Key(LPM, parse_number(value), int(prefix_len))
+    return Key(EXACT, parse_number(token), None)
+
+
+def parse_line(line, source="<string>", lineno=0):
+    """Parse one table_add line; returns None for blank lines and comments."""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    tokens = line.split()
+    if tokens[0] != "table_add":
+        raise TableCommandError(source, lineno, f"unsupported command {tokens[0]!r}")
+    if "=>" not in tokens or tokens.index("=>") < 3:
+        raise TableCommandError(source, lineno, "expected 'table_add <table> <action> <keys> => <params>'")
+    arrow = tokens.index("=>")
+    try:
+        keys = [parse_key(t) for t in tokens[3:arrow]]
+        params = [parse_number(t) for t in tokens[arrow + 1:]]
+    except ValueError as e:
+        raise TableCommandError(source, lineno, str(e)) from None
+    return ParsedCommand(tokens[1], tokens[2], keys, params, source, lineno)
+
+
+def format_key(key):
+    if key.kind == TERNARY:
+        return f"{key.value}&&&{key.arg}"
+    if key.kind == RANGE:
+        return f"{key.value}->{key.arg}"
+    if key.kind == LPM:
+        return f"{key.value}/{key.arg}"
+    return str(key.value)
+
+
+def format_command(command):
+    """The table_add line of a ParsedCommand (the inverse of parse_line)."""
+    tokens = ["table_add", command.table, command.action, *map(format_key, command.keys), "=>", *map(str, command.params)]
+    return " ".join(tokens)
+
+
+def read_commands(path):
+    """Yield the ParsedCommands of a table_add file, in file order."""
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            command = parse_line(line, path, lineno)
+            if command is not None:
+                yield command
+
+
+def needs_priority(keys):
+    return any(k.kind in (TERNARY, RANGE) for k in keys)
+
+
+def split_priority(command, num_params):
+    """Return (action params, CLI priority or None) given the action's parameter count."""
+    params = command.params
+    if needs_priority(command.keys):
+        if len(params) != num_params + 1:
+            raise TableCommandError(command.source, command.lineno,
+                                    f"expected {num_params} action parameters and a priority, got {len(params)} values")
+        return params[:-1], params[-1]
+    if len(params) != num_params:
+        raise TableCommandError(command.source, command.lineno,
+                                f"expected {num_params} action parameters, got {len(params)}")
+    return params, None
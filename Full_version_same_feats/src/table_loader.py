@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Bulk P4Runtime table loader.
+
+Replaces piping the tables/*.txt files through simple_switch_CLI (one Thrift
+RPC per line): the table_add files are parsed once, encoded against the
+p4info, and written as batched P4Runtime WriteRequests from a thread pool.
+Every Update is serialized once up front (from cached per-key and per-action
+fragments); a WriteRequest is then just the request header followed by the
+batch's pre-serialized updates, so the writer threads do no protobuf work.
+
+CLI priorities (lower = more important) are inverted per table into
+P4Runtime priorities (higher = more important), and ternary keys with a zero
+mask are left out, which is how P4Runtime expresses a don't-care match.
+
+Example:
+    python3 ./src/table_loader.py --p4info ./build/PatientMonitoring.p4.p4info.txtpb \
+        ./tables/s1-commands-sep.txt ./tables/s1-commands-hf.txt
+"""
+
+import argparse
+import os
+import queue
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import grpc
+from google.protobuf import text_format
+from p4.config.v1 import p4info_pb2
+from p4.v1 import p4runtime_pb2, p4runtime_pb2_grpc
+
+from table_commands import (EXACT, LPM, RANGE, TERNARY, TableCommandError, needs_priority, read_commands,
+                            split_priority)
+
+MATCH_KINDS = {
+    p4info_pb2.MatchField.EXACT: EXACT,
+    p4info_pb2.MatchField.TERNARY: TERNARY,
+    p4info_pb2.MatchField.RANGE: RANGE,
+    p4info_pb2.MatchField.LPM: LPM,
+}
+
+
+def load_p4info(path):
+    p4info = p4info_pb2.P4Info()
+    with open(path) as f:
+        text_format.Merge(f.read(), p4info)
+    return p4info
+
+
+class P4InfoIndex:
+    """Tables and actions of a p4info, by full name and by alias."""
+
+    def __init__(self, p4info):
+        self.tables = {}
+        self.actions = {}
+        for table in p4info.tables:
+            self.tables[table.preamble.name] = self.tables[table.preamble.alias] = table
+        for action in p4info.actions:
+            self.actions[action.preamble.name] = self.actions[action.preamble.alias] = action
+
+    def table(self, command):
+        try:
+            return self.tables[command.table]
+        except KeyError:
+            raise TableCommandError(command.source, command.lineno, f"unknown table {command.table!r}") from None
+
+    def action(self, command):
+        try:
+            return self.actions[command.action]
+        except KeyError:
+            raise TableCommandError(command.source, command.lineno, f"unknown action {command.action!r}") from None
+
+
+def encode_value(value, bitwidth):
+    if not 0 <= value < 1 << bitwidth:
+        raise ValueError(f"{value} does not fit in {bitwidth} bits")
+    return value.to_bytes((bitwidth + 7) // 8, "big")
+
+
+def priority_bases(commands):
+    """Per table, one more than the largest CLI priority, so base - priority is >= 1."""
+    bases = {}
+    for command in commands:
+        if needs_priority(command.keys) and command.params:
+            bases[command.table] = max(bases.get(command.table, 1), command.params[-1] + 1)
+    return bases
+
+
+# Serialized Updates are assembled from cached fragments, each a serialized Update
+# holding one piece of the table entry: protobuf parsers merge concatenated
+# messages field by field (appending repeated fields such as the match list), and
+# the table files repeat the same key values and action parameters thousands of times.
+
+@lru_cache(maxsize=None)
+def header_fragment(update_type, table_id, priority):
+    update = p4runtime_pb2.Update()
+    update.type = update_type
+    update.entity.table_entry.table_id = table_id
+    update.entity.table_entry.priority = priority
+    return update.SerializeToString()
+
+
+@lru_cache(maxsize=None)
+def match_fragment(field_id, kind, bitwidth, value, arg):
+    """Serialized Update with a single FieldMatch; empty for a don't-care key."""
+    full = (1 << bitwidth) - 1
+    update = p4runtime_pb2.Update()
+    if kind == TERNARY:
+        mask = arg & full
+        if mask == 0:
+            return b""
+        match = update.entity.table_entry.match.add(field_id=field_id)
+        match.ternary.value = encode_value(value & mask, bitwidth)
+        match.ternary.mask = encode_value(mask, bitwidth)
+    elif kind == RANGE:
+        if value == 0 and arg == full:
+            return b""
+        match = update.entity.table_entry.match.add(field_id=field_id)
+        match.range.low = encode_value(value, bitwidth)
+        match.range.high = encode_value(arg, bitwidth)
+    elif kind == LPM:
+        if arg == 0:
+            return b""
+        match = update.entity.table_entry.match.add(field_id=field_id)
+        match.lpm.value = encode_value(value & (full ^ ((1 << (bitwidth - arg)) - 1)), bitwidth)
+        match.lpm.prefix_len = arg
+    else:
+        match = update.entity.table_entry.match.add(field_id=field_id)
+        match.exact.value = encode_value(value, bitwidth)
+    return update.SerializeToString()
+
+
+@lru_cache(maxsize=None)
+def action_fragment(action_id, params):
+    """params: tuple of (param_id, bitwidth, value)."""
+    update = p4runtime_pb2.Update()
+    action = update.entity.table_entry.action.action
+    action.action_id = action_id
+    for param_id, bitwidth, value in params:
+        action.params.add(param_id=param_id, value=encode_value(value, bitwidth))
+    return update.SerializeToString()
+
+
+def encode_update(command, index, priority_base=None, update_type=p4runtime_pb2.Update.INSERT):
+    """Return the serialized P4Runtime Update for a ParsedCommand."""
+    table = index.table(command)
+    action = index.action(command)
+    if len(command.keys) != len(table.match_fields):
+        raise TableCommandError(command.source, command.lineno,
+                                f"{table.preamble.name} has {len(table.match_fields)} keys, got {len(command.keys)}")
+    params, cli_priority = split_priority(command, len(action.params))
+    priority = priority_base - cli_priority if cli_priority is not None else 0
+
+    try:
+        fragments = [header_fragment(update_type, table.preamble.id, priority)]
+        for field, key in zip(table.match_fields, command.keys):
+            kind = MATCH_KINDS.get(field.match_type)
+            if kind != key.kind:
+                raise ValueError(f"key {field.name} is {kind}, got a {key.kind} value")
+            fragments.append(match_fragment(field.id, kind, field.bitwidth, key.value, key.arg))
+        fragments.append(action_fragment(action.preamble.id, tuple(
+            (param.id, param.bitwidth, value) for param, value in zip(action.params, params))))
+    except ValueError as e:
+        raise TableCommandError(command.source, command.lineno, str(e)) from None
+    return b"".join(fragments)
+
+
+def encode_entry(command, index, priority_base=None):
+    """Encode a ParsedCommand as a P4Runtime TableEntry message."""
+    return p4runtime_pb2.Update.FromString(encode_update(command, index, priority_base)).entity.table_entry
+
+
+def encode_files(paths, index):
+    """Parse every table_add line of paths and return the serialized Updates, in order."""
+    commands = [c for path in paths for c in read_commands(path)]
+    bases = priority_bases(commands)
+    return [encode_update(c, index, bases.get(c.table)) for c in commands]
+
+
+def varint(n):
+    out = bytearray()
+    while n > 0x7F:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+# WriteRequest.updates, length-delimited (wire type 2)
+UPDATES_TAG = varint(p4runtime_pb2.WriteRequest.DESCRIPTOR.fields_by_name["updates"].number << 3 | 2)
+
+
+def write_request(header, updates):
+    """Serialized WriteRequest: header (device/election IDs) plus pre-serialized Updates."""
+    return header + b"".join(UPDATES_TAG + varint(len(u)) + u for u in updates)
+
+
+def batched(entries, batch_size):
+    for first in range(0, len(entries), batch_size):
+        yield entries[first:first + batch_size]
+
+
+LoadStats = namedtuple("LoadStats", ["entries", "batches", "failed", "duration_s", "first_error"])
+
+
+def format_rate(count, seconds):
+    return f"{count / seconds:.0f}/s" if seconds > 0 else "n/a"
+
+
+def become_primary(stub, device_id, election_id):
+    """Open a StreamChannel and win arbitration; returns the request queue (put None to close)."""
+    requests = queue.Queue()
+    arbitration = p4runtime_pb2.StreamMessageRequest()
+    arbitration.arbitration.device_id = device_id
+    arbitration.arbitration.election_id.low = election_id
+    requests.put(arbitration)
+    responses = stub.StreamChannel(iter(requests.get, None))
+    for response in responses:
+        if response.WhichOneof("update") == "arbitration":
+            if response.arbitration.status.code != 0:  # google.rpc.Code.OK
+                requests.put(None)
+                raise RuntimeError(f"Not the primary controller: {response.arbitration.status.message}")
+            return requests
+    raise RuntimeError("Stream channel closed before arbitration")
+
+
+class TableLoader:
+    """Writes serialized Updates in batches of batch_size from `workers` threads."""
+
+    def __init__(self, channel, device_id=0, election_id=1, batch_size=1000, workers=4):
+        # Write with a pass-through serializer so pre-serialized requests are sent as they are
+        self.write = channel.unary_unary("/p4.v1.P4Runtime/Write",
+                                         request_serializer=bytes,
+                                         response_deserializer=p4runtime_pb2.WriteResponse.FromString)
+        header = p4runtime_pb2.WriteRequest()
+        header.device_id = device_id
+        header.election_id.low = election_id
+        self.header = header.SerializeToString()
+        self.batch_size = batch_size
+        self.workers = workers
+
+    def write_batch(self, entries):
+        try:
+            self.write(write_request(self.header, entries))
+        except grpc.RpcError as e:
+            # With the default CONTINUE_ON_ERROR atomicity the other updates of the batch are applied
+            return len(entries), f"{e.code().name}: {e.details()}"
+        return 0, None
+
+    def load(self, entries):
+        start = time.perf_counter()
+        batches = list(batched(entries, self.batch_size))
+        failed = 0
+        first_error = None
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for batch_failed, error in pool.map(self.write_batch, batches):
+                failed += batch_failed
+                first_error = first_error or error
+        return LoadStats(len(entries), len(batches), failed, time.perf_counter() - start, first_error)
+
+
+def main(args):
+    start = time.perf_counter()
+    index = P4InfoIndex(load_p4info(args.p4info))
+    try:
+        entries = encode_files(args.tables, index)
+    except (OSError, TableCommandError) as e:
+        print(f"Error: {e}")
+        return 1
+    encode_time = time.perf_counter() - start
+    print(f"Encoded {len(entries)} entries from {len(args.tables)} files in {encode_time:.2f} s "
+          f"({format_rate(len(entries), encode_time)})")
+    if args.dry_run:
+        return 0
+
+    with grpc.insecure_channel(args.address) as channel:
+        stub = p4runtime_pb2_grpc.P4RuntimeStub(channel)
+        try:
+            stream = become_primary(stub, args.device_id, args.election_id)
+        except grpc.RpcError as e:
+            print(f"Cannot reach {args.address}: {e.code().name} {e.details()}")
+            return 1
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            return 1
+        try:
+            loader = TableLoader(channel, args.device_id, args.election_id, args.batch_size, args.workers)
+            stats = loader.load(entries)
+        finally:
+            stream.put(None)
+
+    print(f"Wrote {stats.entries - stats.failed}/{stats.entries} entries in {stats.batches} batches "
+          f"in {stats.duration_s:.2f} s ({format_rate(stats.entries, stats.duration_s)}); "
+          f"total bring-up {time.perf_counter() - start:.2f} s")
+    if stats.failed:
+        print(f"{stats.failed} entries in failed batches, first error: {stats.first_error}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load simple_switch_CLI table_add files over P4Runtime")
+    parser.add_argument("tables", nargs="+", help="table_add command files, loaded in order")
+    parser.add_argument("--p4info", type=str, required=True, help="Path to the p4info file in text pb format")
+    parser.add_argument("--address", default="127.0.0.1:50051", help="P4Runtime server address")
+    parser.add_argument("--device-id", type=int, default=0)
+    parser.add_argument("--election-id", type=int, default=1,
+                        help="Election ID for arbitration; the loader must disconnect before a controller "
+                             "with the same ID connects")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Table entries per WriteRequest")
+    parser.add_argument("--workers", type=int, default=4, help="WriteRequests in flight")
+    parser.add_argument("--dry-run", action="store_true", help="Only parse and encode, do not connect")
+
+    args = parser.parse_args()
+    if not os.path.exists(args.p4info):
+        print(f"p4info file {args.p4info} not found!")
+        sys.exit(1)
+    sys.exit(main(args))
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Offline minimizer for the tables/*.txt table_add files.
+
+BMv2 looks a ternary key up by scanning the table's entries, so the naive
+prefix expansions of the feature thresholds (16-35 entries per
+lookup_featureN table) cost one comparison per entry for every packet. For
+each single-key ternary table the minimizer evaluates the table on every value
+of its key (first match in CLI priority order, file order on ties), then
+rebuilds the smallest equivalent set of prefix entries with the ORTC
+construction (Draves et al., "Constructing optimal IP routing tables"): the
+longest prefix gets the highest priority, so entries are emitted in
+decreasing prefix length.
+
+Exact tables are hash lookups in BMv2, so only dead entries are removed from
+them: entries with a key that no packet can produce. Given the P4 program
+(--p4), the values each metadata field can take are collected from the actions
+writing it and the table entries feeding those actions (fields start at 0);
+an exact key slice outside that set never matches. The leaf and decision
+tables keep their exact match kinds, since merging their entries would need
+ternary keys and the linear scan that comes with them.
+
+With --feature-match range the feature tables are generated with one range
+entry per interval of constant result instead, and with --feature-match lpm
+with the ORTC prefixes as LPM entries (BMv2 resolves LPM with a trie, without
+a scan); the P4 program must then be built with the same FEATURE_MATCH. The
+ternary masks only cover the low key bits, so a ternary table repeats itself
+above 2**width (a temperature of 1024 reads as 0); range and LPM entries only
+cover [0, 2**width) and miss above it.
+
+Every table is checked before anything is written: feature tables over all
+values of the key bits the original masks cover, exact tables over the
+product of their reachable key values.
+
+Example:
+    python3 ./src/table_minimizer.py --p4 PatientMonitoring.p4 --output-dir build/tables \
+        ./tables/s1-commands-sep.txt ./tables/s1-commands-hf.txt
+"""
+
+import argparse
+import itertools
+import os
+import re
+import sys
+import time
+from collections import defaultdict, namedtuple
+
+from table_commands import (EXACT, LPM, RANGE, TERNARY, Key, ParsedCommand, TableCommandError, format_command,
+                            needs_priority, read_commands)
+
+MAX_TERNARY_BITS = 20  # key bits evaluated exhaustively; wider tables are left as they are
+MAX_EXACT_PRODUCT = 2_000_000  # reachable key combinations enumerated by the exact-table check
+MISS = None  # result of a lookup that matches no entry (or a NoAction entry)
+
+TableReport = namedtuple("TableReport", ["table", "kind", "before", "after", "lookup_ns_before", "lookup_ns_after",
+                                         "note"])
+P4Table = namedtuple("P4Table", ["keys", "actions", "default"])  # keys: (field, hi, lo, kind); actions: name -> args
+P4Action = namedtuple("P4Action", ["out_params", "data_params", "assignments"])  # assignments: (target, source)
+P4Program = namedtuple("P4Program", ["source", "tables", "actions", "action_spans", "meta_widths"])
+
+
+class MinimizerError(Exception):
+    pass
+
+
+def short_name(name):
+    return name.rsplit(".", 1)[-1]
+
+
+def entry_result(command):
+    """(action, action params) of an entry, or MISS for NoAction."""
+    if short_name(command.action) == "NoAction":
+        return MISS
+    params = command.params[:-1] if needs_priority(command.keys) else command.params
+    return short_name(command.action), tuple(params)
+
+
+# Feature tables (single ternary key)
+
+def is_single_ternary(commands):
+    return all(len(c.keys) == 1 and c.keys[0].kind == TERNARY for c in commands)
+
+
+def ternary_width(commands):
+    """Key bits the masks cover; the table gives the same result for x and x mod 2**width."""
+    mask = 0
+    for c in commands:
+        mask |= c.keys[0].arg
+    return mask.bit_length()
+
+
+def as_entries(commands, field_width=None):
+    """(value, mask, low, high, result) per entry, in match order; x matches when x & mask == value and
+    low <= x <= high. Ternary and range entries go by CLI priority (file order on ties), LPM entries by
+    prefix length (field_width is then needed)."""
+    entries = []
+    for c in commands:
+        key = c.keys[0]
+        if key.kind == RANGE:
+            entries.append((0, 0, key.value, key.arg, entry_result(c)))
+        elif key.kind == LPM:
+            mask = ((1 << field_width) - 1) ^ ((1 << (field_width - key.arg)) - 1)
+            entries.append((key.value & mask, mask, 0, float("inf"), entry_result(c)))
+        else:
+            entries.append((key.value & key.arg, key.arg, 0, float("inf"), entry_result(c)))
+    if commands and commands[0].keys[0].kind == LPM:
+        order = sorted(range(len(commands)), key=lambda i: -commands[i].keys[0].arg)
+    else:
+        order = sorted(range(len(commands)), key=lambda i: commands[i].params[-1])
+    return [entries[i] for i in order]
+
+
+def first_match(entries, x):
+    for value, mask, low, high, result in entries:
+        if x & mask == value and low <= x <= high:
+            return result
+    return MISS
+
+
+def ortc(function, width):
+    """Fewest prefix entries (value, mask, result), longest prefix first, reproducing function[x] for every x."""
+    # Result changes: the block [lo, lo + size) is uniform when no change falls inside it
+    changes = [0]
+    for x in range(1, len(function)):
+        changes.append(changes[-1] + (function[x] != function[x - 1]))
+    full = (1 << width) - 1
+    sets = {}
+
+    def candidates(lo, size):
+        if changes[lo + size - 1] == changes[lo]:
+            sets[lo, size] = {function[lo]}
+        else:
+            half = size // 2
+            left, right = candidates(lo, half), candidates(lo + half, half)
+            sets[lo, size] = (left & right) or (left | right)
+        return sets[lo, size]
+
+    candidates(0, 1 << width)
+    entries = []
+
+    def assign(lo, size, depth, inherited):
+        options = sets[lo, size]
+        chosen = inherited
+        if inherited not in options:
+            chosen = min(options, key=lambda r: (r is not MISS, r or ()))
+            entries.append((depth, lo, full ^ (size - 1), chosen))
+        if size > 1 and (lo, size // 2) in sets:  # the block was split
+            assign(lo, size // 2, depth + 1, chosen)
+            assign(lo + size // 2, size // 2, depth + 1, chosen)
+
+    assign(0, 1 << width, 0, MISS)
+    entries.sort(key=lambda e: -e[0])
+    return [(value, mask, result) for _, value, mask, result in entries]
+
+
+def intervals(function):
+    """Maximal [low, high] runs of the same result, misses left out."""
+    runs = []
+    for x, result in enumerate(function):
+        if runs and runs[-1][2] == result:
+            runs[-1][1] = x
+        else:
+            runs.append([x, x, result])
+    return [(low, high, result) for low, high, result in runs if result is not MISS]
+
+
+def feature_keys(function, width, match, field_width):
+    """(Key, result) entries of the given match kind reproducing function on [0, 2**width)."""
+    if match == RANGE:
+        return [(Key(RANGE, low, high), result) for low, high, result in intervals(function)]
+    prefixes = ortc(function, width)
+    if match == LPM:
+        # A w-bit prefix of length d is a field_width-bit prefix of length field_width - w + d
+        return [(Key(LPM, value, field_width - width + bin(mask).count("1")), result)
+                for value, mask, result in prefixes]
+    return [(Key(TERNARY, value, mask), result) for value, mask, result in prefixes]
+
+
+def rebuild_feature_table(commands, match=TERNARY, field_width=None):
+    """Smallest table of the match kind equivalent to a single-key ternary table on its key domain.
+
+    Returns the new commands, the key width and the old/new entries in match order."""
+    width = ternary_width(commands)
+    before = as_entries(commands)
+    function = [first_match(before, x) for x in range(1 << width)]
+    template = commands[0]
+    rebuilt = []
+    for priority, (key, result) in enumerate(feature_keys(function, width, match, field_width)):
+        action, params = result if result is not MISS else ("NoAction", ())
+        rebuilt.append(ParsedCommand(template.table, action, [key],
+                                     [*params] if match == LPM else [*params, priority], template.source, 0))
+    return rebuilt, width, before, as_entries(rebuilt, field_width)
+
+
+def check_feature_table(table, before, after, width, match=TERNARY, field_width=None):
+    for x in range(1 << width):
+        old, new = first_match(before, x), first_match(after, x)
+        if old != new:
+            raise MinimizerError(f"{table}: key {x} gives {new} instead of {old}")
+    # Above 2**width the ternary masks alias x to x mod 2**width; range and LPM entries stay inside the domain
+    if match != TERNARY and width < field_width:
+        top = ((1 << field_width) - 1) >> width << width
+        for value, mask, low, high, _ in after:
+            if (mask == 0 and high >= 1 << width) or (mask and (mask & top != top or value & top)):
+                raise MinimizerError(f"{table}: an entry reaches past the key domain [0, {(1 << width) - 1}]")
+
+
+def lookup_ns(entries, width, repeat=3):
+    """Time of a first-match scan over the entries, per key value, best of repeat passes over the key domain."""
+    domain = range(1 << width)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for x in domain:
+            first_match(entries, x)
+        best = min(best, time.perf_counter() - start)
+    return 1e9 * best / len(domain)
+
+
+# P4 program: what each metadata field can hold
+
+def braced(source, start):
+    """Text between the brace at or after start and its matching closing brace, and the end position."""
+    open_at = source.index("{", start)
+    depth = 0
+    for i in range(open_at, len(source)):
+        depth += {"{": 1, "}": -1}.get(source[i], 0)
+        if depth == 0:
+            return source[open_at + 1:i], i + 1
+    raise MinimizerError("unbalanced braces in the P4 program")
+
+
+def parse_p4(source):
+    """P4Program of a P4 source: tables, actions, action body spans and metadata field widths.
+
+    Only the simple declarations used in this repo are understood."""
+    source = re.sub(r"//[^\n]*", "", source)
+    actions, spans = {}, []
+    for m in re.finditer(r"\baction\s+(\w+)\s*\(([^)]*)\)\s*\{", source):
+        body, end = braced(source, m.end() - 1)
+        spans.append((m.end(), end))
+        out_params, data_params = [], []
+        for param in filter(None, (p.strip() for p in m.group(2).split(","))):
+            (out_params if param.split()[0] in ("out", "inout") else data_params).append(param.split()[-1])
+        assignments = []
+        for target, value in re.findall(r"([\w.]+)\s*=\s*(\w+)\s*;", body):
+            if value in data_params:
+                assignments.append((target, ("param", data_params.index(value))))
+            elif re.fullmatch(r"\d+|0x[0-9a-fA-F]+", value):
+                assignments.append((target, ("const", int(value, 0))))
+            else:
+                assignments.append((target, ("unknown", None)))
+        actions[m.group(1)] = P4Action(out_params, data_params, assignments)
+
+    tables = {}
+    for m in re.finditer(r"\btable\s+(\w+)\s*\{", source):
+        body, _ = braced(source, m.end() - 1)
+        keys = []
+        key_block = re.search(r"\bkey\s*=\s*\{(.*?)\}", body, re.S)
+        for field, hi, lo, kind in re.findall(r"([\w.]+)(?:\[(\d+):(\d+)\])?\s*:\s*(\w+)\s*;",
+                                              key_block.group(1) if key_block else ""):
+            keys.append((field, int(hi) if hi else None, int(lo) if lo else None, kind))
+        bound = {}
+        actions_block = re.search(r"\bactions\s*=\s*\{(.*?)\}", body, re.S)
+        for name, args in re.findall(r"(\w+)\s*(?:\(([^)]*)\))?\s*;", actions_block.group(1) if actions_block else ""):
+            bound[name] = [a.strip() for a in args.split(",") if a.strip()]
+        default = re.search(r"\bdefault_action\s*=\s*(\w+)\s*(?:\(([^)]*)\))?", body)
+        default_call = None
+        if default:
+            args = [a.strip() for a in (default.group(2) or "").split(",") if a.strip()]
+            default_call = (default.group(1), args)
+        tables[m.group(1)] = P4Table(keys, bound, default_call)
+
+    widths = {}
+    for m in re.finditer(r"\bstruct\s+metadata_t\s*\{", source):
+        body, _ = braced(source, m.end() - 1)
+        widths.update((f"meta.{name}", int(bits)) for bits, name in re.findall(r"bit<(\d+)>\s+(\w+)\s*;", body))
+    return P4Program(source, tables, actions, spans, widths)
+
+
+def reachable_values(p4, table_commands):
+    """Values each metadata field can take, for the fields only written by table actions; others are absent."""
+    source, tables, actions, spans, _ = p4
+    values = defaultdict(lambda: {0})
+    unknown = set()
+    for m in re.finditer(r"\b(meta\.\w+)\s*(\[[^\]]*\])?\s*=(?!=)", source):
+        inside = any(lo <= m.start() < hi for lo, hi in spans)
+        if not inside or m.group(2):
+            unknown.add(m.group(1))
+
+    for name, action in actions.items():
+        called_directly = len(re.findall(rf"\b{name}\s*\(", source)) - 1 - sum(
+            name in t.actions and bool(t.actions[name]) for t in tables.values()) - sum(
+            t.default is not None and t.default[0] == name and bool(t.default[1]) for t in tables.values())
+        if called_directly > 0:
+            unknown.update(target for target, (kind, _) in action.assignments if kind != "const")
+
+    for table_name, table in tables.items():
+        commands = table_commands.get(table_name)
+        results = commands_results(commands) if commands is not None else set()
+        for action_name, args in table.actions.items():
+            action = actions.get(action_name)
+            if action is None:
+                continue
+            binding = dict(zip(action.out_params, args))
+            for target, (kind, arg) in action.assignments:
+                field = binding.get(target, target)
+                if kind == "const":
+                    values[field].add(arg)
+                elif kind == "param" and commands is not None:
+                    values[field].update(result[1][arg] for result in results
+                                         if result is not MISS and result[0] == action_name)
+                    if table.default and table.default[0] == action_name and len(table.default[1]) > arg:
+                        values[field].add(int(table.default[1][arg], 0))
+                else:
+                    unknown.add(field)
+    return {field: v for field, v in values.items() if field not in unknown}
+
+
+def commands_results(commands):
+    if is_single_ternary(commands) and ternary_width(commands) <= MAX_TERNARY_BITS:
+        entries = as_entries(commands)
+        return {first_match(entries, x) for x in range(1 << ternary_width(commands))}
+    return {entry_result(c) for c in commands}  # every rebuilt range/LPM entry matches some key
+
+
+def key_values(p4_table, reach):
+    """Reachable values of each key of a P4 table, None where unknown."""
+    result = []
+    for field, hi, lo, _ in p4_table.keys:
+        if field not in reach:
+            result.append(None)
+        elif hi is None:
+            result.append(set(reach[field]))
+        else:
+            result.append({(v >> lo) & ((1 << (hi - lo + 1)) - 1) for v in reach[field]})
+    return result
+
+
+def prune_exact(commands, reachable):
+    live = [c for c in commands if all(r is None or k.value in r for k, r in zip(c.keys, reachable))]
+    return live
+
+
+def check_exact(table, before, after, reachable):
+    kept = set(map(id, after))
+    removed = [c for c in before if id(c) not in kept]
+    for c in removed:
+        if all(r is None or k.value in r for k, r in zip(c.keys, reachable)):
+            raise MinimizerError(f"{table}: removed a reachable entry ({format_command(c)})")
+    if any(r is None for r in reachable):
+        return False
+    size = 1
+    for r in reachable:
+        size *= len(r)
+    if size > MAX_EXACT_PRODUCT:
+        return False
+    old, new = {}, {}
+    for c in before:
+        old.setdefault(tuple(k.value for k in c.keys), entry_result(c))
+    for c in after:
+        new.setdefault(tuple(k.value for k in c.keys), entry_result(c))
+    for key in itertools.product(*(sorted(r) for r in reachable)):
+        if old.get(key, MISS) != new.get(key, MISS):
+            raise MinimizerError(f"{table}: key {key} gives {new.get(key, MISS)} instead of {old.get(key, MISS)}")
+    return True
+
+
+# Files
+
+def group_tables(commands):
+    """Commands per table, tables in first-appearance order."""
+    tables = {}
+    for c in commands:
+        tables.setdefault(c.table, []).append(c)
+    return tables
+
+
+def minimize(paths, p4_source=None, timing=True, feature_match=TERNARY):
+    """Minimize the tables of the files; returns ({path: {table: commands}}, [TableReport]).
+
+    Single-key ternary tables are rebuilt with feature_match keys (ternary, range or lpm); range and LPM
+    need the P4 program for the key field widths."""
+    files = {path: group_tables(read_commands(path)) for path in paths}
+    tables = {table: commands for grouped in files.values() for table, commands in grouped.items()}
+    minimized, reports = {}, {}
+    p4 = parse_p4(p4_source) if p4_source else None
+    if feature_match != TERNARY and p4 is None:
+        raise MinimizerError(f"{feature_match} feature tables need the P4 program (--p4) for the key widths")
+
+    for table, commands in tables.items():
+        if not is_single_ternary(commands):
+            continue
+        if ternary_width(commands) > MAX_TERNARY_BITS:
+            reports[table] = TableReport(table, TERNARY, len(commands), len(commands), None, None,
+                                         f"key wider than {MAX_TERNARY_BITS} bits, kept")
+            continue
+        field_width = None
+        if feature_match != TERNARY:
+            p4_table = p4.tables.get(short_name(table))
+            if p4_table is None or len(p4_table.keys) != 1 or p4_table.keys[0][0] not in p4.meta_widths:
+                raise MinimizerError(f"{table}: key field width not found in the P4 program")
+            field_width = p4.meta_widths[p4_table.keys[0][0]]
+        new, width, before, after = rebuild_feature_table(commands, feature_match, field_width)
+        check_feature_table(table, before, after, width, feature_match, field_width)
+        minimized[table] = new
+        # BMv2 scans ternary and range tables; LPM tables are a trie lookup, so no scan time is emulated
+        timed = timing and feature_match != LPM
+        ns_before = lookup_ns(before, width) if timed else None
+        ns_after = lookup_ns(after, width) if timed else None
+        reports[table] = TableReport(table, feature_match, len(commands), len(new), ns_before, ns_after,
+                                     f"checked {1 << width} key values")
+
+    exact = [t for t, commands in tables.items() if all(k.kind == EXACT for c in commands for k in c.keys)]
+    changed = True
+    while p4 and changed:
+        # Pruning a table can make values of the fields it writes unreachable in later tables
+        by_p4_name = {short_name(t): minimized.get(t, commands) for t, commands in tables.items()}
+        reach = reachable_values(p4, by_p4_name)
+        changed = False
+        for table in exact:
+            p4_table = p4.tables.get(short_name(table))
+            if p4_table is None or len(p4_table.keys) != len(tables[table][0].keys):
+                continue
+            live = prune_exact(tables[table], key_values(p4_table, reach))
+            if len(live) != len(minimized.get(table, tables[table])):
+                minimized[table] = live
+                changed = True
+
+    if p4:
+        reach = reachable_values(p4, {short_name(t): minimized.get(t, c) for t, c in tables.items()})
+    for table in exact:
+        new = minimized.get(table, tables[table])
+        note = "hash lookup"
+        if p4 and short_name(table) in p4.tables:
+            complete = check_exact(table, tables[table], new, key_values(p4.tables[short_name(table)], reach))
+            note += ", checked all reachable keys" if complete else ", removed entries checked unreachable"
+        reports[table] = TableReport(table, EXACT, len(tables[table]), len(new), None, None, note)
+
+    for table, commands in tables.items():
+        reports.setdefault(table, TableReport(table, "mixed", len(commands), len(commands), None, None, "kept"))
+    result = {path: {table: minimized.get(table, commands) for table, commands in grouped.items()}
+              for path, grouped in files.items()}
+    return result, [reports[table] for table in tables]
+
+
+def write_commands(path, tables):
+    with open(path, "w") as f:
+        for i, commands in enumerate(tables.values()):
+            if i:
+                f.write("\n")
+            for c in commands:
+                f.write(format_command(c) + "\n")
+
+
+def print_report(reports):
+    print(f"{'table':40} {'match':8} {'entries':>15} {'scan ns/lookup':>17}  note")
+    for r in reports:
+        timing = f"{r.lookup_ns_before:7.0f} -> {r.lookup_ns_after:5.0f}" if r.lookup_ns_before is not None else ""
+        print(f"{short_name(r.table):40} {r.kind:8} {r.before:6} -> {r.after:5} {timing:>17}  {r.note}")
+    before = sum(r.before for r in reports)
+    after = sum(r.after for r in reports)
+    features = [r for r in reports if r.kind in (TERNARY, RANGE, LPM)]
+    scanned_before = sum(r.before for r in features)
+    scanned_after = sum(r.after for r in features if r.kind != LPM)
+    print(f"entries: {before} -> {after} ({100.0 * (before - after) / before:.1f}% fewer)")
+    if scanned_before:
+        # One lookup per table and packet; BMv2 compares every entry of a ternary or range table
+        lpm = sum(r.kind == LPM for r in features)
+        print(f"feature entries scanned per packet: {scanned_before} -> {scanned_after}"
+              + (f" ({scanned_before / scanned_after:.1f}x fewer)" if scanned_after else "")
+              + (f", plus {lpm} LPM trie lookups" if lpm else ""))
+    timed = [r for r in features if r.lookup_ns_before is not None]
+    if timed:
+        ns_before = sum(r.lookup_ns_before for r in timed)
+        ns_after = sum(r.lookup_ns_after for r in timed)
+        print(f"emulated feature lookup time per packet: {ns_before / 1000:.1f} us -> {ns_after / 1000:.1f} us "
+              f"({ns_before / ns_after:.1f}x faster)")
+
+
+def main(args):
+    p4_source = None
+    if args.p4:
+        with open(args.p4) as f:
+            p4_source = f.read()
+    try:
+        result, reports = minimize(args.tables, p4_source, timing=not args.no_timing,
+                                   feature_match=args.feature_match)
+    except (OSError, TableCommandError, MinimizerError) as e:
+        print(f"Error: {e}")
+        return 1
+    print_report(reports)
+    if args.check_only:
+        return 0
+    os.makedirs(args.output_dir, exist_ok=True)
+    for path, tables in result.items():
+        output = os.path.join(args.output_dir, os.path.basename(path))
+        if os.path.abspath(output) == os.path.abspath(path):
+            print(f"Error: refusing to overwrite {path}")
+            return 1
+        write_commands(output, tables)
+        print(f"{output}: {sum(len(c) for c in tables.values())} entries")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Minimize table_add files, keeping the lookup results identical")
+    parser.add_argument("tables", nargs="+", help="table_add command files")
+    parser.add_argument("--p4", help="P4 program, used to drop unreachable exact entries and for key widths")
+    parser.add_argument("--feature-match", choices=[TERNARY, RANGE, LPM], default=TERNARY,
+                        help="Match kind of the rebuilt feature tables; must match FEATURE_MATCH of the P4 build")
+    parser.add_argument("--output-dir", default="build/tables", help="Directory for the minimized files")
+    parser.add_argument("--check-only", action="store_true", help="Only minimize, check and report")
+    parser.add_argument("--no-timing", action="store_true", help="Skip the emulated lookup timing")
+    sys.exit(main(parser.parse_args()))
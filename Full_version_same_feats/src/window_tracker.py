@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Active-window tracking for digest-driven heartbeats.
+
+PatientMonitoring.p4 emits a window_event_t digest when a patient's window
+opens and when it closes. WindowTracker keeps the open windows in a hashed
+timer wheel keyed by patient ID, so the heartbeat loop only has to send to
+the patients whose window is due to time out instead of to every patient ID.
+"""
+
+import threading
+import time
+
+WINDOW_CLOSE = 0
+WINDOW_OPEN = 1
+
+
+class TimerWheel:
+    """Hashed timing wheel mapping patient IDs to deadlines (clock seconds).
+
+    Deadlines further away than one wheel revolution stay in their slot and are
+    only popped on the revolution in which they fall due.
+    """
+
+    def __init__(self, tick_s=0.5, num_slots=512):
+        self.tick_s = tick_s
+        self.slots = [set() for _ in range(num_slots)]
+        self.entries = {}  # pid -> (deadline, tick)
+        self.next_tick = None
+
+    def schedule(self, pid, deadline):
+        """(Re)schedule pid to fire at deadline."""
+        self.cancel(pid)
+        tick = int(deadline / self.tick_s)
+        if self.next_tick is not None and tick < self.next_tick:
+            tick = self.next_tick  # already in the past: fire on the next pop
+        self.entries[pid] = (deadline, tick)
+        self.slots[tick % len(self.slots)].add(pid)
+
+    def cancel(self, pid):
+        entry = self.entries.pop(pid, None)
+        if entry is not None:
+            self.slots[entry[1] % len(self.slots)].discard(pid)
+
+    def pop_due(self, now):
+        """Remove and return the patient IDs whose deadline is <= now."""
+        now_tick = int(now / self.tick_s)
+        if self.next_tick is None:
+            self.next_tick = min((tick for _, tick in self.entries.values()), default=now_tick)
+        due = []
+        for tick in range(self.next_tick, min(now_tick, self.next_tick + len(self.slots) - 1) + 1):
+            slot = self.slots[tick % len(self.slots)]
+            for pid in [p for p in slot if self.entries[p][0] <= now]:
+                slot.discard(pid)
+                del self.entries[pid]
+                due.append(pid)
+        self.next_tick = now_tick
+        return due
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, pid):
+        return pid in self.entries
+
+
+class WindowTracker:
+    """Turns window open/close digests into heartbeat deadlines.
+
+    Switch timestamps (ingress_global_timestamp, microseconds) are mapped onto
+    the local clock with the smallest observed offset, i.e. the fastest digest
+    delivery, so digest batching delay does not push heartbeats late. A window
+    is due timeout_s + margin_s after it opened; if no close digest follows a
+    heartbeat, it is retried every retry_s until the switch's quiet period is
+    over.
+    """
+
+    def __init__(self, timeout_s, quiet_s, margin_s=0.5, retry_s=5.0, clock=time.monotonic, wheel=None):
+        self.timeout_s = timeout_s
+        self.quiet_s = quiet_s
+        self.margin_s = margin_s
+        self.retry_s = retry_s
+        self.clock = clock
+        self.wheel = wheel or TimerWheel()
+        self.opened_at = {}
+        self.offset = None
+        self.lock = threading.Lock()
+        self.opens = self.closes = self.heartbeats = 0
+
+    def on_event(self, pid, switch_ts_us, event):
+        now = self.clock()
+        offset = now - switch_ts_us / 1e6
+        with self.lock:
+            if self.offset is None or offset < self.offset:
+                self.offset = offset
+            if event == WINDOW_OPEN:
+                opened = switch_ts_us / 1e6 + self.offset
+                self.opened_at[pid] = opened
+                self.wheel.schedule(pid, opened + self.timeout_s + self.margin_s)
+                self.opens += 1
+            else:
+                self.opened_at.pop(pid, None)
+                self.wheel.cancel(pid)
+                self.closes += 1
+
+    def due(self):
+        """Return patients needing a heartbeat now and schedule their retry."""
+        now = self.clock()
+        with self.lock:
+            due = self.wheel.pop_due(now)
+            for pid in due:
+                retry = now + self.retry_s
+                if retry < self.opened_at[pid] + self.timeout_s + self.quiet_s:
+                    self.wheel.schedule(pid, retry)
+                else:
+                    del self.opened_at[pid]  # past the quiet period; the next sensor packet closes it
+            self.heartbeats += len(due)
+        return due
+
+    def __len__(self):
+        return len(self.opened_at)
+
+    def __str__(self):
+        return (f"{len(self)} active windows, {self.opens} opened, {self.closes} closed, "
+                f"{self.heartbeats} heartbeats sent")
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Checks src/dataplane_emulator.py without interfaces: complete windows sent as
+sensor packets give the Alerts of the reference engine; a heartbeat after
+TIMEOUT_NS sends the partial window to the CPU port, and the controller's
+PacketOut of it is inferred; late packets are dropped in the quiet time and
+then restart the window; a sweep packet sends every timed-out window to the
+CPU and comes back as a report; with PIGGYBACK_EXPIRY spare sensor packets
+carry the timed-out window under the expiry cursor; with LOCF_IMPUTATION a
+timed-out window is filled from the patient's last complete window and
+inferred, unless the patient has none; VitalsBundle packets give the same
+Alerts as the Sensor packets of their vitals; window digests and PacketIns reach a
+controller over the P4Runtime server. Run as a script it also prints the sensor-path
+packets/s, with inference computed and cached, and the windows/s of the same
+windows sent as one bundle each.
+
+    python3 dataplane_emulator_test.py   (or: python3 -m pytest dataplane_emulator_test.py)
+"""
+import os
+import queue
+import struct
+import sys
+import time
+
+import grpc
+from p4.v1 import p4runtime_pb2, p4runtime_pb2_grpc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '../src'))
+import dataplane_emulator
+import heartbeat
+import planter_codec
+import reference_engine
+import sensor_frames
+from heartbeat import ETHER, HEARTBEAT_SENSOR_ID, SENSOR
+from p4runtime_server import P4RuntimeServer
+
+DATA_FILE = os.path.join(HERE, '../data/val_data_normal_vs_sepsis.csv')
+ALERT = struct.Struct('!IHIIBBI')  # patient_id, timestamp hi16/lo32, sepPrediction, news2Score, news2Alert, hfPrediction
+MONITORING_PORT = dataplane_emulator.MONITORING_PORT
+CPU_PORT = dataplane_emulator.CPU_PORT
+
+_program = None
+
+
+def program():
+    global _program
+    if _program is None:
+        _program, _ = reference_engine.variant_program(os.path.join(HERE, '..'))
+    return _program
+
+
+def sensor(pid, sid, value=0):
+    return ETHER.pack(b'\xff' * 6, b'\x00' * 6, 0x1235) + SENSOR.pack(pid, sid, 0, 0, value)
+
+
+def alert(frame):
+    pid, ts_hi, ts_lo, sep, score, level, hf = ALERT.unpack_from(frame, ETHER.size)
+    return pid, (ts_hi << 32) | ts_lo, sep, score, level, hf
+
+
+def window_packets(planter, rows):
+    """Sensor packets sending each row of planter as one window of patient row % NUM_PATIENTS."""
+    return [(2, sensor(row % 2000, sid, int(planter[f'feature{sid}'][row])))
+            for row in rows for sid in range(planter_codec.NUM_FEATURES)]
+
+
+def check_complete_windows(rows=2000, batch=1024):
+    planter, _, _ = reference_engine.read_rows(DATA_FILE)
+    planter = {field: values[:rows] for field, values in planter.items()}
+    expected = program().run(planter)
+    dataplane = dataplane_emulator.DataPlane(program())
+    packets = window_packets(planter, range(rows))
+    alerts, events = [], []
+    for start in range(0, len(packets), batch):
+        outputs, digests = dataplane.process(packets[start:start + batch], 1000 + start)
+        assert {port for port, _ in outputs} <= {MONITORING_PORT}
+        alerts += [alert(frame) for _, frame in outputs]
+        events += digests
+    assert len(alerts) == rows
+    for field, i in (('sepPrediction', 2), ('news2Score', 3), ('news2Alert', 4), ('hfPrediction', 5)):
+        assert [a[i] for a in alerts] == expected[field].tolist(), field
+    assert [a[0] for a in alerts] == [row % 2000 for row in range(rows)]
+    assert [e[2] for e in events] == [1, 0] * rows  # WINDOW_OPEN, WINDOW_CLOSE per window
+    return dataplane
+
+
+def check_timeouts():
+    dataplane = dataplane_emulator.DataPlane(program())
+    timeout, quiet_end = dataplane.timeout, dataplane.quiet_end
+    t0 = 1000
+    outputs, events = dataplane.process([(2, sensor(7, sid, 50 + sid)) for sid in (0, 2, 8)], t0)
+    assert outputs == [] and events == [(7, t0, 1)]
+    # Heartbeats before the timeout, for an idle patient and for an unknown patient are dropped
+    hb = [(2, sensor(7, HEARTBEAT_SENSOR_ID)), (2, sensor(8, HEARTBEAT_SENSOR_ID)), (2, sensor(5000, 0))]
+    assert dataplane.process(hb, t0 + timeout - 1) == ([], [])
+    outputs, events = dataplane.process(hb[:1], t0 + timeout)
+    assert events == [(7, t0 + timeout, 0)]
+    [(port, frame)] = outputs
+    fields = planter_codec.decode(frame)
+    assert port == CPU_PORT and planter_codec.is_planter(frame)
+    assert fields.patient_id == 7 and fields.timestamp == t0 + timeout and fields.result == 0x63
+    assert fields.features == (50, 0, 52, 0, 0, 0, 0, 0, 58, 0)
+
+    # The controller's imputed PacketOut is inferred like a complete window
+    imputed = (370, 97, 80, 120, 16, 0, 0, 1, 58, 1)
+    packet_out = planter_codec.encode(7, fields.timestamp, imputed)
+    outputs, _ = dataplane.process([(CPU_PORT, bytes(packet_out))], t0 + timeout + 5)
+    [(port, frame)] = outputs
+    expected = program().run({f'feature{i}': [v] for i, v in enumerate(imputed)})
+    assert port == MONITORING_PORT
+    assert alert(frame) == (7, t0 + timeout + 5, expected['sepPrediction'][0], expected['news2Score'][0],
+                            expected['news2Alert'][0], expected['hfPrediction'][0])
+
+    # A packet in the quiet time is dropped; after it, the stale window goes to the CPU and a new one opens
+    t1 = t0 + 10 * quiet_end
+    dataplane.process([(2, sensor(9, 1, 96))], t1)
+    assert dataplane.process([(2, sensor(9, 3, 130))], t1 + timeout) == ([], [])
+    outputs, events = dataplane.process([(2, sensor(9, 4, 18))], t1 + quiet_end)
+    assert [planter_codec.decode(f).features for _, f in outputs] == [(0, 96, 0, 0, 0, 0, 0, 0, 0, 0)]
+    assert events == [(9, t1 + quiet_end, 1)]
+    assert dataplane.presence[9] == 1 << 4 and dataplane.first_timestamp[9] == t1 + quiet_end
+
+
+def check_sweep():
+    dataplane = dataplane_emulator.DataPlane(program())
+    timeout, num_patients = dataplane.timeout, dataplane.num_patients
+    t0 = 1000
+    dataplane.process([(2, sensor(3, 1, 96)), (2, sensor(1500, 0, 370))], t0)
+    dataplane.process([(2, sensor(40, 2, 80))], t0 + timeout // 2)
+    outputs, events = dataplane.process([(CPU_PORT, heartbeat.build_sweep_frame())], t0 + timeout)
+    *windows, (port, frame) = outputs
+    assert port == CPU_PORT and all(port == CPU_PORT for port, _ in windows)
+    assert [planter_codec.decode(f).patient_id for _, f in windows] == [3, 1500]
+    assert planter_codec.decode(windows[0][1]).features == (0, 96, 0, 0, 0, 0, 0, 0, 0, 0)
+    assert events == [(3, t0 + timeout, 0), (1500, t0 + timeout, 0)]
+    assert heartbeat.parse_sweep_report(frame) == heartbeat.SweepReport(num_patients, 2, 0)
+    assert dataplane.first_timestamp[3] == 0 and dataplane.first_timestamp[40] == t0 + timeout // 2
+    assert dataplane.counters['sweep_passes'] == num_patients + 1
+    # A sweep resumed from a cursor only checks the slots from there on
+    outputs, _ = dataplane.process([(CPU_PORT, heartbeat.build_sweep_frame(41))], t0 + 2 * timeout)
+    assert [heartbeat.parse_sweep_report(f).expired for _, f in outputs] == [0]
+    assert dataplane.first_timestamp[40] != 0
+
+
+def check_piggyback_expiry():
+    dataplane = dataplane_emulator.DataPlane(program(), piggyback=True)
+    timeout = dataplane.timeout
+    t0 = 1000
+    dataplane.process([(2, sensor(1, 2, 80))], t0)
+    dataplane.process([(2, sensor(0, 1, 96))], t0 + timeout // 2)
+    assert dataplane.expiry_cursor == 0  # opening a window sends a digest: not a spare packet
+    # A packet stored in patient 5's window checks slot 0 (not timed out), the next one slot 1
+    outputs, events = dataplane.process([(2, sensor(5, 0, 370)), (2, sensor(5, 3, 120))], t0 + timeout)
+    assert events == [(5, t0 + timeout, 1)] and outputs == [] and dataplane.expiry_cursor == 1
+    outputs, events = dataplane.process([(2, sensor(5, 4, 18))], t0 + timeout + 1)
+    [(port, frame)] = outputs
+    fields = planter_codec.decode(frame)
+    assert port == CPU_PORT and fields.patient_id == 1 and fields.features == (0, 0, 80, 0, 0, 0, 0, 0, 0, 0)
+    assert events == [(1, t0 + timeout + 1, 0)] and dataplane.first_timestamp[1] == 0
+    # A heartbeat with nothing to close checks the cursor too; slot 0 was already checked
+    outputs, _ = dataplane.process([(2, sensor(9, HEARTBEAT_SENSOR_ID))] * 2, t0 + 2 * timeout)
+    assert outputs == [] and dataplane.expiry_cursor == 4 and dataplane.first_timestamp[0] == t0 + timeout // 2
+    assert dataplane.counters['piggybacked'] == 1
+    # Without the build option the cursor never moves
+    plain = dataplane_emulator.DataPlane(program())
+    plain.process([(2, sensor(0, 1, 96)), (2, sensor(5, 0, 370)), (2, sensor(5, 3, 120))], t0 + timeout)
+    assert plain.expiry_cursor == 0 and plain.first_timestamp[0] == t0 + timeout
+
+
+def check_locf():
+    dataplane = dataplane_emulator.DataPlane(program(), locf=True)
+    timeout = dataplane.timeout
+    complete = (370, 97, 80, 120, 16, 0, 0, 1, 58, 1)
+    t0 = 1000
+    # Patient 4 has no complete window yet: its timed-out window still goes to the CPU
+    dataplane.process([(2, sensor(4, 0, 380))], t0)
+    outputs, _ = dataplane.process([(2, sensor(4, HEARTBEAT_SENSOR_ID))], t0 + timeout)
+    assert [port for port, _ in outputs] == [CPU_PORT]
+    outputs, _ = dataplane.process([(2, sensor(4, sid, v)) for sid, v in enumerate(complete)], t0 + timeout + 1)
+    assert [port for port, _ in outputs] == [MONITORING_PORT]
+    # The next partial window is filled from it and inferred by the switch
+    t1 = t0 + 3 * timeout
+    dataplane.process([(2, sensor(4, 2, 110)), (2, sensor(4, 8, 58))], t1)
+    outputs, events = dataplane.process([(2, sensor(4, HEARTBEAT_SENSOR_ID))], t1 + timeout)
+    filled = (370, 97, 110, 120, 16, 0, 0, 0, 58, 0)  # only the numeric vitals 0-4 are carried forward
+    expected = program().run({f'feature{i}': [v] for i, v in enumerate(filled)})
+    [(port, frame)] = outputs
+    assert port == MONITORING_PORT and events == [(4, t1 + timeout, 0)]
+    assert alert(frame) == (4, t1 + timeout, expected['sepPrediction'][0], expected['news2Score'][0],
+                            expected['news2Alert'][0], expected['hfPrediction'][0])
+    assert dataplane.counters['locf_inferred'] == 1 and dataplane.first_timestamp[4] == 0
+
+
+def check_bundles():
+    dataplane = dataplane_emulator.DataPlane(program())
+    timeout, quiet_end = dataplane.timeout, dataplane.quiet_end
+    vitals = (370, 97, 80, 120, 16, 0, 0, 1, 58, 1)
+    expected = program().run({f'feature{i}': [v] for i, v in enumerate(vitals)})
+    expected = (expected['sepPrediction'][0], expected['news2Score'][0], expected['news2Alert'][0],
+                expected['hfPrediction'][0])
+    t0 = 1000
+    # A complete bundle is inferred at once and leaves no window behind
+    outputs, events = dataplane.process([(2, sensor_frames.build_bundle_frame(3, dict(enumerate(vitals))))], t0)
+    [(port, frame)] = outputs
+    assert port == MONITORING_PORT and alert(frame) == (3, t0) + expected
+    assert events == [] and dataplane.first_timestamp[3] == 0
+    # Partial bundles and Sensor packets merge into one window
+    readings = dict(enumerate(vitals))
+    part = {sid: readings.pop(sid) for sid in (0, 1, 2, 3)}
+    assert dataplane.process([(2, sensor_frames.build_bundle_frame(3, part))], t0 + 1) == ([], [(3, t0 + 1, 1)])
+    assert dataplane.process([(2, sensor(3, 9, readings.pop(9)))], t0 + 2) == ([], [])
+    outputs, events = dataplane.process([(2, sensor_frames.build_bundle_frame(3, readings))], t0 + 3)
+    assert [alert(f) for _, f in outputs] == [(3, t0 + 3) + expected] and events == [(3, t0 + 3, 0)]
+    # Late bundles are dropped in the quiet time, then send the stale window and open a new one
+    dataplane.process([(2, sensor_frames.build_bundle_frame(5, {2: 80}))], t0)
+    assert dataplane.process([(2, sensor_frames.build_bundle_frame(5, {4: 16}))], t0 + timeout) == ([], [])
+    outputs, events = dataplane.process([(2, sensor_frames.build_bundle_frame(5, dict(enumerate(vitals))))],
+                                        t0 + quiet_end)
+    [(port, frame)] = outputs
+    assert port == CPU_PORT and planter_codec.decode(frame).features == (0, 0, 80, 0, 0, 0, 0, 0, 0, 0)
+    assert events == [(5, t0 + quiet_end, 1)] and dataplane.presence[5] == dataplane.all_present
+
+
+def bundle_packets(planter, rows):
+    """One VitalsBundle per row of planter, as a window of patient row % NUM_PATIENTS."""
+    return [(2, sensor_frames.build_bundle_frame(row % 2000, {sid: int(planter[f'feature{sid}'][row])
+                                                          for sid in range(planter_codec.NUM_FEATURES)}))
+            for row in rows]
+
+
+def check_p4runtime():
+    """PacketIns, digests and PacketOuts between the emulator and a controller on the P4Runtime stream."""
+    emulator = dataplane_emulator.Emulator(dataplane_emulator.DataPlane(program()), [])
+    emulator.server = P4RuntimeServer(0, emulator.packet_out)
+    port = emulator.server.start('127.0.0.1:0')
+    try:
+        with grpc.insecure_channel(f'127.0.0.1:{port}') as channel:
+            stub = p4runtime_pb2_grpc.P4RuntimeStub(channel)
+            requests = queue.Queue()
+            stream = stub.StreamChannel(iter(requests.get, None))
+            arbitration = p4runtime_pb2.StreamMessageRequest()
+            arbitration.arbitration.election_id.low = 1
+            requests.put(arbitration)
+            assert next(stream).arbitration.status.code == 0  # primary
+
+            write = p4runtime_pb2.WriteRequest(device_id=0)
+            update = write.updates.add(type=p4runtime_pb2.Update.INSERT)
+            update.entity.digest_entry.digest_id = 42
+            update.entity.digest_entry.config.max_list_size = 1
+            stub.Write(write)
+            read = p4runtime_pb2.ReadRequest(device_id=0)
+            read.entities.add().digest_entry.SetInParent()
+            assert [e.digest_entry.digest_id for r in stub.Read(read) for e in r.entities] == [42]
+
+            emulator.step([(2, sensor(3, sid, 1)) for sid in range(3)])
+            emulator.start_ns -= emulator.dataplane.timeout * 1000  # the window times out at the next heartbeat
+            emulator.step([(2, sensor(3, HEARTBEAT_SENSOR_ID))])
+            digests = [next(stream)]  # max_list_size 1: the open, then the close after the PacketIn
+            packet_in = next(stream)
+            digests.append(next(stream))
+            assert [d.digest.digest_id for d in digests] == [42, 42]
+            members = [[int.from_bytes(m.bitstring, 'big') for m in data.struct.members]
+                       for d in digests for data in d.digest.data]
+            assert [(pid, event) for pid, _, event in members] == [(3, 1), (3, 0)]
+            assert planter_codec.decode(packet_in.packet.payload).features[:3] == (1, 1, 1)
+
+            packet_out = p4runtime_pb2.StreamMessageRequest()
+            packet_out.packet.payload = packet_in.packet.payload
+            requests.put(packet_out)
+            deadline = time.monotonic() + 5
+            while not emulator.packet_outs and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert list(emulator.packet_outs) == [(CPU_PORT, packet_in.packet.payload)]
+            requests.put(None)
+    finally:
+        emulator.server.stop()
+
+
+def test_complete_windows():
+    check_complete_windows(500)
+
+
+def test_timeouts_and_packet_outs():
+    check_timeouts()
+
+
+def test_sweep():
+    check_sweep()
+
+
+def test_piggyback_expiry():
+    check_piggyback_expiry()
+
+
+def test_locf():
+    check_locf()
+
+
+def test_bundles():
+    check_bundles()
+
+
+def test_p4runtime_stream():
+    check_p4runtime()
+
+
+if __name__ == "__main__":
+    check_timeouts()
+    check_sweep()
+    check_piggyback_expiry()
+    check_locf()
+    check_bundles()
+    check_p4runtime()
+    rows = 17568
+    start = time.perf_counter()
+    dataplane = check_complete_windows(rows)
+    cold = time.perf_counter() - start
+    planter, _, _ = reference_engine.read_rows(DATA_FILE)
+    packets = window_packets(planter, range(rows))
+    start = time.perf_counter()
+    for i in range(0, len(packets), 1024):
+        dataplane.process(packets[i:i + 1024], 10 ** 9 + i)
+    warm = time.perf_counter() - start
+    print(f"OK: {len(packets)} sensor packets, {rows} windows; "
+          f"{len(packets) / warm:.0f} packets/s with cached inference "
+          f"(first pass incl. checks {len(packets) / cold:.0f}/s, {dataplane.counters['inferences']} inferences)")
+    bundles = bundle_packets(planter, range(rows))
+    start = time.perf_counter()
+    for i in range(0, len(bundles), 1024):
+        outputs, _ = dataplane.process(bundles[i:i + 1024], 2 * 10 ** 9 + i)
+        assert len(outputs) == len(bundles[i:i + 1024])
+    bundled = time.perf_counter() - start
+    print(f"Windows/s: {rows / warm:.0f} as 10 Sensor packets, {rows / bundled:.0f} as one VitalsBundle "
+          f"({warm / bundled:.1f}x)")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark of one heartbeat sweep: per-patient scapy + PacketOut serialization
+(the previous controller.heartbeat_loop) vs. the template-based HeartbeatEngine.
+
+Messages are handed to a no-op sender, so the numbers are the controller-side
+CPU cost of a sweep and exclude the gRPC transport.
+
+The second table compares a heartbeat sweep with the in-switch sweep of
+--heartbeat-mode sweep on src/dataplane_emulator.py: NUM_PATIENTS heartbeat
+frames vs. one sweep packet, with --open-fraction of the windows timed out.
+The controller then builds one message instead of NUM_PATIENTS; the switch
+time is the emulator's CPU time, not BMv2's.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src'))
+import dataplane_emulator
+import heartbeat
+import reference_engine
+from p4.v1 import p4runtime_pb2
+from scapy.all import Ether, Packet, IntField, BitField, ShortField, bind_layers, raw
+
+
+class Sensor(Packet):
+    name = "Sensor"
+    fields_desc = [
+        IntField("patient_id", 0),
+        IntField("sensor_id", 999),
+        BitField("timestamp", 0, 48),
+        ShortField("feature_value", 0)
+    ]
+
+
+bind_layers(Ether, Sensor, type=heartbeat.ETHERTYPE_SENSOR)
+
+
+def legacy_message(pid):
+    sensor_pkt = Ether(dst="00:04:00:00:00:00", src="08:00:27:bc:fc:b5", type=heartbeat.ETHERTYPE_SENSOR) / \
+        Sensor(patient_id=pid, sensor_id=999, timestamp=0, feature_value=0)
+    packet_out = p4runtime_pb2.PacketOut()
+    packet_out.payload = raw(sensor_pkt)
+    return packet_out.SerializeToString()
+
+
+def legacy_sweep(num_patients, send):
+    start = time.perf_counter()
+    for pid in range(num_patients):
+        send(legacy_message(pid))
+    return time.perf_counter() - start
+
+
+def switch_sweeps(open_fraction, repeat=5):
+    """(heartbeat sweep, in-switch sweep) CPU seconds of the emulator, and NUM_PATIENTS."""
+    program, _ = reference_engine.variant_program(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    dataplane = dataplane_emulator.DataPlane(program)
+    num_patients, timeout = dataplane.num_patients, dataplane.timeout
+    heartbeats = [(dataplane_emulator.CPU_PORT, heartbeat.build_heartbeat_frame(pid)) for pid in range(num_patients)]
+    sweep = [(dataplane_emulator.CPU_PORT, heartbeat.build_sweep_frame())]
+    step = max(1, round(1 / open_fraction)) if open_fraction > 0 else None
+    sensors = [(2, heartbeat.ETHER.pack(b'\xff' * 6, b'\x00' * 6, heartbeat.ETHERTYPE_SENSOR)
+                + heartbeat.SENSOR.pack(pid, 1, 0, 0, 96)) for pid in range(0, num_patients, step)] if step else []
+    times = {"heartbeats": [], "sweep": []}
+    tnow = 1000
+    for _ in range(repeat):
+        for kind, packets in (("heartbeats", heartbeats), ("sweep", sweep)):
+            dataplane.process(sensors, tnow)
+            tnow += timeout
+            start = time.process_time()
+            dataplane.process(packets, tnow)
+            times[kind].append(time.process_time() - start)
+            tnow += timeout
+    return min(times["heartbeats"]), min(times["sweep"]), num_patients
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark heartbeat sweep cost")
+    parser.add_argument("--patients", type=str, default="2000,10000,50000",
+                        help="Comma-separated patient counts to sweep")
+    parser.add_argument("--open-fraction", type=float, default=0.1,
+                        help="Fraction of windows timed out in the switch comparison")
+    args = parser.parse_args()
+
+    sink = []
+    send = sink.append
+    engine = heartbeat.HeartbeatEngine(send)
+
+    # The template must produce exactly the messages the legacy path built
+    for pid in (0, 1, 1999, 49999, 0xFFFFFFFF):
+        assert engine.message(pid) == legacy_message(pid), f"template mismatch for patient {pid}"
+
+    print(f"{'patients':>9} | {'legacy sweep':>14} | {'legacy/pkt':>11} | {'engine sweep':>13} | {'engine/pkt':>11} | {'speedup':>7}")
+    for num_patients in (int(n) for n in args.patients.split(",")):
+        sink.clear()
+        t_legacy = legacy_sweep(num_patients, send)
+        sink.clear()
+        stats = engine.sweep(range(num_patients))
+        print(f"{num_patients:>9} | {t_legacy * 1000:>11.1f} ms | {t_legacy / num_patients * 1e6:>8.2f} us | "
+              f"{stats.duration_s * 1000:>10.1f} ms | {stats.per_packet_us:>8.2f} us | {t_legacy / stats.duration_s:>6.1f}x")
+
+    t_heartbeats, t_sweep, num_patients = switch_sweeps(args.open_fraction)
+    sink.clear()
+    stats = engine.sweep(range(num_patients))
+    start = time.perf_counter()
+    send(heartbeat.sweep_message())
+    t_message = time.perf_counter() - start
+    print(f"\n{num_patients} patients, {args.open_fraction:.0%} of windows timed out (emulator CPU time):")
+    print(f"{'scheme':>10} | {'PacketOuts':>10} | {'controller':>10} | {'switch':>10}")
+    print(f"{'heartbeat':>10} | {num_patients:>10} | {stats.duration_s * 1000:>7.2f} ms | "
+          f"{t_heartbeats * 1000:>7.2f} ms")
+    print(f"{'sweep':>10} | {1:>10} | {t_message * 1000:>7.2f} ms | {t_sweep * 1000:>7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Checks src/leaf_scores.py on the tables/*.txt files: with the written tables,
+the LEAF_SCORE_SUM pipeline (leaf scores summed from SCORE_OFFSET in 16 bits,
+then the one-entry decision_sum_* range table) gives the label of the
+decision_* tables for every reachable combination of feature codes.
+
+    python3 leaf_scores_test.py   (or: python3 -m pytest leaf_scores_test.py)
+"""
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '../src'))
+import leaf_scores
+import table_minimizer
+from table_commands import read_commands
+
+P4_FILE = os.path.join(HERE, '../PatientMonitoring.p4')
+TABLE_FILES = [os.path.join(HERE, '../tables', name) for name in ('s1-commands-sep.txt', 's1-commands-hf.txt')]
+
+
+def decision_label(commands, votes, default):
+    for c in commands:
+        if tuple(k.value for k in c.keys) == votes:
+            return c.params[0]
+    return default
+
+
+def sum_label(commands, total, default):
+    for c in commands:
+        if c.keys[0].value <= total <= c.keys[0].arg:
+            return c.params[0]
+    return default
+
+
+def check_leaf_scores():
+    """Fit and write the scored tables; returns {decision table: (entries before, code combinations checked)}."""
+    with open(P4_FILE) as f:
+        p4_source = f.read()
+    p4 = table_minimizer.parse_p4(p4_source)
+    result, models = leaf_scores.fit(TABLE_FILES, p4_source)
+    original = table_minimizer.group_tables(c for path in TABLE_FILES for c in read_commands(path))
+    with tempfile.TemporaryDirectory() as output_dir:
+        written = []
+        for path, tables in result.items():
+            written.append(os.path.join(output_dir, os.path.basename(path)))
+            table_minimizer.write_commands(written[-1], tables)
+        scored = table_minimizer.group_tables(c for path in written for c in read_commands(path))
+
+    checked = {}
+    for model in models:
+        sum_table = leaf_scores.sum_table_name(model.decision)
+        assert model.decision not in scored and len(scored[sum_table]) == 1
+        reach = table_minimizer.reachable_values(p4, {table_minimizer.short_name(t): c for t, c in scored.items()})
+        fields, combinations = leaf_scores.code_combinations(p4, model.leaves, reach)
+        by_key = {leaf.table: {tuple(k.value for k in c.keys): c for c in reversed(scored[leaf.table])}
+                  for leaf in model.leaves}
+        count = 0
+        for codes in combinations:
+            values = dict(zip(fields, codes))
+            votes, total = [], leaf_scores.SCORE_OFFSET
+            for leaf in model.leaves:
+                key = tuple((values[field] >> lo) & ((1 << (hi - lo + 1)) - 1) for field, hi, lo, _ in leaf.keys)
+                entry = by_key[leaf.table].get(key)
+                votes.append(leaf.miss_vote if entry is None else entry.params[leaf.vote_index])
+                total += 0 if entry is None else entry.params[leaf.prob_index]
+            expected = decision_label(original[model.decision], tuple(votes), model.default_label)
+            got = sum_label(scored[sum_table], total % (1 << leaf_scores.SCORE_BITS), model.default_label)
+            assert got == expected, (model.decision, codes, votes)
+            count += 1
+        checked[table_minimizer.short_name(model.decision)] = (len(original[model.decision]), count)
+    return checked
+
+
+def test_leaf_scores_match_decision_tables():
+    checked = check_leaf_scores()
+    assert set(checked) == {"decision_sep", "decision_hf"}
+
+
+def test_inseparable_votes_are_reported():
+    # label = vote0 XOR vote1: no per-tree scores separate it
+    samples = [((a, b), a != b) for a in (0, 1) for b in (0, 1)]
+    assert leaf_scores.perceptron(samples, 2) is None
+
+
+if __name__ == "__main__":
+    for decision, (entries, count) in check_leaf_scores().items():
+        print(f"OK: {decision} ({entries} entries) reproduced by one range entry for {count} code combinations")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Checks that the arithmetic NEWS2 aggregation in PatientMonitoring.p4
+(compute_news2_total + the news2_alert_level range table) gives exactly the
+score and alert level of every entry of the former news2_aggregate table,
+tables/news2-commands.txt (6 sub-scores x supplemental oxygen = 8192 entries).
+
+The alert-level entries are read from the P4 source, so editing the table
+there is covered; compute_news2_total is mirrored in news2_total().
+
+    python3 news2_equivalence_test.py   (or: python3 -m pytest news2_equivalence_test.py)
+"""
+import os
+import re
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '../src'))
+from table_commands import read_commands
+
+P4_FILE = os.path.join(HERE, '../PatientMonitoring.p4')
+NEWS2_COMMANDS = os.path.join(HERE, '../tables/news2-commands.txt')
+
+ENTRY = re.compile(r"\(\s*(\w+)\s*\.\.\s*(\w+)\s*,\s*(\w+)\s*\)\s*:\s*set_news2_alert\(\s*(\w+)\s*\)")
+
+
+def alert_level_entries(p4_source):
+    """(low, high, red_flag or None for '_', alert) of news2_alert_level's const entries, in priority order."""
+    table = re.search(r"table news2_alert_level \{.*?const entries = \{(.*?)\}", p4_source, re.S)
+    default = re.search(r"table news2_alert_level \{.*?default_action = set_news2_alert\((\w+)\)", p4_source, re.S)
+    assert table and default, "news2_alert_level not found in PatientMonitoring.p4"
+    entries = [(int(lo, 0), int(hi, 0), None if flag == "_" else int(flag, 0), int(alert, 0))
+               for lo, hi, flag, alert in ENTRY.findall(table.group(1))]
+    return entries, int(default.group(1), 0)
+
+
+def news2_total(sub_scores, supplemental_oxygen):
+    """compute_news2_total(): (score, red flag)."""
+    score = sum(sub_scores) + ((supplemental_oxygen & 1) << 1)
+    red_flag = int(any((s >> 1) & s & 1 for s in sub_scores))
+    return score & 0xFF, red_flag
+
+
+def alert_level(entries, default, score, red_flag):
+    for low, high, flag, alert in entries:
+        if low <= score <= high and flag in (None, red_flag):
+            return alert
+    return default
+
+
+def pipeline(entries, default, sub_scores, supplemental_oxygen):
+    if supplemental_oxygen > 1:
+        return 0, 0
+    score, red_flag = news2_total(sub_scores, supplemental_oxygen)
+    return score, alert_level(entries, default, score, red_flag)
+
+
+def check_news2_commands():
+    """Compare every news2-commands.txt entry; returns (entries checked, alert-level table size)."""
+    with open(P4_FILE) as f:
+        entries, default = alert_level_entries(f.read())
+    commands = list(read_commands(NEWS2_COMMANDS))
+    assert len(commands) == 8192
+    mismatches = []
+    keys = set()
+    for command in commands:
+        values = [k.value for k in command.keys]
+        keys.add(tuple(values))
+        got = list(pipeline(entries, default, values[:6], values[6]))
+        if got != command.params:
+            mismatches.append((values, command.params, got))
+    assert len(keys) == 8192, "news2-commands.txt should cover every sub-score/oxygen combination once"
+    assert not mismatches, f"{len(mismatches)} mismatches, first: {mismatches[0]}"
+    # A supplemental_oxygen value outside {0, 1} missed news2_aggregate; the guard must keep 0/0
+    assert pipeline(entries, default, [3] * 6, 2) == (0, 0)
+    return len(commands), len(entries)
+
+
+def test_matches_news2_commands():
+    check_news2_commands()
+
+
+if __name__ == "__main__":
+    checked, table_entries = check_news2_commands()
+    print(f"OK: {checked} news2_aggregate entries reproduced by the arithmetic total "
+          f"and a {table_entries}-entry alert-level table")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Checks src/p4runtime_stub.py with a minimal controller on a local port: the
+stub injects a fixed number of synthetic PacketIns once the controller is
+primary, the controller imputes them (src/imputation.py) and sends them back
+with two heartbeat sweeps, and the recorder matches every Planter PacketOut
+to its PacketIn and finds the first sweep. The asyncio controller is also run
+against the stub until the stub closes its stream, which must stop the gateway.
+
+    python3 p4runtime_stub_test.py   (or: python3 -m pytest p4runtime_stub_test.py)
+"""
+import argparse
+import asyncio
+import os
+import queue
+import sys
+import threading
+
+import grpc
+from p4.config.v1 import p4info_pb2
+from p4.v1 import p4runtime_pb2, p4runtime_pb2_grpc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '../src'))
+import controller_aio
+import heartbeat
+import planter_codec
+import p4runtime_stub
+from imputation import impute_missing
+from packet_pipeline import StreamClosed
+from p4runtime_server import P4RuntimeServer
+
+PACKET_INS = 200
+SWEEP = 50
+
+
+def packet_out(frame):
+    message = p4runtime_pb2.StreamMessageRequest()
+    message.packet.payload = bytes(frame)
+    return message
+
+
+def run_controller(port, imputed):
+    """Arbitrate, answer PACKET_INS PacketIns with their imputed frame, then send two heartbeat sweeps."""
+    with grpc.insecure_channel(f'127.0.0.1:{port}') as channel:
+        requests = queue.Queue()
+        stream = p4runtime_pb2_grpc.P4RuntimeStub(channel).StreamChannel(iter(requests.get, None))
+        arbitration = p4runtime_pb2.StreamMessageRequest()
+        arbitration.arbitration.election_id.low = 1
+        requests.put(arbitration)
+        assert next(stream).arbitration.status.code == 0
+        for response in stream:
+            buf = bytearray(response.packet.payload)
+            imputed.append(impute_missing(buf))
+            requests.put(packet_out(buf))
+            if len(imputed) == PACKET_INS:
+                break
+        for _ in range(2):
+            for pid in range(SWEEP):
+                requests.put(packet_out(heartbeat.build_heartbeat_frame(pid)))
+        requests.put(None)
+        for _ in stream:
+            pass  # the server ends the stream once it has read every request
+
+
+def check_stub():
+    recorder = p4runtime_stub.PacketOutRecorder()
+    server = P4RuntimeServer(0, recorder.on_packet_out)
+    port = server.start('127.0.0.1:0')
+    frames = p4runtime_stub.synthetic_packet_ins(num_patients=100, missing=0.5, seed=1)
+    injector = p4runtime_stub.Injector(server, recorder, frames, rate=20000, batch_size=20, count=PACKET_INS)
+    imputed = []
+    controller = threading.Thread(target=run_controller, args=(port, imputed))
+    try:
+        injector.start()
+        controller.start()
+        controller.join(30)
+    finally:
+        injector.stop()
+        server.stop()
+    counters = recorder.counters.values
+    assert len(imputed) == PACKET_INS and any(imputed)
+    assert counters["packet_ins"] == counters["imputed"] == PACKET_INS
+    assert counters["unmatched"] == 0 and recorder.outstanding() == 0
+    assert recorder.latency.count == PACKET_INS
+    assert counters["heartbeats"] == 2 * SWEEP
+    assert [packets for packets, _ in recorder.sweeps] == [SWEEP]  # the second sweep is still open
+    return recorder
+
+
+def check_aio_stream_closed(grace):
+    """The stub closes the stream once the gateway is primary: run() raises StreamClosed with its tasks stopped.
+
+    With a grace period the stream usually ends normally; without one the server aborts the RPC.
+    """
+    server = P4RuntimeServer(0)
+    port = server.start('127.0.0.1:0')
+    args = argparse.Namespace(heartbeat_mode="burst", heartbeat_batch=50, heartbeat_pps=None, metrics_interval=30,
+                              patient_slots=False, admit="", discharge_idle=0)
+    gateway = controller_aio.Gateway("s1", f"127.0.0.1:{port}", 0, p4info_pb2.P4Info(), args, imputation_log=None)
+
+    async def close_when_primary():
+        await gateway.mastership.wait()
+        server.stop(grace)
+
+    async def run():
+        closer = asyncio.ensure_future(close_when_primary())
+        try:
+            await asyncio.wait_for(gateway.run(), 10)
+        except StreamClosed as e:
+            return e
+        finally:
+            await closer
+        raise AssertionError("run() returned without StreamClosed")
+
+    try:
+        error = asyncio.run(run())
+    finally:
+        server.stop()
+    assert gateway.mastership.is_set() and gateway.heartbeats > 0
+    return error
+
+
+def check_synthetic_frames():
+    frames = p4runtime_stub.synthetic_packet_ins(num_patients=10, missing=1.0, seed=2)
+    for _ in range(20):
+        frame = next(frames)
+        fields = planter_codec.decode(frame)
+        assert planter_codec.is_planter(frame) and fields.patient_id < 10
+        assert fields.features[:5] == (0,) * 5 and fields.result == 0x63
+
+
+def test_synthetic_frames():
+    check_synthetic_frames()
+
+
+def test_stub_matches_packet_outs():
+    check_stub()
+
+
+def test_aio_controller_stops_on_closed_stream():
+    for grace in (1, None):
+        assert isinstance(check_aio_stream_closed(grace), StreamClosed)
+
+
+if __name__ == "__main__":
+    check_synthetic_frames()
+    recorder = check_stub()
+    print(f"OK: asyncio controller stopped on a closed stream ({check_aio_stream_closed(grace=1)})")
+    print(f"OK: {PACKET_INS} PacketIns imputed, latency {recorder.latency}")
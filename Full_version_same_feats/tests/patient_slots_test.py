@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Checks src/patient_slots.py: admission takes slots from the free list and
+discharged slots are reused last; patients beyond the free slots are
+rejected; a failed table write rolls the admission back, also when the
+write is awaited (admit_async/discharge_async); idle patients are
+listed for discharge; and the patient_slot Updates carry the patient ID as
+the exact key and the slot as the set_slot parameter of a p4info built like
+p4c's for `make PATIENT_SLOTS=1`.
+
+    python3 patient_slots_test.py   (or: python3 -m pytest patient_slots_test.py)
+"""
+import asyncio
+import os
+import sys
+
+from p4.config.v1 import p4info_pb2
+from p4.v1 import p4runtime_pb2
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '../src'))
+import patient_slots
+from table_loader import P4InfoIndex
+
+TABLE_ID = 0x02000101
+ACTION_ID = 0x01000101
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def slot_p4info():
+    p4info = p4info_pb2.P4Info()
+    table = p4info.tables.add()
+    table.preamble.id, table.preamble.name, table.preamble.alias = TABLE_ID, 'SwitchIngress.patient_slot', 'patient_slot'
+    table.match_fields.add(id=1, name='meta.patient_id', bitwidth=32, match_type=p4info_pb2.MatchField.EXACT)
+    action = p4info.actions.add()
+    action.preamble.id, action.preamble.name, action.preamble.alias = ACTION_ID, 'SwitchIngress.set_slot', 'set_slot'
+    action.params.add(id=1, name='slot', bitwidth=32)
+    return p4info
+
+
+def check_allocation():
+    clock = Clock()
+    slots = patient_slots.SlotManager(3, clock=clock)
+    assert slots.admit([1000, 49999, 1000]) == [(1000, 0), (49999, 1)]
+    assert slots.admit([49999, 7, 8]) == [(7, 2)] and slots.rejected == 1
+    assert slots.discharge([49999, 12345]) == [(49999, 1)]
+    assert 49999 not in slots and len(slots) == 2
+    assert slots.admit([8]) == [(8, 1)]
+    assert slots.discharge([1000, 7]) == [(1000, 0), (7, 2)]
+    assert [slots.admit([pid])[0][1] for pid in (20, 21)] == [0, 2]  # freed slots are reused in order
+    assert sorted(slots) == [8, 20, 21] and slots.slot(21) == 2
+
+    clock.now += 50
+    slots.touch(20)
+    slots.touch(999)  # not admitted: ignored
+    clock.now += 100
+    assert sorted(slots.idle(120)) == [8, 21]
+    assert str(slots) == '3/3 slots used, 6 admitted, 3 discharged, 1 rejected'
+
+
+def check_updates():
+    writes = []
+    slots = patient_slots.SlotManager(4, P4InfoIndex(slot_p4info()), writes.append)
+    slots.admit([50000, 3])
+    slots.discharge([50000])
+    assert [len(updates) for updates in writes] == [2, 1]
+    decoded = [[p4runtime_pb2.Update.FromString(u) for u in updates] for updates in writes]
+    for update, (pid, slot) in zip(decoded[0], [(50000, 0), (3, 1)]):
+        entry = update.entity.table_entry
+        assert update.type == p4runtime_pb2.Update.INSERT and entry.table_id == TABLE_ID
+        assert [m.exact.value for m in entry.match] == [pid.to_bytes(4, 'big')]
+        assert entry.action.action.action_id == ACTION_ID
+        assert [p.value for p in entry.action.action.params] == [slot.to_bytes(4, 'big')]
+    [delete] = decoded[1]
+    assert delete.type == p4runtime_pb2.Update.DELETE
+    assert delete.entity.table_entry.match[0].exact.value == (50000).to_bytes(4, 'big')
+
+
+def check_failed_write():
+    def fail(updates):
+        raise RuntimeError('switch unreachable')
+
+    slots = patient_slots.SlotManager(2, P4InfoIndex(slot_p4info()), fail)
+    try:
+        slots.admit([5, 6])
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError('the write error was swallowed')
+    assert len(slots) == 0 and list(slots.free) == [0, 1] and slots.admitted == 0
+
+
+def check_failed_async_write():
+    results = []
+
+    async def write(updates):
+        await asyncio.sleep(0)
+        if results.pop(0) is not None:
+            raise RuntimeError('switch unreachable')
+
+    async def scenario():
+        slots = patient_slots.SlotManager(3, P4InfoIndex(slot_p4info()), write)
+        results[:] = [None, 'fail', 'fail', None]
+        assert await slots.admit_async([5, 6]) == [(5, 0), (6, 1)]
+        for call in (slots.admit_async([7]), slots.discharge_async([5])):
+            try:
+                await call
+            except RuntimeError:
+                continue
+            raise AssertionError('the write error was swallowed')
+        # The failed INSERT gave slot 2 back; the failed DELETE kept patient 5 in its slot
+        assert sorted(slots) == [5, 6] and list(slots.free) == [2] and slots.admitted == 2
+        assert await slots.discharge_async([5, 5]) == [(5, 0)]
+        assert list(slots.free) == [2, 0] and slots.discharged == 1 and not slots.discharging
+
+    asyncio.run(scenario())
+
+
+def check_parse_patient_ids():
+    assert patient_slots.parse_patient_ids('1000-1003, 5000,') == [1000, 1001, 1002, 1003, 5000]
+    assert patient_slots.parse_patient_ids('') == []
+    for bad in ('10-5', 'x', '1-'):
+        try:
+            patient_slots.parse_patient_ids(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f'{bad!r} was accepted')
+
+
+def test_allocation():
+    check_allocation()
+
+
+def test_updates():
+    check_updates()
+
+
+def test_failed_write():
+    check_failed_write()
+
+
+def test_failed_async_write():
+    check_failed_async_write()
+
+
+def test_parse_patient_ids():
+    check_parse_patient_ids()
+
+
+if __name__ == "__main__":
+    check_allocation()
+    check_updates()
+    check_failed_write()
+    check_failed_async_write()
+    check_parse_patient_ids()
+    print("OK")
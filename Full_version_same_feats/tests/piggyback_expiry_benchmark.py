@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Detection delay of timed-out windows with PIGGYBACK_EXPIRY, as a function of
+the sensor load, on src/dataplane_emulator.py with no heartbeats at all.
+
+At t=0 every 10th patient sends one vital and goes silent; active patients
+send their 10 vitals round-robin at --rates packets/s in total, as many
+patients as can complete a window in half of TIMEOUT_NS. The delay of a
+silent patient is the time from its window's timeout to the Planter packet
+that carries it to the CPU. Every spare packet (one that neither opens nor
+completes a window) advances the expiry cursor by one slot, so the worst case
+is one cursor rotation, the time the switch takes to receive NUM_PATIENTS
+spare packets (longer than NUM_PATIENTS / the mean spare rate when windows
+open and complete in bursts).
+Timestamps are simulated, in 10 ms ticks.
+
+    python3 piggyback_expiry_benchmark.py --rates 10,100,1000
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src'))
+import dataplane_emulator
+import planter_codec
+import reference_engine
+from heartbeat import ETHER, ETHERTYPE_SENSOR, SENSOR
+
+TICK_US = 10000
+VALUES = (370, 97, 80, 120, 16, 0, 0, 1, 58, 1)
+
+
+def sensor(pid, sid):
+    return 2, ETHER.pack(b'\xff' * 6, b'\x00' * 6, ETHERTYPE_SENSOR) + SENSOR.pack(pid, sid, 0, 0, VALUES[sid])
+
+
+def detection_delays(program, rate):
+    """(delays in s of the silent patients' windows, spare packets per second) at rate packets/s."""
+    dataplane = dataplane_emulator.DataPlane(program, piggyback=True)
+    num_patients, timeout = dataplane.num_patients, dataplane.timeout
+    silent = set(range(0, num_patients, 10))
+    active = [pid for pid in range(num_patients) if pid not in silent]
+    active = active[:max(1, min(len(active), int(rate * timeout / 1e6 / 20)))]
+    t0 = TICK_US
+    dataplane.process([sensor(pid, 0) for pid in sorted(silent)], t0)
+    delays = {}
+    sent = checks = 0
+    credit = 0.0
+    tnow = t0
+    while len(delays) < len(silent) and tnow < t0 + 100 * timeout:
+        tnow += TICK_US
+        credit += rate * TICK_US / 1e6
+        packets = []
+        while credit >= 1:
+            k = sent + len(packets)
+            packets.append(sensor(active[k % len(active)], (k // len(active)) % planter_codec.NUM_FEATURES))
+            credit -= 1
+        cursor = dataplane.expiry_cursor
+        outputs, _ = dataplane.process(packets, tnow)
+        checks += (dataplane.expiry_cursor - cursor) % num_patients
+        sent += len(packets)
+        for port, frame in outputs:
+            if port == dataplane_emulator.CPU_PORT and planter_codec.is_planter(frame):
+                pid = planter_codec.patient_id(frame)
+                if pid in silent and pid not in delays:
+                    delays[pid] = (tnow - t0 - timeout) / 1e6
+    return list(delays.values()), len(silent), checks / ((tnow - t0) / 1e6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection delay of PIGGYBACK_EXPIRY vs. sensor load")
+    parser.add_argument("--rates", default="10,50,100,500,1000,5000",
+                        help="Comma-separated sensor packets/s to simulate")
+    args = parser.parse_args()
+    program, _ = reference_engine.variant_program(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    num_patients = program.consts["NUM_PATIENTS"][0]
+    print(f"{num_patients} slots, no heartbeats")
+    print(f"{'packets/s':>9} | {'spare/s':>8} | {'rotation':>9} | {'detected':>9} | {'mean delay':>10} | "
+          f"{'max delay':>9}")
+    for rate in (float(r) for r in args.rates.split(",")):
+        delays, silent, spare = detection_delays(program, rate)
+        rotation = num_patients / spare if spare else float("inf")
+        mean = sum(delays) / len(delays) if delays else float("nan")
+        print(f"{rate:>9.0f} | {spare:>8.0f} | {rotation:>7.1f} s | {len(delays):>4}/{silent:<4} | "
+              f"{mean:>8.1f} s | {max(delays, default=float('nan')):>7.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Checks src/reference_engine.py: table semantics on a small program (CLI
+priorities, const entry order, misses, out-parameter bindings, wrap-around at
+the field width, #ifdef), then the five program variants on
+data/val_data_normal_vs_sepsis.csv. The NEWS2 score must equal the CSV's
+news2_score column, and variants built from the same tables must agree:
+the sepsis model of Initial_version_sepsis_only, First_merge_sepsis_news and
+Full_version_diff_feats, the NEWS2 outputs of all NEWS2 variants, and the
+merged feature tables of Full_version_merged_fts_nw with the separate ones here.
+Every build of PatientMonitoring.p4 that scripts/compile_variants.sh compiles
+must also preprocess and parse, with the ternary builds loading all table entries.
+
+    python3 reference_engine_test.py   (or: python3 -m pytest reference_engine_test.py)
+"""
+import glob
+import itertools
+import os
+import re
+import sys
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '../src'))
+import reference_engine
+from table_commands import parse_line
+
+ROOT = os.path.join(HERE, '../..')
+DATA_FILE = os.path.join(HERE, '../data/val_data_normal_vs_sepsis.csv')
+VARIANTS = ['Initial_version_sepsis_only', 'First_merge_sepsis_news', 'Full_version_diff_feats',
+            'Full_version_merged_fts_nw', 'Full_version_same_feats']
+
+COMPILE_VARIANTS = os.path.join(HERE, '../scripts/compile_variants.sh')
+
+SMALL_PROGRAM = """
+header Planter_h { bit<16> feature0; bit<16> feature1; }
+header Alert_h { bit<8> code; bit<8> level; bit<8> total; }
+struct header_t { Planter_h Planter; Alert_h Alert; }
+struct metadata_t { bit<16> x; bit<16> y; bit<4> code; bit<8> level; bit<8> total; }
+control SwitchIngress(inout header_t hdr, inout metadata_t meta, inout standard_metadata_t ig_intr_md) {
+    action prepare_planter_feats() { meta.x = hdr.Planter.feature0; meta.y = hdr.Planter.feature1; }
+    action set_code(out bit<4> code, bit<4> value) { code = value; }
+    action set_level(bit<8> level) { meta.level = level; }
+    table lookup_x {
+        key = { meta.x: ternary; }
+        actions = { set_code(meta.code); NoAction; }
+        default_action = NoAction;
+    }
+    table level {
+        key = { meta.code: exact; meta.y[1:0]: exact; }
+        actions = { set_level; }
+        default_action = set_level(9);
+    }
+    table fixed {
+        key = { meta.y: range; }
+        actions = { set_level; NoAction; }
+        default_action = NoAction();
+        const entries = { 0..3 : set_level(1); 2..10 : set_level(2); }
+    }
+    apply {
+        if (runInference == 1) {
+            lookup_x.apply();
+            level.apply();
+            if (meta.y >= 2) {
+#ifdef USE_FIXED
+                fixed.apply();
+#endif
+            }
+            meta.total = (bit<8>)meta.code + 250;
+            hdr.Alert.code = (bit<8>)meta.code;
+            hdr.Alert.level = meta.level;
+            hdr.Alert.total = meta.total;
+        }
+    }
+}
+"""
+SMALL_TABLES = [
+    "table_add lookup_x set_code 0&&&0xFFF0 => 3 5",  # x < 16, lower priority than the next entry
+    "table_add lookup_x set_code 4&&&0xFFFC => 7 1",  # x in 4..7
+    "table_add level set_level 3 1 => 31",
+    "table_add level set_level 7 1 => 71",
+    "table_add level set_level 7 1 => 99",  # duplicate key: the CLI keeps the first
+]
+
+
+def run_small_program(defines=None):
+    program = reference_engine.Program(SMALL_PROGRAM, defines)
+    program.add_commands(parse_line(line) for line in SMALL_TABLES)
+    x = np.array([1, 5, 5, 20, 5])
+    y = np.array([1, 1, 2, 1, 5])
+    return program.run({'feature0': x, 'feature1': y})
+
+
+def check_small_program():
+    outputs = run_small_program()
+    assert list(outputs['code']) == [3, 7, 7, 0, 7]
+    assert list(outputs['level']) == [31, 71, 9, 9, 71]
+    assert list(outputs['total']) == [253, 1, 1, 250, 1]  # 8-bit wrap-around
+    fixed = run_small_program({'USE_FIXED': '1'})
+    assert list(fixed['level']) == [31, 71, 1, 9, 2]  # const entries: first listed wins
+
+
+def check_variants():
+    """Outputs of every variant on DATA_FILE; returns {variant: outputs}."""
+    planter, columns, _ = reference_engine.read_rows(DATA_FILE)
+    outputs = {}
+    for variant in VARIANTS:
+        program, _ = reference_engine.variant_program(os.path.join(ROOT, variant))
+        outputs[variant] = program.run(planter)
+        assert (outputs[variant]['patient_id'] == planter['patient_id']).all()
+
+    news2_score = np.array([int(s) for s in columns['news2_score']])
+    for variant in VARIANTS[1:]:
+        assert (outputs[variant]['news2Score'] == news2_score).all(), variant
+        assert (outputs[variant]['news2Alert'] == outputs['Full_version_same_feats']['news2Alert']).all(), variant
+    sepsis = outputs['Initial_version_sepsis_only']['alert_value']
+    for variant in VARIANTS[1:3]:
+        assert (outputs[variant]['alert_value'] == sepsis).all(), variant
+    for field in ('sepPrediction', 'hfPrediction'):
+        assert (outputs['Full_version_merged_fts_nw'][field] == outputs['Full_version_same_feats'][field]).all()
+    assert (outputs['Full_version_same_feats']['sepPrediction'] == sepsis).all()
+    return outputs
+
+
+def build_defines():
+    """The -D sets of compile_variants.sh: every boolean option combination, then FEATURE_MATCH=range and lpm."""
+    with open(COMPILE_VARIANTS) as f:
+        options = re.search(r'^OPTIONS=\((.*)\)$', f.read(), re.M).group(1).split()
+    for flags in itertools.product([False, True], repeat=len(options)):
+        yield {'FEATURE_MATCH': 'ternary', **{name: '1' for name, on in zip(options, flags) if on}}
+    for match in ('range', 'lpm'):
+        yield {'FEATURE_MATCH': match}
+
+
+def check_builds():
+    """Parses every build; range and lpm builds take minimized tables, so only the ternary ones load entries."""
+    variant_dir = os.path.join(ROOT, 'Full_version_same_feats')
+    # The tables the Makefile installs; news2-commands.txt is for a news2_aggregate table no build has
+    s1_tables = sorted(glob.glob(os.path.join(variant_dir, 'tables', 's1-commands-*.txt')))
+    builds = 0
+    for defines in build_defines():
+        table_files = s1_tables if defines['FEATURE_MATCH'] == 'ternary' else []
+        _, skipped = reference_engine.variant_program(variant_dir, defines, table_files)
+        assert not skipped, (defines, skipped)
+        builds += 1
+    return builds
+
+
+def test_table_semantics():
+    check_small_program()
+
+
+def test_variants_agree():
+    check_variants()
+
+
+def test_every_build_parses():
+    check_builds()
+
+
+if __name__ == "__main__":
+    check_small_program()
+    outputs = check_variants()
+    rows = len(outputs['Full_version_same_feats']['sepPrediction'])
+    print(f"OK: {len(VARIANTS)} variants agree on {rows} windows, {check_builds()} builds parse")
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Checks src/runtime_json.py: the table_entries it writes for tables/s1-commands-*.txt
+carry, for the first entry of every table and a sample of the others, the
+exact keys, ternary value/mask pairs, action parameters and inverted
+priorities of the table_add lines; and a cached conversion is reused only
+while the table files and the p4info are unchanged.
+
+    python3 runtime_json_test.py   (or: python3 -m pytest runtime_json_test.py)
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from google.protobuf import text_format
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '../src'))
+import runtime_json
+from table_commands import TERNARY, read_commands
+from table_loader import P4InfoIndex
+from table_loader_test import TABLE_FILES, program_p4info
+
+TEMPLATE = os.path.join(HERE, '../s1-runtime.json')
+SAMPLE_EVERY = 997
+
+
+def convert(directory, tables, force=False):
+    """Run runtime_json.main; returns (table_entries, whether the cache was used)."""
+    args = argparse.Namespace(tables=tables, p4info=os.path.join(directory, 'p4info.txtpb'), template=TEMPLATE,
+                              output=os.path.join(directory, 's1-runtime.json'),
+                              cache_dir=os.path.join(directory, 'cache'), force=force)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        assert runtime_json.main(args) == 0
+    with open(args.output) as f:
+        return json.load(f)['table_entries'], 'up to date' in out.getvalue()
+
+
+def write_p4info(directory, p4info):
+    with open(os.path.join(directory, 'p4info.txtpb'), 'w') as f:
+        f.write(text_format.MessageToString(p4info))
+
+
+def check_entries(entries, commands, index):
+    assert len(entries) == len(commands)
+    bases = {}
+    for command in commands:
+        if any(key.kind == TERNARY for key in command.keys):
+            bases[command.table] = max(bases.get(command.table, 1), command.params[-1] + 1)
+    checked = set()
+    for i, (entry, command) in enumerate(zip(entries, commands)):
+        if command.table in checked and i % SAMPLE_EVERY:
+            continue
+        checked.add(command.table)
+        table, action = index.table(command), index.action(command)
+        assert entry['table'] == table.preamble.name and entry['action_name'] == action.preamble.name
+        match = {}
+        for field, key in zip(table.match_fields, command.keys):
+            if key.kind == TERNARY:
+                if key.arg:
+                    match[field.name] = [key.value & key.arg, key.arg]
+            else:
+                match[field.name] = key.value
+        assert entry['match'] == match
+        assert entry['action_params'] == {p.name: v for p, v in zip(action.params, command.params)}
+        if command.table in bases:
+            assert len(command.params) == len(action.params) + 1
+            assert entry['priority'] == bases[command.table] - command.params[-1] >= 1
+        else:
+            assert len(command.params) == len(action.params) and 'priority' not in entry
+    assert len(checked) == len({c.table for c in commands})
+
+
+def check_runtime_json():
+    p4info = program_p4info()
+    index = P4InfoIndex(p4info)
+    commands = [c for path in TABLE_FILES for c in read_commands(path)]
+    directory = tempfile.mkdtemp()
+    try:
+        tables = [shutil.copy(path, directory) for path in TABLE_FILES]
+        write_p4info(directory, p4info)
+        entries, cached = convert(directory, tables)
+        assert not cached
+        check_entries(entries, commands, index)
+        assert convert(directory, tables) == (entries, True)
+
+        # A changed table file: the first line's tree parameter 18 becomes 19
+        with open(tables[0]) as f:
+            lines = f.readlines()
+        assert lines[0].split()[-2] == '18'
+        with open(tables[0], 'w') as f:
+            f.writelines([lines[0].replace('=> 18 ', '=> 19 '), *lines[1:]])
+        changed, cached = convert(directory, tables)
+        assert not cached and changed[0]['action_params'] == {'tree': 19} and changed[1:] == entries[1:]
+
+        # A changed p4info: the tree parameter is renamed
+        renamed = type(p4info)()
+        renamed.CopyFrom(p4info)
+        param = next(a for a in renamed.actions if a.preamble.alias == 'extract_feature0_sep').params[0]
+        param.name = 'tree_id'
+        write_p4info(directory, renamed)
+        changed, cached = convert(directory, tables)
+        assert not cached and changed[0]['action_params'] == {'tree_id': 19}
+
+        # Back to the original inputs: the first conversion is still cached
+        with open(tables[0], 'w') as f:
+            f.writelines(lines)
+        write_p4info(directory, p4info)
+        assert convert(directory, tables) == (entries, True)
+    finally:
+        shutil.rmtree(directory)
+    return entries
+
+
+def test_runtime_json_entries_and_cache():
+    check_runtime_json()
+
+
+if __name__ == "__main__":
+    entries = check_runtime_json()
+    print(f"OK: {len(entries)} table entries, cache invalidated by table file and p4info changes")
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Packets-per-second benchmark of the sensor path on simple_switch.
+
+Sends complete windows (all 10 sensors) for a set of patients at increasing
+offered rates from a raw AF_PACKET socket and counts the alerts coming back on
+the monitoring port. Every complete window produces exactly one alert, so the
+switch kept up at a rate when no alert is missing; the sustained rate is
+10 * alerts / (last alert - first packet).
+
+Run it once per build to compare P4 program variants, e.g. before/after a
+register layout change, with the same switch options (--log-level off, no
+--debugger) and no other traffic:
+
+    sudo python3 switch_pps_benchmark.py --label bitmap --rates 1000 2000 4000 8000
+
+and compare the saved runs side by side, e.g. the default and the packed
+window-register layout (make PACKED_WINDOW_REGS=1):
+
+    python3 switch_pps_benchmark.py --compare switch_pps_bitmap_*.csv switch_pps_packed_*.csv
+
+--bundle sends every window as one VitalsBundle packet instead of 10 Sensor
+packets; the comparison is in windows/s, which both modes report:
+
+    sudo python3 switch_pps_benchmark.py --label sensor --rates 100 200 400 800
+    sudo python3 switch_pps_benchmark.py --label bundle --bundle --rates 100 200 400 800
+    python3 switch_pps_benchmark.py --compare switch_pps_sensor_*.csv switch_pps_bundle_*.csv
+"""
+import argparse
+import csv
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src'))
+import heartbeat
+import sensor_frames
+
+ETHERTYPE_ALERT = 0x1236
+NUM_PATIENTS = 2000  # must match NUM_PATIENTS in PatientMonitoring.p4
+NUM_FEATURES = 10
+# Normal patient: temperature*10, SpO2, pulse, systolic BP, resp. rate, AVPU, O2, referral, age, sex
+NORMAL_VITALS = [370, 98, 80, 120, 16, 0, 0, 1, 45, 1]
+DST = bytes.fromhex("000400000000")
+SRC = bytes.fromhex("080027bcfcb5")
+
+
+def build_frames(patient_ids, rounds):
+    """Sensor frames in send order: sensor by sensor across all patients, so every window completes."""
+    frames = []
+    for _ in range(rounds):
+        for sid in range(NUM_FEATURES):
+            for pid in patient_ids:
+                frames.append(heartbeat.ETHER.pack(DST, SRC, heartbeat.ETHERTYPE_SENSOR)
+                              + heartbeat.SENSOR.pack(pid, sid, 0, 0, NORMAL_VITALS[sid]))
+    return frames
+
+
+def build_bundle_frames(patient_ids, rounds):
+    """One complete VitalsBundle frame per window, patient by patient."""
+    readings = dict(enumerate(NORMAL_VITALS))
+    return [sensor_frames.build_bundle_frame(pid, readings, dst=DST, src=SRC)
+            for _ in range(rounds) for pid in patient_ids]
+
+
+class AlertCounter(threading.Thread):
+    def __init__(self, iface):
+        super().__init__(daemon=True)
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETHERTYPE_ALERT))
+        self.sock.bind((iface, ETHERTYPE_ALERT))
+        self.sock.settimeout(0.2)
+        self.count = 0
+        self.last = None
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                self.sock.recv(256)
+            except socket.timeout:
+                continue
+            self.count += 1
+            self.last = time.perf_counter()
+
+    def stop(self):
+        self.running = False
+        self.join()
+        self.sock.close()
+
+
+def send_paced(sock, frames, rate, burst=32):
+    """Send frames at rate packets/s in bursts; deadlines are anchored to the start."""
+    start = time.perf_counter()
+    for first in range(0, len(frames), burst):
+        delay = start + first / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        for frame in frames[first:first + burst]:
+            sock.send(frame)
+    return start, time.perf_counter()
+
+
+def run_rate(args, rate, patient_ids):
+    frames = (build_bundle_frames if args.bundle else build_frames)(patient_ids, args.rounds)
+    per_window = 1 if args.bundle else NUM_FEATURES
+    expected = len(patient_ids) * args.rounds
+    counter = AlertCounter(args.receive_iface)
+    counter.start()
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+    sock.bind((args.send_iface, 0))
+    start, sent_end = send_paced(sock, frames, rate)
+    sock.close()
+    # Wait until the switch has drained its queues
+    while True:
+        seen = counter.count
+        time.sleep(args.drain_s)
+        if counter.count == seen:
+            break
+    counter.stop()
+    offered = len(frames) / (sent_end - start)
+    elapsed = (counter.last or sent_end) - start
+    return {
+        "label": args.label,
+        "mode": "bundle" if args.bundle else "sensor",
+        "target_pps": rate,
+        "offered_pps": round(offered),
+        "packets": len(frames),
+        "alerts": counter.count,
+        "expected_alerts": expected,
+        "loss_percent": round(100.0 * (expected - counter.count) / expected, 2),
+        "sustained_pps": round(per_window * counter.count / elapsed) if elapsed > 0 else 0,
+        "sustained_windows_s": round(counter.count / elapsed) if elapsed > 0 else 0,
+    }
+
+
+def windows_per_s(row):
+    """Sustained windows/s of a result row; runs saved before --bundle existed sent Sensor packets only."""
+    if row.get("sustained_windows_s"):
+        return row["sustained_windows_s"]
+    return round(int(row["sustained_pps"]) / NUM_FEATURES)
+
+
+def compare(paths):
+    """Print the results of several runs side by side, per target rate."""
+    runs = []
+    for path in paths:
+        with open(path) as f:
+            rows = list(csv.DictReader(f))
+        runs.append((rows[0]["label"] if rows else path, {int(r["target_pps"]): r for r in rows}))
+    rates = sorted({rate for _, rows in runs for rate in rows})
+    print("target pkt/s".ljust(14) + "".join(label.rjust(40) for label, _ in runs))
+    for rate in rates:
+        cells = []
+        for _, rows in runs:
+            r = rows.get(rate)
+            cells.append(f"{r['sustained_pps']} pkt/s ({windows_per_s(r)} win/s), {r['loss_percent']}% lost"
+                         if r else "-")
+        print(str(rate).ljust(14) + "".join(c.rjust(40) for c in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sensor-path packets/s benchmark against simple_switch")
+    parser.add_argument("--send-iface", default="enx0c37965f8a10", help="Interface connected to a sensor port")
+    parser.add_argument("--receive-iface", default="enx0c37965f8a0a", help="Interface on the monitoring port")
+    parser.add_argument("--label", default="current", help="Name of the P4 build under test, written to the CSV")
+    parser.add_argument("--rates", type=int, nargs="+", default=[500, 1000, 2000, 4000, 8000],
+                        help="Offered sensor packets/s to test")
+    parser.add_argument("--patients", type=int, default=400, help="Patients per rate step")
+    parser.add_argument("--rounds", type=int, default=5, help="Complete windows per patient per rate step")
+    parser.add_argument("--bundle", action="store_true",
+                        help="Send each window as one VitalsBundle packet instead of 10 Sensor packets")
+    parser.add_argument("--drain-s", type=float, default=2.0, help="Idle time that ends a rate step")
+    parser.add_argument("--compare", nargs="+", metavar="CSV", help="Only compare previously saved result files")
+    args = parser.parse_args()
+    if args.compare:
+        compare(args.compare)
+        return
+
+    results = []
+    for i, rate in enumerate(args.rates):
+        # Fresh patient IDs per step so windows left open by losses do not merge into the next step
+        base = (i * args.patients) % NUM_PATIENTS
+        patient_ids = [(base + j) % NUM_PATIENTS for j in range(args.patients)]
+        result = run_rate(args, rate, patient_ids)
+        results.append(result)
+        print(f"{args.label}: offered {result['offered_pps']} pkt/s -> {result['alerts']}/{result['expected_alerts']} "
+              f"alerts ({result['loss_percent']}% lost), sustained {result['sustained_pps']} pkt/s "
+              f"= {result['sustained_windows_s']} windows/s")
+
+    lossless = [r["offered_pps"] for r in results if r["loss_percent"] == 0]
+    print(f"{args.label}: highest lossless offered rate {max(lossless) if lossless else 'none'} pkt/s")
+
+    filename = f"switch_pps_{args.label}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"Results saved to {filename}")
+
+
+if __name__ == "__main__":
+    main()
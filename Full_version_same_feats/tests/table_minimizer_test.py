@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Checks src/table_minimizer.py on the tables/*.txt files: the minimized tables
+pass the minimizer's own exhaustive checks, give the same first match as the
+originals for every key value (re-read from the written files), are never
+larger, and minimizing them again changes nothing. The range and LPM feature
+tables (FEATURE_MATCH=range/lpm builds) are checked the same way.
+
+    python3 table_minimizer_test.py   (or: python3 -m pytest table_minimizer_test.py)
+"""
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '../src'))
+import table_minimizer
+from table_commands import read_commands
+
+P4_FILE = os.path.join(HERE, '../PatientMonitoring.p4')
+TABLE_FILES = [os.path.join(HERE, '../tables', name) for name in ('s1-commands-sep.txt', 's1-commands-hf.txt')]
+
+
+def ortc_is_minimal_for_a_range():
+    # [5, 12] in 4 bits needs the prefixes 0101/0110-0111/1000-1011/1100 with a default-miss root: 4 entries
+    function = [("a", ()) if 5 <= x <= 12 else table_minimizer.MISS for x in range(16)]
+    entries = [(value, mask, 0, 15, result) for value, mask, result in table_minimizer.ortc(function, 4)]
+    assert [table_minimizer.first_match(entries, x) for x in range(16)] == function
+    assert len(entries) == 4
+
+
+def check_minimizer(feature_match=table_minimizer.TERNARY):
+    """Minimize the table files; returns (entries before, entries after, feature entries before, after)."""
+    with open(P4_FILE) as f:
+        p4_source = f.read()
+    p4 = table_minimizer.parse_p4(p4_source)
+    result, reports = table_minimizer.minimize(TABLE_FILES, p4_source, timing=False, feature_match=feature_match)
+    with tempfile.TemporaryDirectory() as output_dir:
+        written = []
+        for path, tables in result.items():
+            written.append(os.path.join(output_dir, os.path.basename(path)))
+            table_minimizer.write_commands(written[-1], tables)
+        original = table_minimizer.group_tables(c for path in TABLE_FILES for c in read_commands(path))
+        minimized = table_minimizer.group_tables(c for path in written for c in read_commands(path))
+        assert list(minimized) == list(original)
+        for table, commands in original.items():
+            assert len(minimized[table]) <= len(commands), table
+            if table_minimizer.is_single_ternary(commands):
+                width = table_minimizer.ternary_width(commands)
+                field_width = p4.meta_widths[p4.tables[table_minimizer.short_name(table)].keys[0][0]]
+                table_minimizer.check_feature_table(table, table_minimizer.as_entries(commands),
+                                                    table_minimizer.as_entries(minimized[table], field_width),
+                                                    width, feature_match, field_width)
+        if feature_match == table_minimizer.TERNARY:
+            _, again = table_minimizer.minimize(written, p4_source, timing=False)
+            assert all(r.before == r.after for r in again), "minimizing twice should change nothing"
+    features = [r for r in reports if r.kind == feature_match]
+    assert len(features) == 20
+    return (sum(r.before for r in reports), sum(r.after for r in reports),
+            sum(r.before for r in features), sum(r.after for r in features))
+
+
+def test_ortc_range():
+    ortc_is_minimal_for_a_range()
+
+
+def test_minimized_tables_are_equivalent():
+    before, after, ternary_before, ternary_after = check_minimizer()
+    assert ternary_after < ternary_before
+
+
+def test_range_and_lpm_feature_tables_are_equivalent():
+    _, _, ternary_before, range_after = check_minimizer(table_minimizer.RANGE)
+    _, _, _, lpm_after = check_minimizer(table_minimizer.LPM)
+    assert range_after < lpm_after < ternary_before
+
+
+if __name__ == "__main__":
+    ortc_is_minimal_for_a_range()
+    for match in (table_minimizer.TERNARY, table_minimizer.RANGE, table_minimizer.LPM):
+        before, after, features_before, features_after = check_minimizer(match)
+        print(f"OK ({match}): {before} -> {after} entries, {features_before} -> {features_after} feature entries")
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import argparse
 import time
 import threading
 import csv
@@ -31,12 +32,13 @@ bind_layers(Ether, Sensor, type=0x1235)
 bind_layers(Ether, Alert, type=0x1236)
 
 class TimeoutTester:
-    def __init__(self):
+    def __init__(self, prime_history=False):
         self.sensor_iface = 'enx0c37965f8a10'
         self.monitor_iface = 'enx0c37965f8a0a'
         self.timeout_data = []
         self.sent_scenarios = {}
         self.monitoring_active = True
+        self.prime_history = prime_history
         
         # Sample data from the CSV files for different conditions
         self.sample_data = {
@@ -90,6 +92,19 @@ class TimeoutTester:
         samples = self.sample_data[condition_name]
         return random.choice(samples)
         
+    def prime_patient(self, patient_id, condition=0):
+        """Send one complete window, so the patient has a history for in-switch LOCF imputation"""
+        values = self.get_sample_data(condition)
+        for sensor_id in range(10):
+            pkt = Ether(dst='00:04:00:00:00:00', type=0x1235) / Sensor(
+                patient_id=patient_id,
+                sensor_id=sensor_id,
+                timestamp=int(time.time() * 1000),
+                feature_value=values[sensor_id]
+            )
+            sendp(pkt, iface=self.sensor_iface, verbose=False)
+            time.sleep(0.01)
+
     def send_scenario(self, patient_id, scenario_name, sensors_to_send, condition=0):
         """Send a specific sensor scenario with mixed condition data"""
         values = self.get_sample_data(condition)
@@ -166,6 +181,7 @@ class TimeoutTester:
                             'sepsis_prediction': sepsis_pred,
                             'hf_prediction': hf_pred,
                             'news2_score': news2_score,
+                            'history_primed': self.prime_history,
                             'timestamp': receive_time
                         }
                         
@@ -203,6 +219,9 @@ class TimeoutTester:
         print(f"Testing {len(scenarios)} scenarios × {repetitions} repetitions × 3 conditions = {total_tests} total tests")
         print("Conditions: 0=Normal, 1=Sepsis, 2=Heart Failure")
         print("Note: Relies on controller's 15-second heartbeat for timeout processing")
+        if self.prime_history:
+            print("Note: Each patient first sends a complete window; with `make LOCF_IMPUTATION=1` the "
+                  "timed-out windows are then imputed and inferred in the switch, without the controller")
         
         # Start monitoring
         monitor_thread = threading.Thread(target=self.monitor_alerts)
@@ -227,6 +246,12 @@ class TimeoutTester:
         # Shuffle to randomize order and avoid temporal bias
         random.shuffle(test_cases)
         
+        if self.prime_history:
+            print(f"\nPriming {len(test_cases)} patients with a complete window...")
+            for test_case in test_cases:
+                self.prime_patient(test_case['patient_id'], test_case['condition'])
+            time.sleep(5)  # let the priming alerts drain before timing the scenarios
+
         print(f"\nStarting {len(test_cases)} mixed condition timeout tests...")
         
         for i, test_case in enumerate(test_cases):
@@ -420,6 +445,11 @@ if __name__ == "__main__":
     print("  Most_Missing, Single_Sensor, No_Critical, Random_Pattern")
     print()
     
-    tester = TimeoutTester()
+    parser = argparse.ArgumentParser(description="Mixed condition timeout test")
+    parser.add_argument("--prime-history", action="store_true",
+                        help="Send a complete window per patient first (measures LOCF_IMPUTATION builds)")
+    args = parser.parse_args()
+
+    tester = TimeoutTester(prime_history=args.prime_history)
     # Test with 3 repetitions of each scenario for each condition
     tester.run_mixed_timeout_test(repetitions=3)